@@ -0,0 +1,107 @@
+"""Archival of long-returned loans.
+
+Moves the loans returned more than --days ago from loans into loans_archive, oldest first, in
+batches of --batch-size. Every batch is its own short transaction that locks only the loans it
+moves, so lending and returning go on meanwhile; loans locked by another transaction are left for
+the next run. A run that is interrupted loses nothing and the next run simply carries on. Run it
+from cron, e.g. nightly.
+
+Archived loans still count towards the borrowers' total_loans. The loan listings and searches
+leave them out unless asked to include them (include_archived, or --archived in app.cli).
+
+Usage: python -m app.archive [--days N] [--batch-size N]
+"""
+import argparse
+import datetime
+from .db_connection import connect_to_db
+
+# Loans returned longer ago than this are archived
+ARCHIVE_AFTER_DAYS = 365
+
+# Loans moved per transaction
+ARCHIVE_BATCH_SIZE = 5000
+
+# Moves one batch of loans dated and returned before the cutoff, and past the key of the previous
+# batch so that the scan does not wade through the index entries of the loans it already moved.
+# The delete is bounded by the dates of the batch so that only its partitions are read, through
+# their primary keys. Returns the number of loans moved with the key of the last one.
+ARCHIVE_BATCH_QUERY = """
+    WITH batch AS (
+        SELECT loan_id, loan_date
+        FROM loans
+        WHERE loan_date < %(cutoff)s AND return_date < %(cutoff)s
+          AND (loan_date, loan_id) > (%(loan_date)s, %(loan_id)s)
+        ORDER BY loan_date, loan_id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM loans
+        WHERE loan_id = ANY(ARRAY(SELECT loan_id FROM batch))
+          AND loan_date BETWEEN (SELECT MIN(loan_date) FROM batch) AND (SELECT MAX(loan_date) FROM batch)
+        RETURNING loan_id, book_id, borrower_id, loan_date, return_date
+    ),
+    archived AS (
+        INSERT INTO loans_archive (loan_id, book_id, borrower_id, loan_date, return_date)
+        SELECT loan_id, book_id, borrower_id, loan_date, return_date FROM moved
+        RETURNING loan_date, loan_id
+    )
+    SELECT COUNT(*) OVER (), loan_date, loan_id
+    FROM archived
+    ORDER BY loan_date DESC, loan_id DESC
+    LIMIT 1
+"""
+
+
+def archive_batches(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive the loans returned more than `days` ago, yielding the number moved by each batch.
+
+    Each batch is committed before its count is yielded.
+    """
+    cutoff = datetime.date.today() - datetime.timedelta(days=days)
+    key = {"loan_date": datetime.date.min, "loan_id": 0}
+    conn = connect_to_db()
+
+    try:
+        while True:
+            with conn.cursor() as cur:
+                # The loans are neither new nor removed, so the counter triggers are muted
+                cur.execute("SET LOCAL library.moving_loans = 'on'")
+                cur.execute(ARCHIVE_BATCH_QUERY, {"cutoff": cutoff, "batch_size": batch_size, **key})
+                row = cur.fetchone()
+            conn.commit()
+
+            if row is None:
+                return
+            moved, key["loan_date"], key["loan_id"] = row
+            yield moved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def archive_loans(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive the loans returned more than `days` ago and return how many were moved."""
+    return sum(archive_batches(days, batch_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Move long-returned loans into loans_archive.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help=f"archive loans returned more than N days ago (default: {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help=f"loans moved per transaction (default: {ARCHIVE_BATCH_SIZE})")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    total = 0
+    for moved in archive_batches(args.days, args.batch_size):
+        total += moved
+        print(f"Archived {moved} loan(s), {total} so far.")
+    print(f"\nArchived {total} loan(s) returned more than {args.days} day(s) ago.\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
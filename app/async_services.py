@@ -0,0 +1,388 @@
+"""Asyncio variant of app.services on the asyncpg driver.
+
+The coroutines mirror the functions of app.services, return the same records and raise the
+same ServiceError subclasses, so one event loop can serve many desks at once:
+
+    async def desk(book_id, borrower_id):
+        status, loan = await create_loan(book_id, borrower_id)
+        ...
+        await close_loan(loan.loan_id)
+
+    asyncio.run(asyncio.gather(*(desk(book_id, borrower_id) for ...)))
+
+The SQL is shared with app.services: its psycopg2 placeholders are rewritten to asyncpg's
+numbered ones once per query. Connections come from a separate asyncpg pool bound to the
+event loop that first uses it; call close_pool() before that loop ends. Statements outside
+an explicit transaction commit on their own, so single-statement operations cost one round
+trip. Author and genre names come from the same in-process lookup cache as the synchronous
+functions; it is read in a worker thread, as a reload or a reconnect of its listener blocks.
+"""
+import asyncio
+import asyncpg
+import datetime
+import functools
+import os
+import re
+from .db_connection import get_database_config
+from .output import PAGE_SIZE, STREAM_BATCH_SIZE
+from .records import Borrower, Loan
+from .services import (
+    BOOK_COLUMNS,
+    BORROW_QUERY,
+    BORROWER_COLUMNS,
+    BORROWER_KEYWORD_NAME,
+    CLOSE_BOOK_LOANS_QUERY,
+    CLOSE_LOANS_QUERY,
+    FIND_ALL_LOANS_QUERY,
+    FIND_LOANS_QUERY,
+    LISTED_BOOKS,
+    ConflictError,
+    NotFoundError,
+    book_records,
+    books_page_query,
+    borrow_result,
+    borrower_keyword_kind,
+    check_references,
+    closed_loans_result,
+    find_books_query,
+    find_borrowers_query,
+    loan_query,
+    loans_page_query,
+    normalize_contact,
+)
+
+# Async pool settings, overridable through the environment like the synchronous pool's
+ASYNC_POOL_MIN_SIZE = int(os.getenv("DB_ASYNC_POOL_MIN_SIZE", "1"))
+ASYNC_POOL_MAX_SIZE = int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "10"))
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+_pool_task = None
+
+
+@functools.lru_cache(maxsize=None)
+def _numbered(query):
+    # Rewrite psycopg2 placeholders (%s, %(name)s) as $1, $2, ... and return the rewritten query with
+    # the parameter names in order, None standing for a positional parameter
+    names = []
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        name = match.group(1)
+        if name is None:
+            names.append(None)
+            return f"${len(names)}"
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return _PLACEHOLDER.sub(replace, query), tuple(names)
+
+
+def _prepare(query, params=()):
+    # Return the asyncpg query and its argument list for a psycopg2-style query and parameters
+    sql, names = _numbered(query)
+    if isinstance(params, dict):
+        return sql, [params[name] for name in names]
+    return sql, list(params)
+
+
+def _date(value):
+    # asyncpg binds dates as datetime.date only; the synchronous API also takes YYYY-MM-DD strings
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+async def _create_pool():
+    config = get_database_config()
+    return await asyncpg.create_pool(
+        database=config["dbname"],
+        user=config["user"],
+        host=config["host"],
+        port=int(config["port"]),
+        min_size=ASYNC_POOL_MIN_SIZE,
+        max_size=ASYNC_POOL_MAX_SIZE,
+    )
+
+
+async def get_pool():
+    """Return the process-wide asyncpg pool, creating it on first use."""
+    global _pool_task
+
+    # The first caller starts the creation and concurrent callers await the same task. Unlike an
+    # asyncio.Lock created at import time, this does not tie the module to one event loop.
+    if _pool_task is None:
+        _pool_task = asyncio.ensure_future(_create_pool())
+
+    try:
+        return await _pool_task
+    except Exception:
+        _pool_task = None
+        raise
+
+
+async def close_pool():
+    """Close the asyncpg pool; the next call opens a new one."""
+    global _pool_task
+
+    task, _pool_task = _pool_task, None
+    if task is not None:
+        pool = await task
+        await pool.close()
+
+
+async def _fetch(query, params=(), conn=None):
+    # Run on conn inside a transaction, or else on any pooled connection as a statement of its own
+    sql, args = _prepare(query, params)
+    return await (conn or await get_pool()).fetch(sql, *args)
+
+
+async def _fetchrow(query, params=(), conn=None):
+    sql, args = _prepare(query, params)
+    return await (conn or await get_pool()).fetchrow(sql, *args)
+
+
+async def _stream(query, params=(), batch_size=STREAM_BATCH_SIZE):
+    # Async counterpart of output.stream_query: yield lists of rows from a server-side cursor
+    sql, args = _prepare(query, params)
+    pool = await get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        batch = []
+        async for row in conn.cursor(sql, *args, prefetch=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+async def iter_books(batch_size=STREAM_BATCH_SIZE):
+    """Yield every book in book_id order, one list of Book records per batch."""
+    query = f"SELECT {BOOK_COLUMNS} FROM books WHERE {LISTED_BOOKS} ORDER BY books.book_id ASC"
+    async for rows in _stream(query, batch_size=batch_size):
+        yield await asyncio.to_thread(book_records, rows)
+
+
+async def books_page(after=None, before=None, start=None, page_size=PAGE_SIZE):
+    """Return one page of books in book_id order using keyset pagination (see services.books_page)."""
+    query, params, reversed_rows = books_page_query(after, before, start, page_size)
+    books = await asyncio.to_thread(book_records, await _fetch(query, params))
+    return books[::-1] if reversed_rows else books
+
+
+async def find_books(search, batch_size=STREAM_BATCH_SIZE):
+    """Yield the books matching a search, best match first (see services.find_books).
+
+    Raises SearchQueryError for a filter with an invalid value.
+    """
+    query, params = await asyncio.to_thread(find_books_query, search)
+    async for rows in _stream(query, params, batch_size=batch_size):
+        yield await asyncio.to_thread(book_records, rows)
+
+
+async def get_book(book_id):
+    """Return the Book with this ID, or None."""
+    rows = await _fetch(f"SELECT {BOOK_COLUMNS} FROM books WHERE books.book_id = %s AND {LISTED_BOOKS}", (book_id,))
+    return (await asyncio.to_thread(book_records, rows))[0] if rows else None
+
+
+async def create_book(title, author_id, genre_id, published_year):
+    """Insert an available book and return it; raises NotFoundError for an unknown author or genre."""
+    await asyncio.to_thread(check_references, author_id, genre_id)
+
+    try:
+        book_id = (await _fetchrow(
+            """
+            INSERT INTO books (title, author_id, genre_id, published_year)
+            VALUES (%s, %s, %s, %s)
+            RETURNING book_id
+            """,
+            (title, author_id, genre_id, published_year),
+        ))[0]
+    except asyncpg.ForeignKeyViolationError:
+        raise NotFoundError(f"Author ID {author_id} or Genre ID {genre_id} no longer exists.") from None
+
+    return (await asyncio.to_thread(book_records, [(book_id, title, author_id, genre_id, published_year, True)]))[0]
+
+
+async def update_book(book_id, title, author_id, genre_id, published_year):
+    """Replace a book's details and return it, or None if there is no such book."""
+    await asyncio.to_thread(check_references, author_id, genre_id)
+
+    rows = await _fetch(
+        f"""
+        UPDATE books
+        SET title = %s, author_id = %s, genre_id = %s, published_year = %s
+        WHERE book_id = %s
+        RETURNING {BOOK_COLUMNS}
+        """,
+        (title, author_id, genre_id, published_year, book_id),
+    )
+    return (await asyncio.to_thread(book_records, rows))[0] if rows else None
+
+
+async def delete_book(book_id):
+    """Delete a book with its loans and return whether it existed."""
+    return await _fetchrow("DELETE FROM books WHERE book_id = %s RETURNING book_id", (book_id,)) is not None
+
+
+async def iter_borrowers(batch_size=STREAM_BATCH_SIZE):
+    """Yield every borrower in borrower_id order, one list of Borrower records per batch."""
+    async for rows in _stream(f"SELECT {BORROWER_COLUMNS} FROM borrowers ORDER BY borrower_id", batch_size=batch_size):
+        yield [Borrower._make(row) for row in rows]
+
+
+async def find_borrowers(keyword, batch_size=STREAM_BATCH_SIZE):
+    """Yield the borrowers matching a keyword: exactly by email or phone, else by name (see services.find_borrowers)."""
+    kind, value = borrower_keyword_kind(keyword)
+
+    if kind != BORROWER_KEYWORD_NAME:
+        rows = await _fetch(*find_borrowers_query(kind, value))
+        if rows:
+            yield [Borrower._make(row) for row in rows]
+        return
+
+    async for rows in _stream(*find_borrowers_query(kind, value), batch_size=batch_size):
+        yield [Borrower._make(row) for row in rows]
+
+
+async def get_borrower(borrower_id):
+    """Return the Borrower with this ID, or None."""
+    row = await _fetchrow(f"SELECT {BORROWER_COLUMNS} FROM borrowers WHERE borrower_id = %s", (borrower_id,))
+    return Borrower._make(row) if row else None
+
+
+async def create_borrower(name, email, phone):
+    """Insert a borrower and return it; raises ConflictError if the email or phone is taken."""
+    email, phone = normalize_contact(email, phone)
+    pool = await get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        if await _fetchrow("SELECT borrower_id FROM borrowers WHERE LOWER(email) = %s OR phone = %s", (email, phone), conn):
+            raise ConflictError(f"A borrower with email '{email}' or phone '{phone}' already exists.")
+
+        try:
+            row = await _fetchrow(
+                f"""
+                INSERT INTO borrowers (name, email, phone)
+                VALUES (%s, %s, %s)
+                RETURNING {BORROWER_COLUMNS}
+                """,
+                (name, email, phone),
+                conn,
+            )
+        except asyncpg.UniqueViolationError:
+            # Another desk registered the same email since the check
+            raise ConflictError(f"A borrower with email '{email}' already exists.") from None
+
+    return Borrower._make(row)
+
+
+async def update_borrower(borrower_id, name, email, phone):
+    """Replace a borrower's details and return the borrower, or None if there is no such borrower.
+
+    Raises ConflictError if the email belongs to another borrower.
+    """
+    email, phone = normalize_contact(email, phone)
+    try:
+        row = await _fetchrow(
+            f"""
+            UPDATE borrowers
+            SET name = %s, email = %s, phone = %s
+            WHERE borrower_id = %s
+            RETURNING {BORROWER_COLUMNS}
+            """,
+            (name, email, phone, borrower_id),
+        )
+    except asyncpg.UniqueViolationError:
+        raise ConflictError(f"A borrower with email '{email}' already exists.") from None
+    return Borrower._make(row) if row else None
+
+
+async def delete_borrower(borrower_id):
+    """Delete a borrower and their loan history and return whether they existed.
+
+    Raises ConflictError while the borrower still has books borrowed.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        row = await _fetchrow("SELECT name, active_loans FROM borrowers WHERE borrower_id = %s FOR UPDATE", (borrower_id,), conn)
+
+        if row is None:
+            return False
+        if row[1] > 0:
+            raise ConflictError(f"Borrower '{row[0]}' cannot be removed because they have {row[1]} book(s) currently borrowed.")
+
+        await _fetch("DELETE FROM borrowers WHERE borrower_id = %s", (borrower_id,), conn)
+
+    return True
+
+
+async def iter_loans(batch_size=STREAM_BATCH_SIZE, include_archived=False):
+    """Yield every loan, newest first, one list of Loan records per batch (see services.iter_loans)."""
+    query = loan_query(include_archived) + "ORDER BY loans.loan_date DESC, loans.loan_id DESC"
+    async for rows in _stream(query, batch_size=batch_size):
+        yield [Loan._make(row) for row in rows]
+
+
+async def loans_page(after=None, before=None, start=None, page_size=PAGE_SIZE, include_archived=False):
+    """Return one page of loans, newest first, using keyset pagination (see services.loans_page)."""
+    after = (_date(after[0]), after[1]) if after is not None else None
+    before = (_date(before[0]), before[1]) if before is not None else None
+    query, params, reversed_rows = loans_page_query(after, before, start, page_size, include_archived)
+    loans = [Loan._make(row) for row in await _fetch(query, params)]
+    return loans[::-1] if reversed_rows else loans
+
+
+async def find_loans(keyword, batch_size=STREAM_BATCH_SIZE, include_archived=False):
+    """Yield the loans whose book title or borrower name contains the keyword (see services.find_loans)."""
+    query = FIND_ALL_LOANS_QUERY if include_archived else FIND_LOANS_QUERY
+    async for rows in _stream(query, {"pattern": f"%{keyword}%"}, batch_size=batch_size):
+        yield [Loan._make(row) for row in rows]
+
+
+async def get_loan(loan_id, include_archived=False):
+    """Return the Loan with this ID, or None; archived loans are found only if include_archived is set."""
+    row = await _fetchrow(loan_query(include_archived) + "WHERE loans.loan_id = %s", (loan_id,))
+    return Loan._make(row) if row else None
+
+
+async def create_loan(book_id, borrower_id):
+    """Lend a book in a single statement and return (BORROW_* code, Loan or None); see services.create_loan."""
+    return borrow_result(await _fetchrow(BORROW_QUERY, (book_id, borrower_id)), book_id, borrower_id)
+
+
+async def close_loan(loan_id):
+    """Return the book of an active loan and return the closed Loan, or None if the loan is not active."""
+    row = await _fetchrow(CLOSE_LOANS_QUERY, ([loan_id],))
+    return Loan._make(row) if row else None
+
+
+async def close_loans(ids, by_book=False):
+    """Return the books of many active loans at once and report the IDs without one (see services.close_loans)."""
+    ids = list(ids)
+    rows = await _fetch(CLOSE_BOOK_LOANS_QUERY if by_book else CLOSE_LOANS_QUERY, (ids,))
+    return closed_loans_result(rows, ids, by_book)
+
+
+async def update_loan_return_date(loan_id, return_date):
+    """Change the return date of a returned loan and return it, or None if there is no such loan.
+
+    Raises ConflictError if the loan is still active or the date is before the loan date.
+    """
+    updated = await _fetchrow(
+        """
+        UPDATE loans
+        SET return_date = %(return_date)s
+        WHERE loan_id = %(loan_id)s AND return_date IS NOT NULL AND loan_date <= %(return_date)s
+        RETURNING loan_id
+        """,
+        {"loan_id": loan_id, "return_date": _date(return_date)},
+    )
+
+    loan = await get_loan(loan_id)
+    if loan is not None and not updated:
+        if loan.return_date is None:
+            raise ConflictError("This loan has not been returned yet. Modification is not allowed.")
+        raise ConflictError("The return date cannot be earlier than the loan date.")
+    return loan
@@ -1,152 +1,108 @@
-from .db_connection import connect_to_db
 from tabulate import tabulate
+from .output import PAGE_SIZE, STREAM_BATCH_SIZE, write_stream
+from .services import NotFoundError, SearchQueryError, books_page, create_book, delete_book, find_books, get_book, iter_books, load_books_csv, update_book
 
+# Maximum number of rejected rows printed after a bulk import
+IMPORT_REPORT_LIMIT = 20
 
-def list_books():
-    # Fetch and display all books with their details including Book ID, Title, Author, Genre, Published Year, and Availability
-    conn = connect_to_db()
-    cur = conn.cursor()
+BOOK_HEADERS = ["Book ID", "Title", "Author", "Genre", "Published Year", "Availability"]
 
-    cur.execute(
-        """
-        SELECT books.book_id, books.title, authors.name AS author, genres.name AS genre, books.published_year,
-               CASE
-                   WHEN books.is_available = TRUE THEN 'Available'
-                   ELSE 'Borrowed'
-               END AS availability
-        FROM books
-        JOIN authors ON books.author_id = authors.author_id
-        JOIN genres ON books.genre_id = genres.genre_id
-        ORDER BY books.book_id ASC
-        """
-    )
 
-    books = cur.fetchall()
+def book_row(book):
+    # Display row of a Book record, as listed by list_books and get_books_page
+    return (book.book_id, book.title, book.author, book.genre, book.published_year, "Available" if book.is_available else "Borrowed")
 
-    if books:
-        headers = ["Book ID", "Title", "Author", "Genre", "Published Year", "Availability"]
-        print(tabulate(books, headers, tablefmt="fancy_grid"))
-        print(f"\nTotal number of books: {len(books)}\n")
+
+def list_books(batch_size=STREAM_BATCH_SIZE, output_format="table"):
+    # Fetch and display all books with their details including Book ID, Title, Author, Genre, Published Year, and Availability.
+    # output_format is "table", "jsonl" or "csv"; jsonl and csv print nothing but the rows.
+    # Rows are streamed from a server-side cursor in batches, so memory stays flat for any catalog size
+    batches = ([book_row(book) for book in books] for books in iter_books(batch_size))
+    total = write_stream(batches, BOOK_HEADERS, output_format)
+
+    if output_format != "table":
+        return
+    if total:
+        print(f"\nTotal number of books: {total}\n")
     else:
         print("\nNo books are currently available.\n")
 
-    cur.close()
-    conn.close()
 
+def get_books_page(after=None, before=None, start=None, page_size=PAGE_SIZE):
+    # Return one page of book display rows in book_id order using keyset pagination (see services.books_page)
+    return [book_row(book) for book in books_page(after=after, before=before, start=start, page_size=page_size)]
 
-def search_books(keyword):
-    # Search for books by title, author, genre, or published year using a single keyword and display results
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    query = """
-        SELECT books.book_id, books.title, authors.name AS author, genres.name AS genre, books.published_year,
-               CASE
-                   WHEN books.is_available = TRUE THEN 'Available'
-                   ELSE 'Borrowed'
-               END AS availability
-        FROM books
-        JOIN authors ON books.author_id = authors.author_id
-        JOIN genres ON books.genre_id = genres.genre_id
-        WHERE books.title ILIKE %s
-           OR authors.name ILIKE %s
-           OR genres.name ILIKE %s
-           OR CAST(books.published_year AS TEXT) ILIKE %s
-    """
+def search_books(keyword, output_format="table"):
+    # Search for books by title, author, genre, or published year using a keyword and/or field filters
+    # such as "author:tolkien year:1950..1960" (see services.find_books) and display results ranked by
+    # match quality, as a table or streamed as "jsonl" or "csv".
+    try:
+        found = find_books(keyword)
+    except SearchQueryError as error:
+        print(f"\nError: {error}\n")
+        return
 
-    keyword_formatted = f"%{keyword}%"
-    params = [keyword_formatted, keyword_formatted, keyword_formatted, keyword_formatted]
+    headers = BOOK_HEADERS + ["Match"]
+    batches = ([book_row(book) + (book.score,) for book in books] for books in found)
 
-    cur.execute(query, params)
-    books = cur.fetchall()
+    if output_format != "table":
+        write_stream(batches, headers, output_format)
+        return
+
+    books = [row for rows in batches for row in rows]
 
     if books:
-        headers = ["Book ID", "Title", "Author", "Genre", "Published Year", "Availability"]
         print(tabulate(books, headers, tablefmt="fancy_grid"))
         print(f"\nTotal number of books found: {len(books)}\n")
     else:
         print(f"\nNo books found matching the keyword: '{keyword}'\n")
 
-    cur.close()
-    conn.close()
-
 
 def add_book(title, author_id, genre_id, published_year):
-    # Insert a new book into the books table after verifying author_id and genre_id exist in the database
-    conn = connect_to_db()
-    cur = conn.cursor()
-
-    # Check if author_id exists in the authors table
-    cur.execute("SELECT author_id FROM authors WHERE author_id = %s", (author_id,))
-    if not cur.fetchone():
-        print(f"\nError: Author ID {author_id} does not exist. Book insertion cancelled.\n")
-        cur.close()
-        conn.close()
+    # Insert a new book into the books table after verifying author_id and genre_id exist, and display it
+    try:
+        book = create_book(title, author_id, genre_id, published_year)
+    except NotFoundError as error:
+        print(f"\nError: {error} Book insertion cancelled.\n")
         return
 
-    # Check if genre_id exists in the genres table
-    cur.execute("SELECT genre_id FROM genres WHERE genre_id = %s", (genre_id,))
-    if not cur.fetchone():
-        print(f"\nError: Genre ID {genre_id} does not exist. Book insertion cancelled.\n")
-        cur.close()
-        conn.close()
-        return
+    headers = ["Book ID", "Title", "Author", "Genre", "Published Year"]
+    print(tabulate([book_row(book)[:5]], headers, tablefmt="fancy_grid"))
 
-    # Insert the book only if both IDs are valid
-    cur.execute(
-        """
-        INSERT INTO books (title, author_id, genre_id, published_year, is_available)
-        VALUES (%s, %s, %s, %s, TRUE)
-        RETURNING book_id
-        """,
-        (title, author_id, genre_id, published_year),
-    )
-
-    book_id = cur.fetchone()[0]
-    conn.commit()
-
-    # Retrieve and display the details of the newly added book
-    cur.execute(
-        """
-        SELECT books.book_id, books.title, authors.name AS author, genres.name AS genre, books.published_year
-        FROM books
-        JOIN authors ON books.author_id = authors.author_id
-        JOIN genres ON books.genre_id = genres.genre_id
-        WHERE books.book_id = %s
-        """,
-        (book_id,),
-    )
-
-    added_book = cur.fetchall()
+    print(f"\nBook '{title}' (ID: {book.book_id}) added successfully.\n")
 
-    headers = ["Book ID", "Title", "Author", "Genre", "Published Year"]
-    print(tabulate(added_book, headers, tablefmt="fancy_grid"))
 
-    print(f"\nBook '{title}' (ID: {book_id}) added successfully.\n")
+def import_books(csv_path):
+    # Bulk-load books from a CSV file with the header "title,author_id,genre_id,published_year"
+    # (see services.load_books_csv) and report the rejected rows.
+    # Returns the number of imported books and a list of (row, reason) for the rejected rows.
+    with open(csv_path, encoding="utf-8") as csv_file:
+        imported, rejected = load_books_csv(csv_file)
 
-    cur.close()
-    conn.close()
+    print(f"\nImported {imported} book(s) from '{csv_path}'.\n")
 
+    if rejected:
+        print(tabulate(rejected[:IMPORT_REPORT_LIMIT], ["Row", "Reason"], tablefmt="fancy_grid"))
+        if len(rejected) > IMPORT_REPORT_LIMIT:
+            print(f"... and {len(rejected) - IMPORT_REPORT_LIMIT} more.")
+        print(f"\nRejected {len(rejected)} row(s).\n")
 
+    return imported, rejected
 
-def remove_book(book_id):
-    # Remove a book by ID after confirming with the user
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    cur.execute(
-        "SELECT book_id, title, author_id, genre_id, published_year FROM books WHERE book_id = %s",
-        (book_id,),
-    )
-    book = cur.fetchone()
+def remove_book(book_id, confirm=True):
+    # Remove a book by ID after confirming with the user; confirm=False skips the prompt for scripted use
+    book = get_book(book_id)
 
     if book:
         headers = ["Book ID", "Title", "Author ID", "Genre ID", "Published Year"]
-        book_table = [book]
+        book_table = [(book.book_id, book.title, book.author_id, book.genre_id, book.published_year)]
 
         print(tabulate(book_table, headers, tablefmt="fancy_grid"))
 
-        while True:
+        confirmation = "yes"
+        while confirm:
             confirmation = input("Are you sure you want to remove this book (yes/no)? ").strip().lower()
             if confirmation in ["yes", "no"]:
                 break
@@ -154,41 +110,25 @@ def remove_book(book_id):
                 print("\nPlease enter 'yes' or 'no'.")
 
         if confirmation == "yes":
-            cur.execute("DELETE FROM books WHERE book_id = %s", (book_id,))
-            conn.commit()
+            delete_book(book_id)
             print(f"\nBook with ID {book_id} removed successfully.\n")
         else:
             print("\nOperation cancelled.\n")
     else:
         print(f"\nNo book found with ID: {book_id}\n")
 
-    cur.close()
-    conn.close()
-
-
-def modify_book(book_id):
-    # Modify a book's details by showing current information
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    # Check if the book with the specified ID exists
-    cur.execute(
-        """
-        SELECT books.book_id, books.title, authors.author_id, authors.name AS author, genres.genre_id, genres.name AS genre, books.published_year
-        FROM books
-        JOIN authors ON books.author_id = authors.author_id
-        JOIN genres ON books.genre_id = genres.genre_id
-        WHERE books.book_id = %s
-    """,
-        (book_id,),
-    )
-    book = cur.fetchone()
+def modify_book(book_id, changes=None):
+    # Modify a book's details by showing current information. For scripted use, pass the new values
+    # as changes (title, author_id, genre_id, published_year) to skip the prompts; missing ones are kept.
+    book = get_book(book_id)
 
     if book:
         headers = ["Book ID", "Title", "Author", "Genre", "Published Year"]
-        print(tabulate([(book[0], book[1], book[3], book[5], book[6])], headers, tablefmt="fancy_grid"))
+        print(tabulate([book_row(book)[:5]], headers, tablefmt="fancy_grid"))
 
-        while True:
+        confirm = "yes"
+        while changes is None:
             confirm = input("Would you like to proceed with modifying the details of this book? (yes/no): ").strip().lower()
             if confirm in ["yes", "no"]:
                 break
@@ -196,52 +136,39 @@ def modify_book(book_id):
                 print("\nPlease enter 'yes' or 'no'.")
 
         if confirm == "yes":
-            print("\nEnter the data you want to change, leave blank for no change.\n")
-            new_title = input(f"Enter new title (current: {book[1]}): ").strip() or book[1]
+            if changes is None:
+                print("\nEnter the data you want to change, leave blank for no change.\n")
+                new_title = input(f"Enter new title (current: {book.title}): ").strip() or book.title
+                try:
+                    new_author_id = int(input(f"Enter new author ID (current: {book.author_id}): ").strip() or book.author_id)
+                    new_genre_id = int(input(f"Enter new genre ID (current: {book.genre_id}): ").strip() or book.genre_id)
+                    new_published_year = int(input(f"Enter new published year (current: {book.published_year}): ").strip() or book.published_year)
+                except ValueError:
+                    print("\nError: The input must be an integer.\n")
+                    return
+            else:
+                # As at the prompts, a blank title keeps the current one; the IDs and year are kept
+                # only when missing (or None), so a year 0 is applied
+                new_title = (changes.get("title") or "").strip() or book.title
+                new_author_id, new_genre_id, new_published_year = (
+                    getattr(book, field) if changes.get(field) is None else changes[field]
+                    for field in ("author_id", "genre_id", "published_year")
+                )
+
+            # Update the book with the new details after checking the new author and genre exist
             try:
-                new_author_id = int(input(f"Enter new author ID (current: {book[2]}): ").strip() or book[2])
-                new_genre_id = int(input(f"Enter new genre ID (current: {book[4]}): ").strip() or book[4])
-                new_published_year = int(input(f"Enter new published year (current: {book[6]}): ").strip() or book[6])
-            except ValueError:
-                print("\nError: The input must be an integer.\n")
+                updated_book = update_book(book_id, new_title, new_author_id, new_genre_id, new_published_year)
+            except NotFoundError as error:
+                print(f"\nError: {error} Modification cancelled.\n")
                 return
 
-            # Check if the new author_id exists in the database
-            if new_author_id:
-                cur.execute("SELECT author_id FROM authors WHERE author_id = %s", (new_author_id,))
-                if not cur.fetchone():
-                    print(f"\nError: Author ID {new_author_id} does not exist. Modification cancelled.\n")
-                    cur.close()
-                    conn.close()
-                    return
-
-            # Check if the new genre_id exists in the database
-            if new_genre_id:
-                cur.execute("SELECT genre_id FROM genres WHERE genre_id = %s", (new_genre_id,))
-                if not cur.fetchone():
-                    print(f"\nError: Genre ID {new_genre_id} does not exist. Modification cancelled.\n")
-                    cur.close()
-                    conn.close()
-                    return
-
-            # Update the book with the new details
-            cur.execute(
-                """
-                UPDATE books
-                SET title = %s, author_id = %s, genre_id = %s, published_year = %s
-                WHERE book_id = %s
-                """,
-                (new_title, new_author_id, new_genre_id, new_published_year, book_id),
-            )
-            conn.commit()
+            if updated_book is None:
+                print(f"\nBook not found with ID: {book_id}\n")
+                return
 
             print("\nBook updated successfully. Here are the updated details:\n")
-            headers = ["Book ID", "Title", "Author", "Genre", "Published Year"]
-            print(tabulate([(book_id, new_title, new_author_id, new_genre_id, new_published_year)], headers, tablefmt="fancy_grid"))
+            print(tabulate([book_row(updated_book)[:5]], headers, tablefmt="fancy_grid"))
         else:
             print("\nModification cancelled.\n")
     else:
         print(f"\nBook not found with ID: {book_id}\n")
-
-    cur.close()
-    conn.close()
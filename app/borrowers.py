@@ -1,141 +1,123 @@
 import re
-from .db_connection import connect_to_db
 from tabulate import tabulate
+from .output import STREAM_BATCH_SIZE, write_stream
+from .services import (
+    ConflictError,
+    check_loan_counts,
+    create_borrower,
+    delete_borrower,
+    find_borrowers,
+    get_borrower,
+    iter_borrowers,
+    update_borrower,
+)
+
+BORROWER_HEADERS = ["Borrower ID", "Name", "Email", "Phone", "Books Borrowed", "Active Loans"]
+
+
+def borrower_row(borrower):
+    # Display row of a Borrower record
+    return tuple(borrower)
+
+
+def view_borrowers(batch_size=STREAM_BATCH_SIZE, output_format="table"):
+    # Fetch and display all borrowers with their details, including Borrower ID and number of books borrowed.
+    # output_format is "table", "jsonl" or "csv"; jsonl and csv print nothing but the rows.
+    # Loan counts come from the trigger-maintained counters on borrowers instead of aggregating loans.
+    # Rows are streamed from a server-side cursor in batches, so memory stays flat for any number of borrowers
+    batches = ([borrower_row(borrower) for borrower in borrowers] for borrowers in iter_borrowers(batch_size))
+    total = write_stream(batches, BORROWER_HEADERS, output_format)
+
+    if output_format != "table":
+        return
+    if total:
+        print(f"\nTotal number of borrowers: {total}\n")
+    else:
+        print("\nNo borrowers found.\n")
 
 
-def view_borrowers():
-    # Fetch and display all borrowers with their details, including Borrower ID and number of books borrowed
-    conn = connect_to_db()
-    cur = conn.cursor()
+def search_borrowers(keyword, output_format="table"):
+    # Search for borrowers by exact email or phone, or else by name, best match first (see services.find_borrowers),
+    # and display all details, including books borrowed. Results are shown as a table or streamed as "jsonl" or "csv".
+    batches = ([borrower_row(borrower) for borrower in borrowers] for borrowers in find_borrowers(keyword))
 
-    cur.execute(
-        """
-        SELECT borrowers.borrower_id, borrowers.name, borrowers.email, borrowers.phone,
-               COUNT(loans.book_id) AS books_borrowed
-        FROM borrowers
-        LEFT JOIN loans ON borrowers.borrower_id = loans.borrower_id
-        GROUP BY borrowers.borrower_id
-        ORDER BY borrowers.borrower_id
-    """
-    )
+    if output_format != "table":
+        write_stream(batches, BORROWER_HEADERS, output_format)
+        return
 
-    borrowers = cur.fetchall()
+    borrowers = [row for rows in batches for row in rows]
 
     if borrowers:
-        headers = ["Borrower ID", "Name", "Email", "Phone", "Books Borrowed"]
-        print(tabulate(borrowers, headers, tablefmt="fancy_grid"))
-        print(f"\nTotal number of borrowers: {len(borrowers)}\n")
+        print(tabulate(borrowers, BORROWER_HEADERS, tablefmt="fancy_grid"))
+        print(f"\nTotal number of borrowers found: {len(borrowers)}\n")
     else:
-        print("\nNo borrowers found.\n")
-
-    cur.close()
-    conn.close()
+        print(f"\nNo borrowers found matching the keyword: '{keyword}'\n")
 
 
-def search_borrowers(keyword):
-    # Search for borrowers by name, email, or phone using a single keyword and display all details, including books borrowed
-    conn = connect_to_db()
-    cur = conn.cursor()
+def validate_borrower(name, email, phone):
+    # Return the error message for invalid new-borrower input, or None when it is valid
+    if not name or not email or not phone:
+        return "All fields (name, email, phone) are required."
 
-    query = """
-        SELECT borrowers.borrower_id, borrowers.name, borrowers.email, borrowers.phone,
-               COUNT(loans.book_id) AS books_borrowed
-        FROM borrowers
-        LEFT JOIN loans ON borrowers.borrower_id = loans.borrower_id
-        WHERE borrowers.name ILIKE %s
-           OR borrowers.email ILIKE %s
-           OR borrowers.phone ILIKE %s
-        GROUP BY borrowers.borrower_id
-        ORDER BY borrowers.borrower_id
-    """
+    if not name.isalpha():
+        return "Name must contain only letters."
 
-    keyword_formatted = f"%{keyword}%"
-    params = [keyword_formatted, keyword_formatted, keyword_formatted]
+    email_pattern = r"[^@]+@[^@]+\.[^@]+"
+    if not re.match(email_pattern, email):
+        return "Invalid email format."
 
-    cur.execute(query, params)
-    borrowers = cur.fetchall()
+    if not phone.isdigit():
+        return "Phone number must contain only digits."
 
-    if borrowers:
-        headers = ["Borrower ID", "Name", "Email", "Phone", "Books Borrowed"]
-        print(tabulate(borrowers, headers, tablefmt="fancy_grid"))
-        print(f"\nTotal number of borrowers found: {len(borrowers)}\n")
-    else:
-        print(f"\nNo borrowers found matching the keyword: '{keyword}'\n")
+    return None
 
-    cur.close()
-    conn.close()
 
+def validate_borrower_changes(changes):
+    # Return the error message for the invalid one of a borrower's changed fields (name, email, phone),
+    # or None when every given field is valid; fields left out are not checked
+    if "name" in changes and not changes["name"].replace(" ", "").isalpha():
+        return "Name must contain only letters and spaces."
 
-def add_borrower(name, email, phone):
-    # Insert a new borrower into the borrowers table, checking for correct input types and duplicates, and display the added borrower
-    conn = connect_to_db()
-    cur = conn.cursor()
+    if "email" in changes and not re.match(r"[^@]+@[^@]+\.[^@]+", changes["email"]):
+        return "Invalid email format."
 
-    cur.execute("SELECT borrower_id FROM borrowers WHERE email = %s OR phone = %s", (email, phone))
-    duplicate = cur.fetchone()
+    if "phone" in changes and not changes["phone"].isdigit():
+        return "Phone number must contain only digits."
 
-    if duplicate:
-        print(f"\nError: A borrower with email '{email}' or phone '{phone}' already exists. Please use different data.\n")
-    else:
-        cur.execute(
-            """
-            INSERT INTO borrowers (name, email, phone)
-            VALUES (%s, %s, %s)
-            RETURNING borrower_id
-            """,
-            (name, email, phone),
-        )
-
-        borrower_id = cur.fetchone()[0]
-        conn.commit()
-
-        cur.execute(
-            """
-            SELECT borrower_id, name, email, phone
-            FROM borrowers
-            WHERE borrower_id = %s
-            """,
-            (borrower_id,),
-        )
-
-        added_borrower = cur.fetchall()
+    return None
 
-        headers = ["Borrower ID", "Name", "Email", "Phone"]
-        print(tabulate(added_borrower, headers, tablefmt="fancy_grid"))
 
-        print(f"\nBorrower '{name}' added successfully.\n")
+def add_borrower(name, email, phone):
+    # Insert a new borrower into the borrowers table, checking for duplicates, and display the added borrower
+    try:
+        borrower = create_borrower(name, email, phone)
+    except ConflictError as error:
+        print(f"\nError: {error} Please use different data.\n")
+        return
 
-    cur.close()
-    conn.close()
+    headers = ["Borrower ID", "Name", "Email", "Phone"]
+    print(tabulate([borrower_row(borrower)[:4]], headers, tablefmt="fancy_grid"))
 
+    print(f"\nBorrower '{name}' added successfully.\n")
 
-def remove_borrower_by_id(borrower_id):
-    # Remove a borrower by ID after confirming with the user
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    cur.execute(
-        "SELECT borrower_id, name, email, phone FROM borrowers WHERE borrower_id = %s",
-        (borrower_id,),
-    )
-    borrower = cur.fetchone()
+def remove_borrower_by_id(borrower_id, confirm=True):
+    # Remove a borrower by ID after confirming with the user; confirm=False skips the prompt for scripted use
+    borrower = get_borrower(borrower_id)
 
     if borrower:
-        cur.execute(
-            "SELECT COUNT(*) FROM loans WHERE borrower_id = %s AND return_date IS NULL",
-            (borrower_id,),
-        )
-        books_borrowed = cur.fetchone()[0]
+        books_borrowed = borrower.active_loans
 
         if books_borrowed > 0:
-            print(f"\nBorrower '{borrower[1]}' cannot be removed because they have {books_borrowed} book(s) currently borrowed.\n")
+            print(f"\nBorrower '{borrower.name}' cannot be removed because they have {books_borrowed} book(s) currently borrowed.\n")
         else:
             headers = ["Borrower ID", "Name", "Email", "Phone"]
-            borrower_table = [borrower]
+            borrower_table = [borrower_row(borrower)[:4]]
 
             print(tabulate(borrower_table, headers, tablefmt="fancy_grid"))
 
-            while True:
+            confirmation = "yes"
+            while confirm:
                 confirmation = input("Are you sure you want to remove this borrower (yes/no)? ").strip().lower()
                 if confirmation in ["yes", "no"]:
                     break
@@ -143,34 +125,30 @@ def remove_borrower_by_id(borrower_id):
                     print("\nPlease enter 'yes' or 'no'.")
 
             if confirmation == "yes":
-                cur.execute("DELETE FROM borrowers WHERE borrower_id = %s", (borrower_id,))
-                conn.commit()
-                print(f"\nBorrower '{borrower[1]}' removed successfully.\n")
+                try:
+                    delete_borrower(borrower_id)
+                except ConflictError as error:
+                    # A book was borrowed while the user was confirming
+                    print(f"\n{error}\n")
+                    return
+                print(f"\nBorrower '{borrower.name}' removed successfully.\n")
             else:
                 print("\nOperation cancelled.\n")
     else:
         print(f"\nNo borrower found with ID: {borrower_id}\n")
 
-    cur.close()
-    conn.close()
 
-
-def modify_borrower(borrower_id):
-    # Modify a borrower's details by showing existing 
-    conn = connect_to_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT borrower_id, name, email, phone FROM borrowers WHERE borrower_id = %s",
-        (borrower_id,),
-    )
-    borrower = cur.fetchone()
+def modify_borrower(borrower_id, changes=None):
+    # Modify a borrower's details by showing existing. For scripted use, pass the new values as
+    # changes (name, email, phone) to skip the prompts; missing ones are kept.
+    borrower = get_borrower(borrower_id)
 
     if borrower:
         headers = ["Borrower ID", "Name", "Email", "Phone"]
-        print(tabulate([borrower], headers, tablefmt="fancy_grid"))
+        print(tabulate([borrower_row(borrower)[:4]], headers, tablefmt="fancy_grid"))
 
-        while True:
+        confirm = "yes"
+        while changes is None:
             confirm = input("Do you want to modify this borrower? (yes/no): ").strip().lower()
             if confirm in ["yes", "no"]:
                 break
@@ -178,40 +156,56 @@ def modify_borrower(borrower_id):
                 print("\nPlease enter 'yes' or 'no'.")
 
         if confirm == "yes":
-            print("\nEnter the data you want to change, leave blank for no change.\n")
+            if changes is None:
+                print("\nEnter the data you want to change, leave blank for no change.\n")
 
-            new_name = input(f"Enter new name (current: {borrower[1]}): ").strip() or borrower[1]
-            if not new_name.replace(" ", "").isalpha(): 
+            new_name = (changes.get("name") if changes is not None else input(f"Enter new name (current: {borrower.name}): ").strip()) or borrower.name
+            if not new_name.replace(" ", "").isalpha():
                 print("\nError: Name must contain only letters and spaces.\n")
                 return
-                        
-            new_email = input(f"Enter new email (current: {borrower[2]}): ").strip() or borrower[2]
+
+            new_email = (changes.get("email") if changes is not None else input(f"Enter new email (current: {borrower.email}): ").strip()) or borrower.email
             email_pattern = r"[^@]+@[^@]+\.[^@]+"
             if not re.match(email_pattern, new_email):
                 print("\nError: Invalid email format.\n")
                 return
-            
-            new_phone = input(f"Enter new phone (current: {borrower[3]}): ").strip() or borrower[3]
+
+            new_phone = (changes.get("phone") if changes is not None else input(f"Enter new phone (current: {borrower.phone}): ").strip()) or borrower.phone
             if not new_phone.isdigit():
                 print("\nError: Phone number must contain only digits.\n")
                 return
 
-        
-            cur.execute(
-                """
-                UPDATE borrowers
-                SET name = %s, email = %s, phone = %s
-                WHERE borrower_id = %s
-                """,
-                (new_name, new_email, new_phone, borrower_id),
-            )
-            conn.commit()
-
-            print("\nBorrower updated successfully.\n")
+            try:
+                updated = update_borrower(borrower_id, new_name, new_email, new_phone)
+            except ConflictError as error:
+                print(f"\nError: {error} Please use different data.\n")
+                return
+
+            if updated:
+                print("\nBorrower updated successfully.\n")
+            else:
+                print("\nBorrower not found.\n")
         else:
             print("\nModification cancelled.\n")
     else:
         print("\nBorrower not found.\n")
 
-    cur.close()
-    conn.close()
\ No newline at end of file
+
+def reconcile_loan_counts(repair=False):
+    # Compare the borrower loan counters with the loans table and report any drift. With repair=True
+    # the drifted counters are rewritten (see services.check_loan_counts). Returns the list of drifted borrowers.
+    drifted = check_loan_counts(repair=repair)
+
+    if not drifted:
+        print("\nAll borrower loan counters are consistent.\n")
+        return drifted
+
+    headers = ["Borrower ID", "Name", "Books Borrowed", "Actual", "Active Loans", "Actual"]
+    print(tabulate(drifted, headers, tablefmt="fancy_grid"))
+
+    if repair:
+        print(f"\nRepaired the loan counters of {len(drifted)} borrower(s).\n")
+    else:
+        print(f"\nFound {len(drifted)} borrower(s) with drifted loan counters.\n")
+
+    return drifted
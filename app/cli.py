@@ -1,270 +1,360 @@
-import inquirer, re
-from .books import add_book, list_books, modify_book, remove_book, search_books
-from .borrowers import add_borrower, modify_borrower, remove_borrower_by_id, search_borrowers, view_borrowers
-from .loans import borrow_book, modify_loan, return_book, search_loan, view_loans
-
-
-def main_menu():
-    questions = [
-        inquirer.List(
-            "action",
-            message="What would you like to do?",
-            choices=["Manage Books", "Manage Borrowers", "Manage Loans", "Exit"],
-        ),
-    ]
-    answer = inquirer.prompt(questions)
-    return answer["action"]
-
-
-def manage_books():
-    questions = [
-        inquirer.List(
-            "action",
-            message="Book Management Options",
-            choices=[
-                "List books",
-                "Search books",
-                "Add a book",
-                "Remove a book",
-                "Modify a book",
-                "Back to Main Menu",
-            ],
-        ),
-    ]
-    answer = inquirer.prompt(questions)
-    return answer["action"]
-
-
-def manage_borrowers():
-    questions = [
-        inquirer.List(
-            "action",
-            message="Borrower Management Options",
-            choices=[
-                "View borrowers",
-                "Search borrowers",
-                "Add a borrower",
-                "Remove a borrower",
-                "Modify a borrower",
-                "Back to Main Menu",
-            ],
-        ),
-    ]
-    answer = inquirer.prompt(questions)
-    return answer["action"]
-
-
-def manage_loans():
-    questions = [
-        inquirer.List(
-            "action",
-            message="Loan Management Options",
-            choices=[
-                "View loans",
-                "Search loans",
-                "Borrow a book",
-                "Return a book",
-                "Modify a loan",
-                "Back to Main Menu",
-            ],
-        ),
-    ]
-    answer = inquirer.prompt(questions)
-    return answer["action"]
-
-
-def search_books_interaction():
-    keyword = input("Enter a keyword to search for books (title, author, genre, or published year): ").strip()
-
-    if keyword:
-        search_books(keyword)
-    else:
-        print("\nNo keyword entered. Please try again.\n")
+"""Command-line entry point of the library system.
 
+Without arguments the interactive menus start. With a subcommand, a single action runs
+without prompts, which makes it usable from scripts and cron::
 
-def add_book_interaction():
-    try:
-        title = input("Enter book title: ")
-        author_id = int(input("Enter author ID: "))
-        genre_id = int(input("Enter genre ID: "))
-        published_year = int(input("Enter published year: "))
-    except ValueError:
-        print("\nError: Author ID, Genre ID, and Published Year must be integers.\n")
-        return
+    python -m app.cli books search tolkien
+    python -m app.cli loans borrow 12 3
+    python -m app.cli borrowers remove 7 --yes
 
-    add_book(title, author_id, genre_id, published_year)
+Each command imports only the modules it needs, so ``--help`` and argument errors never load
+inquirer, tabulate or the database driver. See STARTUP_BUDGET_MS for the import-time budget.
+"""
+import argparse
+import sys
 
+# Import-time budget of this module, in milliseconds of cumulative time for app.cli as
+# reported by `python -X importtime -c "import app.cli"` (see benchmarks/bench_startup.py)
+STARTUP_BUDGET_MS = 30
 
-def remove_book_interaction():
-    try:
-        book_id = int(input("Enter the book ID to remove: "))
-    except ValueError:
-        print("\nError: Book ID must be an integer.\n")
-        return
+BOOK_HEADERS = ["Book ID", "Title", "Author", "Genre", "Published Year", "Availability"]
+LOAN_HEADERS = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
 
-    remove_book(book_id)
 
+def _print_page(rows, headers, item_name, output_format):
+    if output_format != "table":
+        from .output import write_stream
 
-def modify_book_interaction():
-    try:
-        book_id = int(input("Enter the book ID to modify: "))
-    except ValueError:
-        print("\nError: Book ID must be an integer.\n")
+        write_stream([rows], headers, output_format)
         return
-    
-    modify_book(book_id)
 
+    from tabulate import tabulate
 
-def search_borrowers_interaction():
-    keyword = input("Enter a keyword to search for borrowers (name, email, or phone): ").strip()
-
-    if keyword:
-        search_borrowers(keyword)
+    if rows:
+        print(tabulate(rows, headers, tablefmt="fancy_grid"))
     else:
-        print("\nNo keyword entered. Please try again.\n")
+        print(f"\nNo {item_name}s found.\n")
 
 
-def add_borrower_interaction():
-    name = input("Enter borrower's name: ")
-    email = input("Enter borrower's email: ")
-    phone = input("Enter borrower's phone number: ")
+def _changes(args, fields):
+    # Only the options given on the command line are changed
+    return {field: getattr(args, field) for field in fields if getattr(args, field) is not None}
 
-    if not name or not email or not phone:
-        print("\nError: All fields (name, email, phone) are required.\n")
-        return
 
-    if not name.isalpha():
-        print("\nError: Name must contain only letters.\n")
-        return
+def books_list(args):
+    from .books import list_books
 
-    email_pattern = r"[^@]+@[^@]+\.[^@]+"
-    if not re.match(email_pattern, email):
-        print("\nError: Invalid email format.\n")
-        return
+    list_books(output_format=args.format)
 
-    if not phone.isdigit():
-        print("\nError: Phone number must contain only digits.\n")
-        return
 
-    add_borrower(name, email, phone)
+def books_page(args):
+    from .books import get_books_page
 
+    _print_page(get_books_page(after=args.after, before=args.before, start=args.start, page_size=args.size), BOOK_HEADERS, "book", args.format)
+
+
+def books_search(args):
+    from .books import search_books
+
+    search_books(args.keyword, output_format=args.format)
 
-def remove_borrower_interaction():
-    try:
-        borrower_id = int(input("Enter the borrower ID: "))
-    except ValueError:
-        print("\nError: Borrower ID must be an integer.\n")
-        return
 
-    remove_borrower_by_id(borrower_id)
+def books_add(args):
+    from .books import add_book
 
+    add_book(args.title, args.author_id, args.genre_id, args.published_year)
+
+
+def books_import(args):
+    from .books import import_books
 
-def modify_borrower_interaction():
     try:
-        borrower_id = int(input("Enter the borrower ID: "))
-    except ValueError:
-        print("\nError: Borrower ID must be an integer.\n")
-        return
+        import_books(args.csv_path)
+    except OSError as error:
+        print(f"\nError: Could not read '{args.csv_path}': {error.strerror}.\n")
+        return 1
 
-    modify_borrower(borrower_id)
 
+def books_remove(args):
+    from .books import remove_book
 
-def search_loans_interaction():
-    keyword = input("Enter a keyword to search for loans (book title or borrower name): ").strip()
+    remove_book(args.book_id, confirm=not args.yes)
 
-    if keyword:
-        search_loan(keyword)
-    else:
-        print("\nNo keyword entered. Please try again.\n")
 
+def books_modify(args):
+    from .books import modify_book
 
-def borrow_book_interaction():
-    try:
-        book_id = int(input("Enter the book ID to borrow: "))
-        borrower_id = int(input("Enter the borrower ID: "))
-    except ValueError:
-        print("\nError: Both Book ID and Borrower ID must be integers.\n")
-        return
+    modify_book(args.book_id, changes=_changes(args, ["title", "author_id", "genre_id", "published_year"]))
 
-    borrow_book(book_id, borrower_id)
 
+def borrowers_list(args):
+    from .borrowers import view_borrowers
+
+    view_borrowers(output_format=args.format)
+
+
+def borrowers_search(args):
+    from .borrowers import search_borrowers
+
+    search_borrowers(args.keyword, output_format=args.format)
+
+
+def borrowers_add(args):
+    from .borrowers import add_borrower, validate_borrower
+
+    error = validate_borrower(args.name, args.email, args.phone)
+    if error:
+        print(f"\nError: {error}\n")
+        return 1
+
+    add_borrower(args.name, args.email, args.phone)
 
-def return_book_interaction():
-    try:
-        loan_id = int(input("Enter the loan ID to return: "))
-    except ValueError:
-        print("\nError: Loan ID must be an integer.\n")
-        return
 
-    return_book(loan_id)
+def borrowers_remove(args):
+    from .borrowers import remove_borrower_by_id
 
+    remove_borrower_by_id(args.borrower_id, confirm=not args.yes)
 
-def modify_loan_interaction():
+
+def borrowers_modify(args):
+    from .borrowers import modify_borrower
+
+    modify_borrower(args.borrower_id, changes=_changes(args, ["name", "email", "phone"]))
+
+
+def borrowers_reconcile(args):
+    from .borrowers import reconcile_loan_counts
+
+    reconcile_loan_counts(repair=args.repair)
+
+
+def loans_list(args):
+    from .loans import view_loans
+
+    view_loans(output_format=args.format, include_archived=args.archived)
+
+
+def loans_page(args):
+    from .loans import get_loans_page
+
+    page = get_loans_page(after=args.after, before=args.before, start=args.start, page_size=args.size, include_archived=args.archived)
+    _print_page(page, LOAN_HEADERS, "loan", args.format)
+
+
+def loans_search(args):
+    from .loans import search_loan
+
+    search_loan(args.keyword, output_format=args.format, include_archived=args.archived)
+
+
+def loans_borrow(args):
+    from .loans import BORROW_OK, borrow_book
+
+    return 0 if borrow_book(args.book_id, args.borrower_id) == BORROW_OK else 1
+
+
+def loans_return(args):
+    from .loans import return_book, return_books
+
+    ids = list(args.ids)
+    if args.file:
+        try:
+            ids += [int(value) for value in args.file.read().split()]
+        except ValueError:
+            print(f"\nError: {args.file.name} must hold IDs separated by whitespace.\n")
+            return 1
+    if not ids:
+        print("\nError: Give at least one ID, as arguments or with --file.\n")
+        return 1
+
+    # A single loan keeps the one-book confirmation; anything else is a drop-box return
+    if len(ids) == 1 and not args.books:
+        return 0 if return_book(ids[0]) else 1
+    return 1 if return_books(ids, by_book=args.books) else 0
+
+
+def loans_modify(args):
+    from .loans import modify_loan
+
+    modify_loan(args.loan_id, new_return_date=args.return_date)
+
+
+def _loan_key(value):
+    # Loan pages are keyed by (loan_date, loan_id), written as YYYY-MM-DD,ID
+    loan_date, _, loan_id = value.partition(",")
+    if not loan_date or not loan_id.isdigit():
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD,LOAN_ID, got '{value}'")
+    return loan_date, int(loan_id)
+
+
+def _add_page_arguments(parser, key_type, key_help):
+    position = parser.add_mutually_exclusive_group()
+    position.add_argument("--after", type=key_type, metavar="KEY", help=f"show the page after this {key_help}")
+    position.add_argument("--before", type=key_type, metavar="KEY", help=f"show the page before this {key_help}")
+    position.add_argument("--start", type=int, metavar="ID", help="show the page starting at this ID")
+    parser.add_argument("--size", type=int, default=20, help="rows per page (default: 20)")
+    _add_format_argument(parser)
+
+
+def _add_format_argument(parser):
+    # Kept in step with app.output.OUTPUT_FORMATS, which is not imported here to keep startup fast
+    parser.add_argument(
+        "--format",
+        choices=["table", "jsonl", "csv"],
+        default="table",
+        help="table (default), or jsonl / csv streamed row by row for other programs",
+    )
+
+
+def _add_archived_argument(parser):
+    parser.add_argument("--archived", action="store_true", help="include loans moved to the archive by app.archive")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Library system. Run without arguments for the interactive menus.")
+    parser.add_argument("--stats", action="store_true", help="after the command, print its queries, round trips, rows and commit times to stderr")
+    groups = parser.add_subparsers(dest="group", metavar="{books,borrowers,loans}")
+
+    books = groups.add_parser("books", help="manage books").add_subparsers(dest="command", required=True)
+    listing = books.add_parser("list", help="list all books")
+    _add_format_argument(listing)
+    listing.set_defaults(handler=books_list)
+    page = books.add_parser("page", help="show one page of books in ID order")
+    _add_page_arguments(page, int, "book ID")
+    page.set_defaults(handler=books_page)
+    search = books.add_parser("search", help="search by title, author, genre or published year")
+    search.add_argument("keyword", help="keywords and/or filters: title:PREFIX author:NAME|ID genre:NAME|ID year:Y or Y1..Y2 available:true|false")
+    _add_format_argument(search)
+    search.set_defaults(handler=books_search)
+    add = books.add_parser("add", help="add a book")
+    add.add_argument("title")
+    add.add_argument("author_id", type=int)
+    add.add_argument("genre_id", type=int)
+    add.add_argument("published_year", type=int)
+    add.set_defaults(handler=books_add)
+    import_parser = books.add_parser("import", help="import books from a CSV file (title,author_id,genre_id,published_year)")
+    import_parser.add_argument("csv_path")
+    import_parser.set_defaults(handler=books_import)
+    remove = books.add_parser("remove", help="remove a book")
+    remove.add_argument("book_id", type=int)
+    remove.add_argument("--yes", action="store_true", help="do not ask for confirmation")
+    remove.set_defaults(handler=books_remove)
+    modify = books.add_parser("modify", help="change a book's details; omitted fields are kept")
+    modify.add_argument("book_id", type=int)
+    modify.add_argument("--title")
+    modify.add_argument("--author-id", type=int)
+    modify.add_argument("--genre-id", type=int)
+    modify.add_argument("--published-year", type=int)
+    modify.set_defaults(handler=books_modify)
+
+    borrowers = groups.add_parser("borrowers", help="manage borrowers").add_subparsers(dest="command", required=True)
+    listing = borrowers.add_parser("list", help="list all borrowers")
+    _add_format_argument(listing)
+    listing.set_defaults(handler=borrowers_list)
+    search = borrowers.add_parser("search", help="search by name, email or phone")
+    search.add_argument("keyword")
+    _add_format_argument(search)
+    search.set_defaults(handler=borrowers_search)
+    add = borrowers.add_parser("add", help="add a borrower")
+    add.add_argument("name")
+    add.add_argument("email")
+    add.add_argument("phone")
+    add.set_defaults(handler=borrowers_add)
+    remove = borrowers.add_parser("remove", help="remove a borrower without active loans")
+    remove.add_argument("borrower_id", type=int)
+    remove.add_argument("--yes", action="store_true", help="do not ask for confirmation")
+    remove.set_defaults(handler=borrowers_remove)
+    modify = borrowers.add_parser("modify", help="change a borrower's details; omitted fields are kept")
+    modify.add_argument("borrower_id", type=int)
+    modify.add_argument("--name")
+    modify.add_argument("--email")
+    modify.add_argument("--phone")
+    modify.set_defaults(handler=borrowers_modify)
+    reconcile = borrowers.add_parser("reconcile", help="check the loan counters against the loans table")
+    reconcile.add_argument("--repair", action="store_true", help="rewrite drifted counters")
+    reconcile.set_defaults(handler=borrowers_reconcile)
+
+    loans = groups.add_parser("loans", help="manage loans").add_subparsers(dest="command", required=True)
+    listing = loans.add_parser("list", help="list all loans, newest first")
+    _add_format_argument(listing)
+    _add_archived_argument(listing)
+    listing.set_defaults(handler=loans_list)
+    page = loans.add_parser("page", help="show one page of loans, newest first")
+    _add_page_arguments(page, _loan_key, "loan, given as YYYY-MM-DD,LOAN_ID")
+    _add_archived_argument(page)
+    page.set_defaults(handler=loans_page)
+    search = loans.add_parser("search", help="search by book title or borrower name")
+    search.add_argument("keyword")
+    _add_format_argument(search)
+    _add_archived_argument(search)
+    search.set_defaults(handler=loans_search)
+    borrow = loans.add_parser("borrow", help="lend a book; exits with status 1 if it cannot be lent")
+    borrow.add_argument("book_id", type=int)
+    borrow.add_argument("borrower_id", type=int)
+    borrow.set_defaults(handler=loans_borrow)
+    return_parser = loans.add_parser(
+        "return", help="return borrowed books in one transaction; exits with status 1 if an ID has no active loan"
+    )
+    return_parser.add_argument("ids", type=int, nargs="*", metavar="ID", help="loan IDs, or book IDs with --books")
+    return_parser.add_argument("--books", action="store_true", help="the IDs are book IDs, e.g. scanned from a drop box")
+    return_parser.add_argument("--file", type=argparse.FileType("r"), help="also read IDs from this file ('-' for stdin)")
+    return_parser.set_defaults(handler=loans_return)
+    modify = loans.add_parser("modify", help="change the return date of a returned loan")
+    modify.add_argument("loan_id", type=int)
+    modify.add_argument("--return-date", required=True, help="new return date, YYYY-MM-DD")
+    modify.set_defaults(handler=loans_modify)
+
+    return parser
+
+
+def _close_connections():
+    # Only modules a command actually imported can hold connections
+    lookups = sys.modules.get(f"{__package__}.lookups")
+    if lookups is not None:
+        lookups.close_lookups()
+
+    db_connection = sys.modules.get(f"{__package__}.db_connection")
+    if db_connection is not None:
+        db_connection.close_pool()
+
+
+def _print_stats(operation):
+    # Written to stderr so that --format jsonl/csv output on stdout stays machine-readable
+    from tabulate import tabulate
+
+    rows = [(statement.sql, statement.round_trips, statement.rows, statement.seconds * 1000) for statement in operation.statements]
+    rows += [("COMMIT", 1, 0, seconds * 1000) for seconds in operation.commit_seconds]
+    print(tabulate(rows, ["Statement", "Round trips", "Rows", "Time (ms)"], tablefmt="fancy_grid", floatfmt=".2f", maxcolwidths=[60, None, None, None]), file=sys.stderr)
+    print(
+        f"\n'{operation.name}': {operation.statement_count} statement(s), {operation.round_trips} round trip(s), "
+        f"{operation.rows} row(s) fetched, {operation.seconds * 1000:.1f} ms in total.\n",
+        file=sys.stderr,
+    )
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Pooled connections and the lookup cache stay warm between actions and are closed when the session ends
     try:
-        loan_id = int(input("Enter the loan ID to modify: "))
-    except ValueError:
-        print("\nError: Loan ID must be an integer.\n")
-        return
+        if args.group is None:
+            from .interactive import run
+
+            run()
+            return 0
+
+        if not args.stats:
+            return args.handler(args) or 0
+
+        from .db_connection import track_operation
 
-    modify_loan(loan_id)
-
-
-def run():
-    while True:
-        action = main_menu()
-
-        if action == "Manage Books":
-            while True:
-                book_action = manage_books()
-                if book_action == "List books":
-                    list_books()
-                elif book_action == "Search books":
-                    search_books_interaction()
-                elif book_action == "Add a book":
-                    add_book_interaction()
-                elif book_action == "Remove a book":
-                    remove_book_interaction()
-                elif book_action == "Modify a book":
-                    modify_book_interaction()
-                elif book_action == "Back to Main Menu":
-                    break
-
-        elif action == "Manage Borrowers":
-            while True:
-                borrower_action = manage_borrowers()
-                if borrower_action == "View borrowers":
-                    view_borrowers()
-                elif borrower_action == "Search borrowers":
-                    search_borrowers_interaction()
-                elif borrower_action == "Add a borrower":
-                    add_borrower_interaction()
-                elif borrower_action == "Remove a borrower":
-                    remove_borrower_interaction()
-                elif borrower_action == "Modify a borrower":
-                    modify_borrower_interaction()
-                elif borrower_action == "Back to Main Menu":
-                    break
-
-        elif action == "Manage Loans":
-            while True:
-                loan_action = manage_loans()
-                if loan_action == "View loans":
-                    view_loans()
-                elif loan_action == "Search loans":
-                    search_loans_interaction()
-                elif loan_action == "Borrow a book":
-                    borrow_book_interaction()
-                elif loan_action == "Return a book":
-                    return_book_interaction()
-                elif loan_action == "Modify a loan":
-                    modify_loan_interaction()
-                elif loan_action == "Back to Main Menu":
-                    break
-
-        elif action == "Exit":
-            print("Thank you for using our library system!")
-            break
+        with track_operation(f"{args.group} {args.command}") as operation:
+            status = args.handler(args) or 0
+        _print_stats(operation)
+        return status
+    finally:
+        _close_connections()
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    raise SystemExit(main())
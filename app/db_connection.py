@@ -1,5 +1,11 @@
 import psycopg2
+import contextvars
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from psycopg2 import extensions, pool
 
 # Get the environment, defaults to "production"
 ENV = os.getenv("ENV", "production")
@@ -20,16 +26,360 @@ DATABASE_CONFIG = {
     }
 }
 
-def connect_to_db():
-    """Connect to the correct PostgreSQL database based on environment."""
+# Connection pool settings, overridable through the environment
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Statements taking at least this many milliseconds are written to the slow-query log
+# (see app/slow_query_log.py); 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "1000"))
+
+
+def get_database_config():
+    """Return the connection settings for the current environment."""
     config = DATABASE_CONFIG.get(ENV)
 
     if not config:
         raise ValueError(f"Invalid environment: {ENV}")
-    
+
     # Safety check: ensure tests don't accidentally use the production database
     if ENV == "test" and "pytest" not in os.getenv("_", ""):
         raise RuntimeError("Attempting to run tests outside of pytest.")
 
-    conn = psycopg2.connect(**config)
-    return conn
\ No newline at end of file
+    return config
+
+
+# Number of finished operations kept for recent_operations()
+OPERATION_HISTORY_SIZE = 100
+
+# Characters of SQL text kept per recorded statement
+STATEMENT_TEXT_LIMIT = 200
+
+
+class StatementStats:
+    """One statement run during an operation: its SQL, time spent on the server and rows returned.
+
+    For a named (server-side) cursor the FETCH round trips are added to the statement that opened it.
+    """
+
+    __slots__ = ("sql", "seconds", "rows", "round_trips")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.seconds = 0.0
+        self.rows = 0
+        self.round_trips = 1
+
+
+class OperationStats:
+    """Queries and commits recorded for one logical operation, such as a CLI command."""
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = []
+        self.commit_seconds = []
+        self.seconds = 0.0
+
+    @property
+    def statement_count(self):
+        return len(self.statements)
+
+    @property
+    def round_trips(self):
+        return sum(statement.round_trips for statement in self.statements) + len(self.commit_seconds)
+
+    @property
+    def rows(self):
+        return sum(statement.rows for statement in self.statements)
+
+    @property
+    def query_seconds(self):
+        return sum(statement.seconds for statement in self.statements)
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "statement_count": self.statement_count,
+            "round_trips": self.round_trips,
+            "rows": self.rows,
+            "query_seconds": self.query_seconds,
+            "commit_seconds": list(self.commit_seconds),
+            "statements": [
+                {"sql": statement.sql, "seconds": statement.seconds, "rows": statement.rows, "round_trips": statement.round_trips}
+                for statement in self.statements
+            ],
+        }
+
+
+_current_operation = contextvars.ContextVar("current_operation", default=None)
+_finished_operations = deque(maxlen=OPERATION_HISTORY_SIZE)
+_finished_lock = threading.Lock()
+
+
+@contextmanager
+def track_operation(name):
+    """Record every statement and commit run in this context (thread or task) under one operation.
+
+    Yields the OperationStats, which is complete once the block exits. Operations may nest; the
+    statements are recorded by the innermost one.
+    """
+    operation = OperationStats(name)
+    token = _current_operation.set(operation)
+    start = time.perf_counter()
+    try:
+        yield operation
+    finally:
+        operation.seconds = time.perf_counter() - start
+        _current_operation.reset(token)
+        with _finished_lock:
+            _finished_operations.append(operation)
+
+
+def recent_operations():
+    """Return the most recently finished operations, oldest first."""
+    with _finished_lock:
+        return list(_finished_operations)
+
+
+def clear_operations():
+    with _finished_lock:
+        _finished_operations.clear()
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor that records its statements in the current operation, if one is being tracked,
+    and reports statements slower than SLOW_QUERY_MS to the slow-query log.
+
+    A named (server-side) cursor spends its time in the FETCHes, so it is checked when closed.
+    """
+
+    _statement = None
+    _query = None
+
+    def _record(self, method, query, vars, explain=True):
+        operation = _current_operation.get()
+        if operation is None and not SLOW_QUERY_MS:
+            return method(query, vars)
+
+        text = query.decode() if isinstance(query, bytes) else str(query)
+        statement = StatementStats(" ".join(text.split())[:STATEMENT_TEXT_LIMIT])
+        start = time.perf_counter()
+        try:
+            result = method(query, vars)
+        finally:
+            statement.seconds = time.perf_counter() - start
+            if operation is not None:
+                operation.statements.append(statement)
+
+        # Client-side cursors hold every returned row after execute; named cursors count them per FETCH
+        if self.name is None and self.description is not None:
+            statement.rows = max(self.rowcount, 0)
+        self._statement = statement
+        self._query = (text, vars if explain else None, explain)
+        if self.name is None:
+            self._check_slow()
+        return result
+
+    def _check_slow(self):
+        statement, self._statement = self._statement, None
+        if statement is None or not SLOW_QUERY_MS or statement.seconds * 1000 < SLOW_QUERY_MS:
+            return
+
+        # Imported on first use: logging and the log file are only needed once a statement is slow
+        from .slow_query_log import log_slow_query
+
+        operation = _current_operation.get()
+        text, vars, explain = self._query
+        log_slow_query(statement, text, vars, explain_plan=explain, operation=operation.name if operation else None)
+
+    def _fetch(self, method, *args):
+        statement = self._statement
+        if self.name is None or statement is None:
+            return method(*args)
+
+        start = time.perf_counter()
+        result = method(*args)
+        statement.seconds += time.perf_counter() - start
+        statement.round_trips += 1
+        # fetchone returns a row tuple or None, fetchmany and fetchall a list of rows
+        statement.rows += len(result) if isinstance(result, list) else int(result is not None)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._record(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._record(super().executemany, query, vars_list, explain=False)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._record(lambda sql, file: super(InstrumentedCursor, self).copy_expert(sql, file, size), sql, file, explain=False)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.name is not None:
+                self._check_slow()
+
+
+class InstrumentedConnection(extensions.connection):
+    """Connection whose cursors and commits are recorded by track_operation()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedCursor
+
+    def commit(self):
+        operation = _current_operation.get()
+        if operation is None:
+            return super().commit()
+
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            operation.commit_seconds.append(time.perf_counter() - start)
+
+
+def connect_to_db():
+    """Connect to the correct PostgreSQL database based on environment."""
+    conn = psycopg2.connect(connection_factory=InstrumentedConnection, **get_database_config())
+    return conn
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of reusable PostgreSQL connections.
+
+    Callers block for up to ``timeout`` seconds when every connection is
+    checked out. Connections that sat idle for longer than
+    ``health_check_interval`` seconds are pinged before being handed out and
+    replaced if the server no longer answers.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=POOL_TIMEOUT, health_check_interval=POOL_HEALTH_CHECK_INTERVAL, **config):
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, connection_factory=InstrumentedConnection, **config)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+
+        # Fresh connections and recently used ones are trusted without a round trip
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def getconn(self):
+        """Check a connection out of the pool, waiting for a free slot if needed."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError("Timed out waiting for a free database connection.")
+
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, rolling back any unfinished transaction."""
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    self._discard(conn)
+                    return
+
+            with self._lock:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close every connection held by the pool."""
+        with self._lock:
+            self._last_used.clear()
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(POOL_MIN_SIZE, POOL_MAX_SIZE, **get_database_config())
+
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for the duration of a ``with`` block."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pool():
+    """Close the process-wide pool; the next checkout opens a new one."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
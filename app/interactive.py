@@ -0,0 +1,355 @@
+import inquirer
+from tabulate import tabulate
+from .books import add_book, get_books_page, import_books, list_books, modify_book, remove_book, search_books
+from .borrowers import add_borrower, modify_borrower, reconcile_loan_counts, remove_borrower_by_id, search_borrowers, validate_borrower, view_borrowers
+from .loans import borrow_book, get_loans_page, modify_loan, return_book, search_loan, view_loans
+
+
+def main_menu():
+    questions = [
+        inquirer.List(
+            "action",
+            message="What would you like to do?",
+            choices=["Manage Books", "Manage Borrowers", "Manage Loans", "Exit"],
+        ),
+    ]
+    answer = inquirer.prompt(questions)
+    return answer["action"]
+
+
+def manage_books():
+    questions = [
+        inquirer.List(
+            "action",
+            message="Book Management Options",
+            choices=[
+                "List books",
+                "Browse books",
+                "Search books",
+                "Add a book",
+                "Import books from CSV",
+                "Remove a book",
+                "Modify a book",
+                "Back to Main Menu",
+            ],
+        ),
+    ]
+    answer = inquirer.prompt(questions)
+    return answer["action"]
+
+
+def manage_borrowers():
+    questions = [
+        inquirer.List(
+            "action",
+            message="Borrower Management Options",
+            choices=[
+                "View borrowers",
+                "Search borrowers",
+                "Add a borrower",
+                "Remove a borrower",
+                "Modify a borrower",
+                "Reconcile loan counters",
+                "Back to Main Menu",
+            ],
+        ),
+    ]
+    answer = inquirer.prompt(questions)
+    return answer["action"]
+
+
+def manage_loans():
+    questions = [
+        inquirer.List(
+            "action",
+            message="Loan Management Options",
+            choices=[
+                "View loans",
+                "Browse loans",
+                "Search loans",
+                "Borrow a book",
+                "Return a book",
+                "Modify a loan",
+                "Back to Main Menu",
+            ],
+        ),
+    ]
+    answer = inquirer.prompt(questions)
+    return answer["action"]
+
+
+def browse_pages(fetch_page, page_key, headers, item_name):
+    # Page through rows one screen at a time. fetch_page uses keyset pagination, so moving to the
+    # next or previous page costs the same whether the user is on page 1 or page 100,000.
+    rows = fetch_page()
+
+    while True:
+        if rows:
+            print(tabulate(rows, headers, tablefmt="fancy_grid"))
+        else:
+            print(f"\nNo {item_name}s found.\n")
+
+        questions = [
+            inquirer.List(
+                "action",
+                message="Page navigation",
+                choices=["Next page", "Previous page", f"Jump to {item_name} ID", "Back"],
+            ),
+        ]
+        action = inquirer.prompt(questions)["action"]
+
+        if action == "Back":
+            break
+
+        if action.startswith("Jump"):
+            try:
+                target = int(input(f"Enter the {item_name} ID to jump to: "))
+            except ValueError:
+                print(f"\nError: {item_name.capitalize()} ID must be an integer.\n")
+                continue
+            rows = fetch_page(start=target)
+        elif not rows:
+            # Nothing to navigate from, so start over at the first page
+            rows = fetch_page()
+        elif action == "Next page":
+            page = fetch_page(after=page_key(rows[-1]))
+            if page:
+                rows = page
+            else:
+                print("\nThis is the last page.\n")
+        elif action == "Previous page":
+            page = fetch_page(before=page_key(rows[0]))
+            if page:
+                rows = page
+            else:
+                print("\nThis is the first page.\n")
+
+
+def browse_books_interaction():
+    headers = ["Book ID", "Title", "Author", "Genre", "Published Year", "Availability"]
+    browse_pages(get_books_page, lambda book: book[0], headers, "book")
+
+
+def search_books_interaction():
+    keyword = input("Enter a keyword to search for books (title, author, genre, or published year), or filters such as author:tolkien year:1950..1960: ").strip()
+
+    if keyword:
+        search_books(keyword)
+    else:
+        print("\nNo keyword entered. Please try again.\n")
+
+
+def add_book_interaction():
+    try:
+        title = input("Enter book title: ")
+        author_id = int(input("Enter author ID: "))
+        genre_id = int(input("Enter genre ID: "))
+        published_year = int(input("Enter published year: "))
+    except ValueError:
+        print("\nError: Author ID, Genre ID, and Published Year must be integers.\n")
+        return
+
+    add_book(title, author_id, genre_id, published_year)
+
+
+def import_books_interaction():
+    csv_path = input("Enter the path of the CSV file (columns: title, author_id, genre_id, published_year): ").strip()
+
+    if not csv_path:
+        print("\nNo file entered. Please try again.\n")
+        return
+
+    try:
+        import_books(csv_path)
+    except OSError as error:
+        print(f"\nError: Could not read '{csv_path}': {error.strerror}.\n")
+
+
+def remove_book_interaction():
+    try:
+        book_id = int(input("Enter the book ID to remove: "))
+    except ValueError:
+        print("\nError: Book ID must be an integer.\n")
+        return
+
+    remove_book(book_id)
+
+
+def modify_book_interaction():
+    try:
+        book_id = int(input("Enter the book ID to modify: "))
+    except ValueError:
+        print("\nError: Book ID must be an integer.\n")
+        return
+    
+    modify_book(book_id)
+
+
+def search_borrowers_interaction():
+    keyword = input("Enter a keyword to search for borrowers (name, email, or phone): ").strip()
+
+    if keyword:
+        search_borrowers(keyword)
+    else:
+        print("\nNo keyword entered. Please try again.\n")
+
+
+def add_borrower_interaction():
+    name = input("Enter borrower's name: ")
+    email = input("Enter borrower's email: ")
+    phone = input("Enter borrower's phone number: ")
+
+    error = validate_borrower(name, email, phone)
+    if error:
+        print(f"\nError: {error}\n")
+        return
+
+    add_borrower(name, email, phone)
+
+
+def remove_borrower_interaction():
+    try:
+        borrower_id = int(input("Enter the borrower ID: "))
+    except ValueError:
+        print("\nError: Borrower ID must be an integer.\n")
+        return
+
+    remove_borrower_by_id(borrower_id)
+
+
+def modify_borrower_interaction():
+    try:
+        borrower_id = int(input("Enter the borrower ID: "))
+    except ValueError:
+        print("\nError: Borrower ID must be an integer.\n")
+        return
+
+    modify_borrower(borrower_id)
+
+
+def browse_loans_interaction():
+    headers = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
+    browse_pages(get_loans_page, lambda loan: (loan[3], loan[0]), headers, "loan")
+
+
+def reconcile_loan_counts_interaction():
+    if not reconcile_loan_counts():
+        return
+
+    while True:
+        confirmation = input("Do you want to repair these counters (yes/no)? ").strip().lower()
+        if confirmation in ["yes", "no"]:
+            break
+        else:
+            print("\nPlease enter 'yes' or 'no'.")
+
+    if confirmation == "yes":
+        reconcile_loan_counts(repair=True)
+    else:
+        print("\nOperation cancelled.\n")
+
+
+def search_loans_interaction():
+    keyword = input("Enter a keyword to search for loans (book title or borrower name): ").strip()
+
+    if keyword:
+        search_loan(keyword)
+    else:
+        print("\nNo keyword entered. Please try again.\n")
+
+
+def borrow_book_interaction():
+    try:
+        book_id = int(input("Enter the book ID to borrow: "))
+        borrower_id = int(input("Enter the borrower ID: "))
+    except ValueError:
+        print("\nError: Both Book ID and Borrower ID must be integers.\n")
+        return
+
+    borrow_book(book_id, borrower_id)
+
+
+def return_book_interaction():
+    try:
+        loan_id = int(input("Enter the loan ID to return: "))
+    except ValueError:
+        print("\nError: Loan ID must be an integer.\n")
+        return
+
+    return_book(loan_id)
+
+
+def modify_loan_interaction():
+    try:
+        loan_id = int(input("Enter the loan ID to modify: "))
+    except ValueError:
+        print("\nError: Loan ID must be an integer.\n")
+        return
+
+    modify_loan(loan_id)
+
+
+def run():
+    while True:
+        action = main_menu()
+
+        if action == "Manage Books":
+            while True:
+                book_action = manage_books()
+                if book_action == "List books":
+                    list_books()
+                elif book_action == "Browse books":
+                    browse_books_interaction()
+                elif book_action == "Search books":
+                    search_books_interaction()
+                elif book_action == "Add a book":
+                    add_book_interaction()
+                elif book_action == "Import books from CSV":
+                    import_books_interaction()
+                elif book_action == "Remove a book":
+                    remove_book_interaction()
+                elif book_action == "Modify a book":
+                    modify_book_interaction()
+                elif book_action == "Back to Main Menu":
+                    break
+
+        elif action == "Manage Borrowers":
+            while True:
+                borrower_action = manage_borrowers()
+                if borrower_action == "View borrowers":
+                    view_borrowers()
+                elif borrower_action == "Search borrowers":
+                    search_borrowers_interaction()
+                elif borrower_action == "Add a borrower":
+                    add_borrower_interaction()
+                elif borrower_action == "Remove a borrower":
+                    remove_borrower_interaction()
+                elif borrower_action == "Modify a borrower":
+                    modify_borrower_interaction()
+                elif borrower_action == "Reconcile loan counters":
+                    reconcile_loan_counts_interaction()
+                elif borrower_action == "Back to Main Menu":
+                    break
+
+        elif action == "Manage Loans":
+            while True:
+                loan_action = manage_loans()
+                if loan_action == "View loans":
+                    view_loans()
+                elif loan_action == "Browse loans":
+                    browse_loans_interaction()
+                elif loan_action == "Search loans":
+                    search_loans_interaction()
+                elif loan_action == "Borrow a book":
+                    borrow_book_interaction()
+                elif loan_action == "Return a book":
+                    return_book_interaction()
+                elif loan_action == "Modify a loan":
+                    modify_loan_interaction()
+                elif loan_action == "Back to Main Menu":
+                    break
+
+        elif action == "Exit":
+            print("Thank you for using our library system!")
+            break
+
@@ -0,0 +1,291 @@
+"""Self-checkout kiosk mode: a continuous stream of borrow and return scans.
+
+Reads one event per line, from stdin or, with --port, from any number of TCP clients:
+
+    borrow BOOK_ID BORROWER_ID
+    return LOAN_ID
+    return-book BOOK_ID
+
+and answers each with one JSON line, e.g. {"event": "return 42", "status": "ok", "loan": {...}}.
+The status is a BORROW_* code of app.services for a borrow, "ok" or "no_active_loan" for a
+return, and "invalid" or "error" (with an "error" message) for a line that could not be run.
+
+All events run over one persistent connection, as statements prepared once with generic plans,
+and each in its own savepoint so that a failed event leaves the rest of its group intact. Commits
+are grouped: every --group-size events, or --group-ms milliseconds after the first uncommitted
+event, whichever comes first. Results are
+written once their group has committed, so an "ok" is durable. Until then the books of the group
+stay claimed, so another desk lending the same book waits at most --group-ms.
+
+Usage: python -m app.kiosk [--port PORT] [--group-size N] [--group-ms MS]
+"""
+import argparse
+import itertools
+import json
+import queue
+import re
+import socketserver
+import sys
+import threading
+import time
+import psycopg2
+from .db_connection import connect_to_db
+from .output import json_value
+from .records import Loan
+from .services import BORROW_QUERY, CLOSE_BOOK_LOANS_QUERY, CLOSE_LOANS_QUERY, borrow_result
+
+# Events committed together at most
+GROUP_SIZE = 100
+
+# Milliseconds the first event of a group waits for its commit at most
+GROUP_MS = 20
+
+RETURN_OK = "ok"
+RETURN_NO_ACTIVE_LOAN = "no_active_loan"
+EVENT_INVALID = "invalid"
+EVENT_ERROR = "error"
+
+# Number of IDs each action takes
+ACTIONS = {"borrow": 2, "return": 1, "return-book": 1}
+
+# Statements prepared on the kiosk connection: name -> (parameter types, query)
+PREPARED = {
+    "kiosk_borrow": ("INT, INT", BORROW_QUERY),
+    "kiosk_return": ("INT[]", CLOSE_LOANS_QUERY),
+    "kiosk_return_book": ("INT[]", CLOSE_BOOK_LOANS_QUERY),
+}
+
+# Prepared statement of each action
+ACTION_STATEMENTS = {"borrow": "kiosk_borrow", "return": "kiosk_return", "return-book": "kiosk_return_book"}
+
+# Releases the savepoint of the previous event and opens the next one in the same round trip as
+# the event's statement
+_NEXT_SAVEPOINT = "RELEASE SAVEPOINT kiosk_event; SAVEPOINT kiosk_event; "
+_FIRST_SAVEPOINT = "SAVEPOINT kiosk_event; "
+
+
+class KioskError(ValueError):
+    """Raised for an event line that cannot be parsed; the message says why."""
+
+
+def parse_event(line):
+    """Return the (action, IDs) of an event line, or raise KioskError."""
+    if not line.split():
+        raise KioskError("Empty event.")
+    action, *values = line.split()
+    if action not in ACTIONS:
+        raise KioskError(f"Unknown action '{action}'; expected one of: {', '.join(ACTIONS)}.")
+    if len(values) != ACTIONS[action] or not all(value.isdigit() for value in values):
+        raise KioskError(f"'{action}' takes {ACTIONS[action]} numeric ID(s).")
+    return action, [int(value) for value in values]
+
+
+def _positional(query):
+    # Rewrite the %s placeholders of a query as $1, $2, ... for PREPARE
+    numbers = itertools.count(1)
+    return re.sub(r"%s", lambda match: f"${next(numbers)}", query)
+
+
+def connect_kiosk():
+    """Open a connection with the kiosk statements prepared.
+
+    The statements are planned once: a generic plan skips the per-call planning of the loans
+    partitions, which costs more than running the statement.
+    """
+    conn = connect_to_db()
+    with conn.cursor() as cur:
+        cur.execute("SET plan_cache_mode = force_generic_plan")
+        for name, (types, query) in PREPARED.items():
+            cur.execute(f"PREPARE {name} ({types}) AS {_positional(query)}")
+    conn.commit()
+    return conn
+
+
+def result_line(event, status, loan=None, error=None):
+    result = {"event": event, "status": status, "loan": loan._asdict() if loan else None}
+    if error:
+        result["error"] = error
+    return json.dumps(result, default=json_value)
+
+
+class Kiosk:
+    """Runs events over one connection and commits them in groups.
+
+    Each event comes with a reply callable, which receives its JSON result line once the
+    event's group has committed (or failed to).
+    """
+
+    def __init__(self, group_size=GROUP_SIZE, group_ms=GROUP_MS):
+        self.group_size = group_size
+        self.group_ms = group_ms
+        self.conn = connect_kiosk()
+        self.pending = []
+        self.deadline = None
+
+    def _run(self, action, ids):
+        # Run one parsed event and return its (status, Loan or None)
+        params = ids if action == "borrow" else [ids]
+        placeholders = ", ".join(["%s"] * len(params))
+        with self.conn.cursor() as cur:
+            savepoint = _NEXT_SAVEPOINT if self.pending else _FIRST_SAVEPOINT
+            cur.execute(f"{savepoint}EXECUTE {ACTION_STATEMENTS[action]} ({placeholders})", params)
+            row = cur.fetchone()
+
+        if action == "borrow":
+            return borrow_result(row, *ids)
+        return (RETURN_OK, Loan._make(row)) if row else (RETURN_NO_ACTIVE_LOAN, None)
+
+    def submit(self, line, reply):
+        """Run one event line in the open group, committing the group when it is full."""
+        event = line.strip()
+        try:
+            action, ids = parse_event(event)
+        except KioskError as error:
+            # Nothing ran, but the result waits for the open group to keep the results in order
+            result = result_line(event, EVENT_INVALID, error=str(error))
+            if self.pending:
+                self.pending.append((reply, event, result, False))
+            else:
+                reply(result)
+            return
+
+        try:
+            status, loan = self._run(action, ids)
+            result = result_line(event, status, loan)
+        except psycopg2.Error as error:
+            if self.conn.closed:
+                self.pending.append((reply, event, None, True))
+                self._abort(error)
+                return
+            # The savepoint is still open after ROLLBACK TO, so the next event releases it as usual
+            self.conn.cursor().execute("ROLLBACK TO SAVEPOINT kiosk_event")
+            result = result_line(event, EVENT_ERROR, error=str(error).strip())
+
+        if not self.pending:
+            self.deadline = time.monotonic() + self.group_ms / 1000
+        self.pending.append((reply, event, result, True))
+        if len(self.pending) >= self.group_size:
+            self.commit()
+
+    def timeout(self):
+        """Return the seconds until the open group is due, or None if there is none."""
+        return max(self.deadline - time.monotonic(), 0) if self.pending else None
+
+    def commit(self):
+        """Commit the open group and send the result of each of its events."""
+        if not self.pending:
+            return
+
+        try:
+            self.conn.commit()
+        except psycopg2.Error as error:
+            self._abort(error)
+            return
+
+        pending, self.pending = self.pending, []
+        for reply, event, result, ran in pending:
+            reply(result)
+
+    def _abort(self, error):
+        # Nothing of the open group was saved: report it as failed and start over, on a new
+        # connection if this one was lost
+        if self.conn.closed:
+            self.conn = connect_kiosk()
+        else:
+            self.conn.rollback()
+
+        message = f"The group was not committed: {str(error).strip()}"
+        pending, self.pending = self.pending, []
+        for reply, event, result, ran in pending:
+            reply(result_line(event, EVENT_ERROR, error=message) if ran else result)
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def serve(events, kiosk):
+    """Feed (line, reply) pairs from a queue to the kiosk until a None arrives, then commit and return."""
+    while True:
+        try:
+            item = events.get(timeout=kiosk.timeout())
+        except queue.Empty:
+            kiosk.commit()
+            continue
+        if item is None:
+            kiosk.commit()
+            return
+        kiosk.submit(*item)
+        if kiosk.timeout() == 0:
+            kiosk.commit()
+
+
+def read_lines(stream, events, reply):
+    # Queue every non-blank line of a stream with its reply callable and return how many were queued
+    queued = 0
+    for line in stream:
+        if line.strip():
+            events.put((line, reply))
+            queued += 1
+    return queued
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    # One kiosk connection: its events go to the shared queue and its results come back in order
+
+    def handle(self):
+        replied = threading.Semaphore(0)
+
+        def reply(result):
+            try:
+                self.wfile.write(result.encode("utf-8") + b"\n")
+            except OSError:
+                pass
+            replied.release()
+
+        lines = (raw_line.decode("utf-8", errors="replace") for raw_line in self.rfile)
+        # Once the client stops sending, wait for its last results before the connection closes
+        for _ in range(read_lines(lines, self.server.events, reply)):
+            replied.acquire()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.kiosk", description="Run a stream of borrow and return events with group commit.")
+    parser.add_argument("--port", type=int, help="serve TCP clients on this port instead of reading stdin")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on with --port (default: 127.0.0.1)")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE, help=f"events per commit at most (default: {GROUP_SIZE})")
+    parser.add_argument("--group-ms", type=int, default=GROUP_MS, help=f"milliseconds an event waits for its commit at most (default: {GROUP_MS})")
+    args = parser.parse_args(argv)
+    if args.group_size < 1 or args.group_ms < 0:
+        parser.error("--group-size must be at least 1 and --group-ms at least 0")
+
+    events = queue.Queue()
+    kiosk = Kiosk(args.group_size, args.group_ms)
+
+    if args.port is None:
+        def reply(result):
+            print(result, flush=True)
+
+        def read_stdin():
+            read_lines(sys.stdin, events, reply)
+            events.put(None)
+
+        threading.Thread(target=read_stdin, daemon=True).start()
+    else:
+        server = socketserver.ThreadingTCPServer((args.host, args.port), _ClientHandler)
+        server.daemon_threads = True
+        server.events = events
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Kiosk listening on {args.host}:{args.port}", file=sys.stderr, flush=True)
+
+    try:
+        serve(events, kiosk)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        kiosk.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,218 +1,165 @@
-from .db_connection import connect_to_db
 from tabulate import tabulate
+from .output import PAGE_SIZE, STREAM_BATCH_SIZE, write_stream
+from .services import (
+    BORROW_BOOK_NOT_FOUND,
+    BORROW_BOOK_UNAVAILABLE,
+    BORROW_BORROWER_NOT_FOUND,
+    BORROW_OK,
+    ConflictError,
+    close_loan,
+    close_loans,
+    create_loan,
+    find_loans,
+    get_loan,
+    iter_loans,
+    loans_page,
+    update_loan_return_date,
+)
 from datetime import datetime
 
-def view_loans():
-    # Fetch and display all loans with borrower and book details
-    conn = connect_to_db()
-    cur = conn.cursor()
+LOAN_HEADERS = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
 
-    cur.execute(
-        """
-        SELECT loans.loan_id, books.title, borrowers.name, loans.loan_date, loans.return_date
-        FROM loans
-        JOIN books ON loans.book_id = books.book_id
-        JOIN borrowers ON loans.borrower_id = borrowers.borrower_id
-        ORDER BY loans.loan_date DESC
-        """
-    )
 
-    loans = cur.fetchall()
+def loan_row(loan):
+    # Display row of a Loan record
+    return (loan.loan_id, loan.title, loan.borrower, loan.loan_date, loan.return_date)
 
-    if loans:
-        headers = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
-        print(tabulate(loans, headers, tablefmt="fancy_grid"))
-        print(f"\nTotal number of loans: {len(loans)}\n")
+
+def view_loans(batch_size=STREAM_BATCH_SIZE, output_format="table", include_archived=False):
+    # Fetch and display all loans with borrower and book details; archived loans only if include_archived is set.
+    # output_format is "table", "jsonl" or "csv"; jsonl and csv print nothing but the rows.
+    # Rows are streamed from a server-side cursor in batches, so memory stays flat for any loan history size
+    batches = ([loan_row(loan) for loan in loans] for loans in iter_loans(batch_size, include_archived))
+    total = write_stream(batches, LOAN_HEADERS, output_format)
+
+    if output_format != "table":
+        return
+    if total:
+        print(f"\nTotal number of loans: {total}\n")
     else:
         print("\nNo loans found.\n")
 
-    cur.close()
-    conn.close()
 
+def get_loans_page(after=None, before=None, start=None, page_size=PAGE_SIZE, include_archived=False):
+    # Return one page of loan display rows, newest first, using keyset pagination on (loan_date, loan_id)
+    # (see services.loans_page). The key of a row is (row[3], row[0]).
+    loans = loans_page(after=after, before=before, start=start, page_size=page_size, include_archived=include_archived)
+    return [loan_row(loan) for loan in loans]
 
-def search_loan(keyword):
-    # Search for a loan by book title or borrower name using a single keyword
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    query = """
-        SELECT loans.loan_id, books.title, borrowers.name, loans.loan_date, loans.return_date
-        FROM loans
-        JOIN books ON loans.book_id = books.book_id
-        JOIN borrowers ON loans.borrower_id = borrowers.borrower_id
-        WHERE books.title ILIKE %s
-           OR borrowers.name ILIKE %s
-        """
+def search_loan(keyword, output_format="table", include_archived=False):
+    # Search for a loan by book title or borrower name using a single keyword, shown as a table or streamed as "jsonl" or "csv".
+    # Archived loans are searched too if include_archived is set.
+    batches = ([loan_row(loan) for loan in loans] for loans in find_loans(keyword, include_archived=include_archived))
 
-    keyword_formatted = f"%{keyword}%"
-    params = [keyword_formatted, keyword_formatted]
+    if output_format != "table":
+        write_stream(batches, LOAN_HEADERS, output_format)
+        return
 
-    cur.execute(query, params)
-    loans = cur.fetchall()
+    loans = [row for rows in batches for row in rows]
 
     if loans:
-        headers = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
-        print(tabulate(loans, headers, tablefmt="fancy_grid"))
+        print(tabulate(loans, LOAN_HEADERS, tablefmt="fancy_grid"))
         print(f"\nTotal number of loans found: {len(loans)}\n")
     else:
         print(f"\nNo loans found matching the keyword: '{keyword}'\n")
 
-    cur.close()
-    conn.close()
-
 
 def borrow_book(book_id, borrower_id):
-    # Borrow a book and create a loan record, ensuring that the book is available
-    conn = connect_to_db()
-    cur = conn.cursor()
-
-    cur.execute("SELECT title FROM books WHERE book_id = %s", (book_id,))
-    book_exists = cur.fetchone()
+    # Borrow a book and create a loan record in a single statement (see services.create_loan).
+    # Returns one of the BORROW_* codes.
+    status, loan = create_loan(book_id, borrower_id)
 
-    cur.execute("SELECT name FROM borrowers WHERE borrower_id = %s", (borrower_id,))
-    borrower_exists = cur.fetchone()
-
-    if not book_exists:
+    if status == BORROW_BOOK_NOT_FOUND:
         print("\nError: Invalid book ID. This book does not exist.\n")
-    elif not borrower_exists:
+    elif status == BORROW_BORROWER_NOT_FOUND:
         print("\nError: Invalid borrower ID. This borrower does not exist.\n")
+    elif status == BORROW_BOOK_UNAVAILABLE:
+        print("\nError: This book is not available for borrowing.\n")
     else:
-        cur.execute(
-            "SELECT title FROM books WHERE book_id = %s AND is_available = TRUE", (book_id,)
-        )
-        book = cur.fetchone()
-
-        if not book:
-            print("\nError: This book is not available for borrowing.\n")
-        else:
-            title = book[0]
-
-            cur.execute(
-                """
-                INSERT INTO loans (book_id, borrower_id, loan_date)
-                VALUES (%s, %s, CURRENT_DATE)
-                RETURNING loan_id, loan_date
-                """,
-                (book_id, borrower_id),
-            )
-
-            loan_id, loan_date = cur.fetchone()
-
-            cur.execute("UPDATE books SET is_available = FALSE WHERE book_id = %s", (book_id,))
-            conn.commit()
-
-            borrower = borrower_exists[0]
-
-            headers = ["Loan ID", "Title", "Borrower", "Loan Date", "Return Date"]
-            loan_details = [(loan_id, title, borrower, loan_date, "")]
-            print(tabulate(loan_details, headers, tablefmt="fancy_grid"))
+        headers = ["Loan ID", "Title", "Borrower", "Loan Date", "Return Date"]
+        print(tabulate([loan_row(loan)[:4] + ("",)], headers, tablefmt="fancy_grid"))
 
-            print(f"\nLoan ID {loan_id}: Book '{title}' borrowed successfully by {borrower}.\n")
+        print(f"\nLoan ID {loan.loan_id}: Book '{loan.title}' borrowed successfully by {loan.borrower}.\n")
 
-    cur.close()
-    conn.close()
+    return status
 
 
 def return_book(loan_id):
-    # Return a book and update the loan record
-    conn = connect_to_db()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT loans.book_id, books.title, borrowers.name, loans.loan_date
-        FROM loans
-        JOIN books ON loans.book_id = books.book_id
-        JOIN borrowers ON loans.borrower_id = borrowers.borrower_id
-        WHERE loans.loan_id = %s AND loans.return_date IS NULL
-        """,
-        (loan_id,),
-    )
-    loan = cur.fetchone()
+    # Return a book and update the loan record. Returns the closed Loan, or None if the loan was not active.
+    loan = close_loan(loan_id)
 
     if not loan:
         print("\nError: No active loan found with the provided loan ID.\n")
     else:
-        book_id, title, borrower, loan_date = loan
+        headers = ["Loan ID", "Title", "Borrower", "Loan Date", "Return Date"]
+        print(tabulate([loan_row(loan)], headers, tablefmt="fancy_grid"))
 
-        cur.execute("UPDATE loans SET return_date = CURRENT_DATE WHERE loan_id = %s", (loan_id,))
-        cur.execute("UPDATE books SET is_available = TRUE WHERE book_id = %s", (book_id,))
-        conn.commit()
+        print(f"\nLoan ID {loan_id}: Book '{loan.title}' returned successfully.\n")
 
-        cur.execute("SELECT return_date FROM loans WHERE loan_id = %s", (loan_id,))
-        return_date = cur.fetchone()[0]
+    return loan
 
-        headers = ["Loan ID", "Title", "Borrower", "Loan Date", "Return Date"]
-        loan_details = [(loan_id, title, borrower, loan_date, return_date)]
-        print(tabulate(loan_details, headers, tablefmt="fancy_grid"))
 
-        print(f"\nLoan ID {loan_id}: Book '{title}' returned successfully.\n")
+def return_books(ids, by_book=False):
+    # Return many books at once, e.g. the contents of a drop box, in a single transaction (see services.close_loans).
+    # ids are loan IDs, or book IDs if by_book is set. Returns the IDs that had no active loan.
+    closed, not_active = close_loans(ids, by_book=by_book)
+    kind = "book" if by_book else "loan"
 
-    cur.close()
-    conn.close()
+    if closed:
+        print(tabulate([loan_row(loan) for loan in closed], LOAN_HEADERS, tablefmt="fancy_grid"))
+        print(f"\nReturned {len(closed)} book(s) successfully.\n")
+    if not_active:
+        print(f"\nError: No active loan found for {kind} ID(s): {', '.join(map(str, not_active))}\n")
 
+    return not_active
 
-def modify_loan(loan_id):
-    # Modify loan details, ensuring return date is not earlier than loan date and only if the loan has been returned
-    conn = connect_to_db()
-    cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT loans.loan_id, books.title, borrowers.name, loans.loan_date, loans.return_date
-        FROM loans
-        JOIN books ON loans.book_id = books.book_id
-        JOIN borrowers ON loans.borrower_id = borrowers.borrower_id
-        WHERE loans.loan_id = %s
-        """,
-        (loan_id,),
-    )
-    loan = cur.fetchone()
+def modify_loan(loan_id, new_return_date=None):
+    # Modify loan details, ensuring return date is not earlier than loan date and only if the loan has been returned.
+    # For scripted use, pass new_return_date (YYYY-MM-DD) to skip the prompts.
+    loan = get_loan(loan_id)
 
     if loan:
-        loan_id, book_title, borrower_name, loan_date, return_date = loan
-        headers = ["Loan ID", "Book Title", "Borrower", "Loan Date", "Return Date"]
-        print(tabulate([loan], headers, tablefmt="fancy_grid"))
+        print(tabulate([loan_row(loan)], LOAN_HEADERS, tablefmt="fancy_grid"))
 
-        if return_date is None:
+        if loan.return_date is None:
             print("\nError: This loan has not been returned yet. Modification is not allowed.\n")
         else:
-            while True:
+            confirm = "yes"
+            while new_return_date is None:
                 confirm = input("Do you want to modify this loan's return date? (yes/no): ").strip().lower()
                 if confirm in ["yes", "no"]:
                     break
                 else:
                     print("\nPlease enter 'yes' or 'no'.")
 
+            if confirm == "yes" and new_return_date is not None:
+                try:
+                    datetime.strptime(new_return_date, "%Y-%m-%d")
+                except ValueError:
+                    print("\nError: Please enter a valid date in the format YYYY-MM-DD.\n")
+                    return
+
             if confirm == "yes":
-                while True:
-                    new_return_date = input(f"\nEnter new return date in the format YYYY-MM-DD (current: {return_date}): ").strip()
+                while new_return_date is None:
+                    new_return_date = input(f"\nEnter new return date in the format YYYY-MM-DD (current: {loan.return_date}): ").strip()
 
                     # Validate if the input is a date in the correct format
                     try:
                         datetime.strptime(new_return_date, "%Y-%m-%d")
-                        break
                     except ValueError:
                         print("\nError: Please enter a valid date in the format YYYY-MM-DD.")
-
-                # Ensure the new return date is not earlier than the loan date
-                if new_return_date >= str(loan_date):
-                    cur.execute(
-                        """
-                        UPDATE loans
-                        SET return_date = %s
-                        WHERE loan_id = %s
-                        """,
-                        (new_return_date, loan_id),
-                    )
-                    conn.commit()
-                    print("\nLoan return date updated successfully.\n")
-                else:
-                    print("\nError: The return date cannot be earlier than the loan date.\n")
+                        new_return_date = None
+
+                # The return date may not be earlier than the loan date
+                try:
+                    update_loan_return_date(loan_id, new_return_date)
+                except ConflictError as error:
+                    print(f"\nError: {error}\n")
+                    return
+                print("\nLoan return date updated successfully.\n")
             else:
                 print("\nModification cancelled.\n")
     else:
         print(f"\nLoan not found with ID: {loan_id}\n")
-
-    cur.close()
-    conn.close()
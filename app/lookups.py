@@ -0,0 +1,182 @@
+import psycopg2
+import threading
+from contextlib import contextmanager
+from .db_connection import connect_to_db, get_connection
+
+# Channel the authors and genres triggers notify on, with the table name as payload
+LOOKUP_CHANNEL = "library_lookups"
+
+# ID column of each cached table
+LOOKUP_KEYS = {"authors": "author_id", "genres": "genre_id"}
+
+
+class LookupCache:
+    """In-process copy of the small authors and genres tables.
+
+    Both tables are loaded together in one query on first use. A dedicated connection
+    LISTENs for the change notifications sent by their triggers; pending notifications are
+    drained from that connection's socket before every lookup, which costs no round trip,
+    and a notified table is reloaded on its next use. IDs added since the last load, whose
+    notification has not arrived yet, are fetched on their own when asked for.
+
+    A caller that holds a pooled connection passes it as conn, so a reload or fetch runs on it
+    rather than checking out a second one while the pool may be exhausted.
+    """
+
+    def __init__(self, channel=LOOKUP_CHANNEL):
+        self.channel = channel
+        self._lock = threading.RLock()
+        self._listener = None
+        self._tables = {}
+
+    def _listen(self):
+        listener = connect_to_db()
+        listener.autocommit = True
+        with listener.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return listener
+
+    def _drain_notifications(self):
+        if self._listener is None or self._listener.closed:
+            # Changes may have been missed while nobody was listening
+            self._listener = self._listen()
+            self._tables.clear()
+            return
+
+        try:
+            self._listener.poll()
+        except psycopg2.Error:
+            self._listener.close()
+            self._listener = self._listen()
+            self._tables.clear()
+            return
+
+        for notification in self._listener.notifies:
+            self._tables.pop(notification.payload, None)
+        self._listener.notifies.clear()
+
+    @staticmethod
+    @contextmanager
+    def _cursor(conn):
+        # A cursor on the caller's connection, within its transaction and left uncommitted (a stream
+        # may still be reading from it), or else on a pooled connection for just this query
+        if conn is not None:
+            with conn.cursor() as cur:
+                yield cur
+            return
+
+        with get_connection() as pooled, pooled.cursor() as cur:
+            yield cur
+            pooled.commit()
+
+    def _load(self, conn=None):
+        with self._cursor(conn) as cur:
+            cur.execute(
+                """
+                SELECT 'authors', author_id, name FROM authors
+                UNION ALL
+                SELECT 'genres', genre_id, name FROM genres
+                """
+            )
+            tables = {"authors": {}, "genres": {}}
+            for table, key, name in cur.fetchall():
+                tables[table][key] = name
+
+        self._tables = tables
+
+    def _fetch(self, name, keys, conn=None):
+        # Add the given IDs of a table to the cache in one query; unknown IDs stay missing. The
+        # table is replaced rather than updated, as callers may be iterating over it
+        key_column = LOOKUP_KEYS[name]
+        with self._cursor(conn) as cur:
+            cur.execute(f"SELECT {key_column}, name FROM {name} WHERE {key_column} = ANY(%s)", (list(keys),))
+            rows = cur.fetchall()
+
+        if rows:
+            self._tables[name] = {**self._tables[name], **dict(rows)}
+
+    def table(self, name, conn=None):
+        """Return the id -> name mapping of "authors" or "genres"."""
+        with self._lock:
+            self._drain_notifications()
+            if name not in self._tables:
+                self._load(conn)
+            return self._tables[name]
+
+    def names(self, name, keys, conn=None):
+        """Return the id -> name mapping of "authors" or "genres", fetching any of the given IDs
+        it lacks in case they were just added."""
+        with self._lock:
+            table = self.table(name, conn)
+            missing = {key for key in keys if key is not None and key not in table}
+            if missing:
+                self._fetch(name, missing, conn)
+            return self._tables[name]
+
+    def exists(self, name, key):
+        """Return whether an ID exists, looking it up on its own on a miss in case it was just added."""
+        return key in self.names(name, (key,))
+
+    def matching(self, name, keyword):
+        """Return the IDs whose name contains the keyword, case-insensitively (like ILIKE '%kw%')."""
+        keyword = keyword.lower()
+        return [key for key, value in self.table(name).items() if keyword in value.lower()]
+
+    def invalidate(self):
+        with self._lock:
+            self._tables.clear()
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None:
+                self._listener.close()
+                self._listener = None
+            self._tables.clear()
+
+
+_cache = LookupCache()
+
+
+def author_exists(author_id):
+    return _cache.exists("authors", author_id)
+
+
+def genre_exists(genre_id):
+    return _cache.exists("genres", genre_id)
+
+
+def author_names(author_ids=(), conn=None):
+    """Return the cached author_id -> name mapping, including the given IDs if they exist; treat it as read-only.
+
+    Pass the connection the caller holds, if any, for a reload to run on.
+    """
+    return _cache.names("authors", author_ids, conn)
+
+
+def genre_names(genre_ids=(), conn=None):
+    """Return the cached genre_id -> name mapping, including the given IDs if they exist; treat it as read-only.
+
+    Pass the connection the caller holds, if any, for a reload to run on.
+    """
+    return _cache.names("genres", genre_ids, conn)
+
+
+def author_name(author_id):
+    return _cache.table("authors").get(author_id)
+
+
+def genre_name(genre_id):
+    return _cache.table("genres").get(genre_id)
+
+
+def matching_author_ids(keyword):
+    return _cache.matching("authors", keyword)
+
+
+def matching_genre_ids(keyword):
+    return _cache.matching("genres", keyword)
+
+
+def close_lookups():
+    """Stop listening for changes and drop the cached tables."""
+    _cache.close()
@@ -0,0 +1,287 @@
+"""Versioned schema migrations for existing library databases.
+
+Migrations are the SQL files in db/migrations, named ``<version>_<name>.sql`` and applied
+in version order, each in its own transaction. A fresh database created from db/init.sql
+already contains every migration and is stamped as such.
+
+A migration can declare EXPLAIN checks in its header, one per line::
+
+    -- check: <index name> | <query>
+
+When a migration is applied with verification, each query is explained before and after
+the migration; the migration is rolled back unless the named index appears in the new plan
+and not in the old one.
+
+A check's query may stop fitting the schema after a later migration, e.g. one that drops an
+index the query also relied on. Migrations are history and are not edited; instead the later
+migration restates the check::
+
+    -- recheck: <index name> | <query>
+
+A recheck only requires the index to be used after its migration. It then stands in for the
+earlier checks of the same index, both when they are applied and when they are verified.
+
+Usage: python -m app.migrations [status | upgrade [--no-verify] | verify]
+"""
+import argparse
+import os
+import psycopg2
+import re
+from collections import namedtuple
+from .db_connection import connect_to_db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "migrations")
+
+Migration = namedtuple("Migration", ["version", "name", "path", "checks"])
+Check = namedtuple("Check", ["index", "query", "recheck"])
+
+_FILENAME_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+_CHECK_PATTERN = re.compile(r"^--\s*(check|recheck):\s*(\w+)\s*\|\s*(.+)$")
+
+
+class MigrationError(Exception):
+    """Raised when a migration fails its EXPLAIN checks."""
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return every migration in the directory, ordered by version."""
+    migrations = []
+
+    for filename in os.listdir(directory):
+        match = _FILENAME_PATTERN.match(filename)
+        if not match:
+            continue
+
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as migration_file:
+            checks = [
+                Check(check.group(2), check.group(3), check.group(1) == "recheck")
+                for check in (_CHECK_PATTERN.match(line.strip()) for line in migration_file)
+                if check
+            ]
+
+        migrations.append(Migration(match.group(1), match.group(2), path, checks))
+
+    return sorted(migrations, key=lambda migration: int(migration.version))
+
+
+def restated(migration, migrations):
+    """Return a migration with each check replaced by the latest recheck of its index among the
+    given migrations that come after it."""
+    rechecks = {}
+    for later in migrations:
+        if int(later.version) > int(migration.version):
+            rechecks.update((check.index, check) for check in later.checks if check.recheck)
+
+    return migration._replace(checks=[
+        rechecks[check.index]._replace(recheck=check.recheck) if check.index in rechecks else check
+        for check in migration.checks
+    ])
+
+
+def ensure_migrations_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def applied_versions(cur):
+    ensure_migrations_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def explain(cur, query):
+    """Return the plan of a query as text, with sequential scans discouraged.
+
+    Sequential scans are disabled so that small or empty tables still show whether an
+    index is usable at all; the check is about plan shape, not cost.
+    """
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute(f"EXPLAIN {query}")
+    plan = "\n".join(row[0] for row in cur.fetchall())
+    cur.execute("RESET enable_seqscan")
+    return plan
+
+
+def _explain_before(cur, query):
+    # A check may use columns the migration itself creates, so its query can fail to plan beforehand
+    cur.execute("SAVEPOINT explain_before")
+    try:
+        plan = explain(cur, query)
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT explain_before")
+        plan = "(query not valid before this migration)"
+    cur.execute("RELEASE SAVEPOINT explain_before")
+    return plan
+
+
+def index_names(cur, index):
+    """Return the names under which an index can appear in a plan.
+
+    An index on a partitioned table is read through the indexes of its partitions, which
+    carry names of their own.
+    """
+    cur.execute("SELECT relid::TEXT FROM pg_partition_tree(to_regclass(%s))", (index,))
+    return {index} | {row[0] for row in cur.fetchall()}
+
+
+def _uses_index(plan, names):
+    return any(re.search(rf"\b(using|on) {re.escape(name)}\b", plan) for name in names)
+
+
+def _scan_summary(plan, names):
+    # The plan node that reads the index, or else the first scan node, e.g. "Seq Scan on loans"
+    lines = plan.splitlines()
+    node = next((line for line in lines if _uses_index(line, names)), None)
+    node = node or next((line for line in lines if "Scan" in line), lines[0])
+    return node.strip().lstrip("-> ").split("  (")[0]
+
+
+def apply_migration(conn, migration, verify=True):
+    """Apply one migration in its own transaction and return its plan changes.
+
+    The result is a list of (index, plan before, plan after) summaries, one per check.
+    """
+    cur = conn.cursor()
+    changes = []
+
+    try:
+        before = {check: _explain_before(cur, check.query) for check in migration.checks} if verify else {}
+
+        with open(migration.path, encoding="utf-8") as migration_file:
+            cur.execute(migration_file.read())
+
+        for check in migration.checks if verify else []:
+            after = explain(cur, check.query)
+            names = index_names(cur, check.index)
+            if not _uses_index(after, names):
+                raise MigrationError(f"{migration.version}_{migration.name}: index {check.index} is not used by: {check.query}\n{after}")
+            if not check.recheck and _uses_index(before[check], names):
+                raise MigrationError(f"{migration.version}_{migration.name}: plan for {check.index} did not change: {check.query}")
+            changes.append((check.index, _scan_summary(before[check], names), _scan_summary(after, names)))
+
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (migration.version, migration.name),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return changes
+
+
+def upgrade(verify=True):
+    """Apply every pending migration in order and return the versions applied."""
+    conn = connect_to_db()
+    applied = []
+
+    try:
+        with conn.cursor() as cur:
+            done = applied_versions(cur)
+            conn.commit()
+
+        migrations = load_migrations()
+        for migration in migrations:
+            if migration.version in done:
+                continue
+
+            changes = apply_migration(conn, restated(migration, migrations), verify=verify)
+            applied.append(migration.version)
+
+            print(f"Applied migration {migration.version}_{migration.name}.")
+            for index, before, after in changes:
+                print(f"  {index}: {before}  ->  {after}")
+    finally:
+        conn.close()
+
+    if not applied:
+        print("Database schema is up to date.")
+
+    return applied
+
+
+def _dropped_later(migration, index, done):
+    # Whether an applied migration after this one drops the index, e.g. 006 replacing 005's
+    pattern = re.compile(rf"^DROP INDEX\b[^;]*\b{re.escape(index)}\b", re.MULTILINE)
+    for later in load_migrations():
+        if int(later.version) > int(migration.version) and later.version in done:
+            with open(later.path, encoding="utf-8") as migration_file:
+                if pattern.search(migration_file.read()):
+                    return True
+    return False
+
+
+def verify():
+    """Check that every applied migration's indexes are used by its queries; return the failures."""
+    conn = connect_to_db()
+    failures = []
+
+    try:
+        with conn.cursor() as cur:
+            done = applied_versions(cur)
+            migrations = [migration for migration in load_migrations() if migration.version in done]
+            for migration in migrations:
+                for check in restated(migration, migrations).checks:
+                    cur.execute("SELECT to_regclass(%s)", (check.index,))
+                    if cur.fetchone()[0] is None and _dropped_later(migration, check.index, done):
+                        print(f"{migration.version}_{migration.name}: {check.index}: dropped by a later migration")
+                        continue
+                    plan = explain(cur, check.query)
+                    used = _uses_index(plan, index_names(cur, check.index))
+                    if not used:
+                        failures.append((migration.version, check.index))
+                    print(f"{migration.version}_{migration.name}: {check.index}: {'ok' if used else 'NOT USED'}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+    return failures
+
+
+def status():
+    """Print every migration with whether it has been applied."""
+    conn = connect_to_db()
+
+    try:
+        with conn.cursor() as cur:
+            done = applied_versions(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+    for migration in load_migrations():
+        state = "applied" if migration.version in done else "pending"
+        print(f"{migration.version}_{migration.name}: {state}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="Upgrade the library database schema in place.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("status", help="list migrations and whether they are applied")
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations (default)")
+    upgrade_parser.add_argument("--no-verify", action="store_true", help="skip the EXPLAIN checks")
+    commands.add_parser("verify", help="check that applied migrations' indexes are used")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        status()
+    elif args.command == "verify":
+        return 1 if verify() else 0
+    else:
+        upgrade(verify=not getattr(args, "no_verify", False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
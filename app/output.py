@@ -0,0 +1,162 @@
+import csv
+import json
+import sys
+import textwrap
+from datetime import date
+from decimal import Decimal
+
+# Number of rows fetched from a server-side cursor per round trip
+STREAM_BATCH_SIZE = 500
+
+# Number of rows shown per page by the interactive pager
+PAGE_SIZE = 20
+
+# Output formats accepted by the listing and search functions
+OUTPUT_FORMATS = ("table", "jsonl", "csv")
+
+
+def stream_query(conn, query, params=None, batch_size=STREAM_BATCH_SIZE):
+    """Run a query on a named (server-side) cursor and yield its rows in batches.
+
+    Only one batch is held in memory at a time, however large the result is.
+    """
+    with conn.cursor(name="stream_query") as cur:
+        cur.itersize = batch_size
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+class StreamingGrid:
+    """Render rows in the fancy_grid style one batch at a time.
+
+    Column widths are fixed by the headers and the first batch, so later batches
+    line up with it; longer values in later batches are wrapped inside their cell.
+    """
+
+    def __init__(self, headers):
+        self.headers = [str(header) for header in headers]
+        self.widths = None
+        self.numeric = None
+
+    @staticmethod
+    def _cell(value):
+        return "" if value is None else str(value)
+
+    def _border(self, left, fill, middle, right):
+        return left + middle.join(fill * (width + 2) for width in self.widths) + right
+
+    def _line(self, cells, right_align):
+        wrapped = [[cell] if len(cell) <= width else textwrap.wrap(cell, width) for cell, width in zip(cells, self.widths)]
+        lines = []
+        for i in range(max(len(parts) for parts in wrapped)):
+            parts = []
+            for column, width in enumerate(self.widths):
+                text = wrapped[column][i] if i < len(wrapped[column]) else ""
+                parts.append(text.rjust(width) if right_align[column] else text.ljust(width))
+            lines.append("│ " + " │ ".join(parts) + " │")
+        return "\n".join(lines)
+
+    def render_batch(self, rows):
+        """Return the text for one batch of rows, including the header for the first batch."""
+        out = []
+
+        if self.widths is None:
+            self.widths = [len(header) for header in self.headers]
+            self.numeric = [True] * len(self.headers)
+            for row in rows:
+                for column, value in enumerate(row):
+                    self.widths[column] = max(self.widths[column], len(self._cell(value)))
+                    if value is not None and not isinstance(value, (int, float, Decimal)):
+                        self.numeric[column] = False
+
+            out.append(self._border("╒", "═", "╤", "╕"))
+            out.append(self._line(self.headers, self.numeric))
+            out.append(self._border("╞", "═", "╪", "╡"))
+        elif rows:
+            out.append(self._border("├", "─", "┼", "┤"))
+
+        row_separator = self._border("├", "─", "┼", "┤")
+        out.append(f"\n{row_separator}\n".join(self._line([self._cell(value) for value in row], self.numeric) for row in rows))
+        return "\n".join(out)
+
+    def render_footer(self):
+        """Return the closing border of the grid."""
+        return self._border("╘", "═", "╧", "╛")
+
+
+def print_stream(batches, headers):
+    """Print batches of rows as a grid as they arrive and return the number of rows printed."""
+    grid = StreamingGrid(headers)
+    total = 0
+
+    for rows in batches:
+        print(grid.render_batch(rows), flush=True)
+        total += len(rows)
+
+    if total:
+        print(grid.render_footer())
+
+    return total
+
+
+def field_name(header):
+    """Return the machine-readable name of a column header ("Book ID" -> "book_id")."""
+    return header.lower().replace(" ", "_")
+
+
+def json_value(value):
+    """Return a JSON-encodable form of a value json cannot encode itself (Decimal, date, ...)."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def write_jsonl(batches, headers, out=None):
+    """Write batches of rows as JSON Lines, one object per row, and return the number of rows written."""
+    out = out or sys.stdout
+    keys = [field_name(header) for header in headers]
+    encode = json.JSONEncoder(default=json_value, ensure_ascii=False).encode
+    total = 0
+
+    for rows in batches:
+        out.write("".join(encode(dict(zip(keys, row))) + "\n" for row in rows))
+        total += len(rows)
+
+    out.flush()
+    return total
+
+
+def write_csv(batches, headers, out=None):
+    """Write batches of rows as CSV with a header line and return the number of rows written."""
+    out = out or sys.stdout
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow([field_name(header) for header in headers])
+    total = 0
+
+    for rows in batches:
+        writer.writerows(rows)
+        total += len(rows)
+
+    out.flush()
+    return total
+
+
+def write_stream(batches, headers, output_format="table"):
+    """Write batches of rows in one of OUTPUT_FORMATS as they arrive and return the number of rows.
+
+    jsonl and csv rows are written as soon as their batch comes off the cursor and nothing
+    else is printed, so the output can be piped straight into other tools.
+    """
+    if output_format == "jsonl":
+        return write_jsonl(batches, headers)
+    if output_format == "csv":
+        return write_csv(batches, headers)
+    if output_format == "table":
+        return print_stream(batches, headers)
+    raise ValueError(f"Unknown output format '{output_format}', expected one of: {', '.join(OUTPUT_FORMATS)}")
@@ -0,0 +1,148 @@
+"""Maintenance of the yearly partitions of the loans table.
+
+loans is range-partitioned by loan_date, one partition per year (loans_2024, loans_2025, ...),
+with a default partition for dates no yearly partition covers. ``create`` adds the partitions
+for the coming years and moves any loans the default partition took in into their own year;
+run it from cron, e.g. monthly. ``detach`` takes an old year out of the loans table: the
+partition stays behind as a plain table that can be archived or dropped.
+
+Usage: python -m app.partitions [status | create [--years N] | detach YEAR]
+"""
+import argparse
+from collections import namedtuple
+from tabulate import tabulate
+from .db_connection import connect_to_db
+
+# Years ahead of the current one that create keeps partitioned
+YEARS_AHEAD = 1
+
+Partition = namedtuple("Partition", ["name", "bounds", "rows"])
+
+
+class PartitionError(Exception):
+    """Raised when a partition cannot be detached; the message says why."""
+
+
+def loan_partitions(cur):
+    """Return the partitions of loans in bound order, with their estimated row counts."""
+    cur.execute(
+        """
+        SELECT partitions.relname, pg_get_expr(partitions.relpartbound, partitions.oid), GREATEST(partitions.reltuples, 0)::BIGINT
+        FROM pg_inherits
+        JOIN pg_class AS partitions ON partitions.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'loans'::regclass
+        ORDER BY partitions.relname = 'loans_default', partitions.relname
+        """
+    )
+    return [Partition._make(row) for row in cur.fetchall()]
+
+
+def create_partitions(years=YEARS_AHEAD):
+    """Create the partitions from this year through `years` ahead and return how many were created.
+
+    Past years are created too when the default partition holds loans of them.
+    """
+    conn = connect_to_db()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT create_loan_partitions(
+                    LEAST((SELECT MIN(loan_date) FROM loans_default), CURRENT_DATE),
+                    GREATEST((SELECT MAX(loan_date) FROM loans_default), (CURRENT_DATE + make_interval(years => %s))::DATE)
+                )
+                """,
+                (years,),
+            )
+            created = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    return created
+
+
+def detach_partition(year):
+    """Detach the partition of a year from loans and return its name.
+
+    Raises PartitionError if there is no such partition or it still holds active loans. The
+    borrower counters no longer include the detached loans, as check_loan_counts expects.
+    """
+    name = f"loans_{int(year)}"
+    conn = connect_to_db()
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_inherits WHERE inhparent = 'loans'::regclass AND inhrelid = to_regclass(%s)", (name,))
+            if not cur.fetchone():
+                raise PartitionError(f"There is no loans partition for {year}.")
+
+            # Loans cannot be lent, returned or removed until the detach (reads go on). The parent is
+            # locked before the partition, in the order every write to loans takes its locks
+            cur.execute("LOCK TABLE loans IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute(f'SELECT COUNT(*) FROM "{name}" WHERE return_date IS NULL')
+            active = cur.fetchone()[0]
+            if active:
+                raise PartitionError(f"{name} still holds {active} active loan(s); they must be returned first.")
+
+            cur.execute(
+                f"""
+                UPDATE borrowers
+                SET total_loans = borrowers.total_loans - detached.loans
+                FROM (SELECT borrower_id, COUNT(*) AS loans FROM "{name}" GROUP BY borrower_id) AS detached
+                WHERE borrowers.borrower_id = detached.borrower_id
+                """
+            )
+            cur.execute(f'ALTER TABLE loans DETACH PARTITION "{name}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return name
+
+
+def status():
+    """Print the partitions of loans with their bounds and estimated row counts."""
+    conn = connect_to_db()
+
+    try:
+        with conn.cursor() as cur:
+            partitions = loan_partitions(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(tabulate(partitions, ["Partition", "Bounds", "Rows (estimated)"], tablefmt="fancy_grid"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.partitions", description="Maintain the yearly partitions of the loans table.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("status", help="list the partitions (default)")
+    create_parser = commands.add_parser("create", help="create the partitions of the coming years")
+    create_parser.add_argument("--years", type=int, default=YEARS_AHEAD, help=f"years ahead to create (default: {YEARS_AHEAD})")
+    detach_parser = commands.add_parser("detach", help="detach the partition of a past year")
+    detach_parser.add_argument("year", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        created = create_partitions(args.years)
+        print(f"\nCreated {created} partition(s).\n")
+    elif args.command == "detach":
+        try:
+            name = detach_partition(args.year)
+        except PartitionError as error:
+            print(f"\nError: {error}\n")
+            return 1
+        print(f"\nDetached {name}; it remains as a standalone table.\n")
+    else:
+        status()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
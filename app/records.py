@@ -0,0 +1,18 @@
+"""Compact, immutable records returned by the service layer (app.services)."""
+from collections import namedtuple
+
+# A book with its author and genre names resolved; score is the search rank, set only by find_books
+Book = namedtuple(
+    "Book",
+    ["book_id", "title", "author_id", "author", "genre_id", "genre", "published_year", "is_available", "score"],
+    defaults=(None,),
+)
+
+# A borrower with the trigger-maintained loan counters
+Borrower = namedtuple("Borrower", ["borrower_id", "name", "email", "phone", "total_loans", "active_loans"])
+
+# A loan with the title of the book and the name of the borrower; return_date is None while it is active
+Loan = namedtuple("Loan", ["loan_id", "book_id", "title", "borrower_id", "borrower", "loan_date", "return_date"])
+
+# A borrower whose loan counters disagree with the loans table, as found by check_loan_counts
+CounterDrift = namedtuple("CounterDrift", ["borrower_id", "name", "total_loans", "actual_total_loans", "active_loans", "actual_active_loans"])
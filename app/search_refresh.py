@@ -0,0 +1,181 @@
+"""Refresh of the books' search documents after author and genre renames.
+
+Renaming an author or genre only queues it in book_search_refreshes. This job rewrites the
+search_vector of its books in batches of --batch-size, each batch its own short transaction, so
+a rename never holds the row locks of a whole genre. Books added or changed meanwhile get their
+document from their own trigger. A rename queued again while its books are being refreshed is
+refreshed again.
+
+With --watch the job keeps running and LISTENs on book_search_refresh, which the rename
+triggers notify on commit, so every rename is refreshed as soon as it is committed; renames
+queued while it was not running are refreshed when it starts. Without it the job drains the
+queue once and exits.
+
+With --all it rewrites the document of every book instead, in book_id order, e.g. after a
+migration that changes what the documents contain. An interrupted run can simply be started
+again.
+
+Until then searches by the new name already find the books, as authors and genres are matched
+by ID through the lookup cache; only the old name keeps matching and the ranking lags.
+
+Usage: python -m app.search_refresh [--batch-size N] [--watch | --all]
+"""
+import argparse
+import select
+from .db_connection import connect_to_db
+
+# Books refreshed per transaction
+REFRESH_BATCH_SIZE = 1000
+
+# Channel the rename triggers notify on
+REFRESH_CHANNEL = "book_search_refresh"
+
+# Seconds a watching job waits for a notification before checking whether it should stop
+WATCH_POLL_SECONDS = 1
+
+# Oldest rename first
+NEXT_REFRESH_QUERY = "SELECT author_id, genre_id, queued_at FROM book_search_refreshes ORDER BY queued_at LIMIT 1"
+
+REFRESH_BATCH_QUERY = """
+    UPDATE books SET search_vector = book_search_vector(title, author_id, genre_id, published_year)
+    WHERE book_id = ANY(%s)
+"""
+
+# Rewrites the documents of the next batch of books in book_id order
+ALL_BATCH_QUERY = """
+    UPDATE books SET search_vector = book_search_vector(title, author_id, genre_id, published_year)
+    WHERE book_id IN (SELECT book_id FROM books WHERE book_id > %s ORDER BY book_id LIMIT %s)
+    RETURNING book_id
+"""
+
+# Dequeues a rename unless it was queued again since it was picked up
+DONE_QUERY = """
+    DELETE FROM book_search_refreshes
+    WHERE author_id IS NOT DISTINCT FROM %s AND genre_id IS NOT DISTINCT FROM %s AND queued_at = %s
+"""
+
+
+def refresh_batches(batch_size=REFRESH_BATCH_SIZE):
+    """Refresh the search documents of the books of every queued rename, yielding the number of
+    books refreshed by each batch.
+
+    Each batch is committed before its count is yielded.
+    """
+    conn = connect_to_db()
+
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(NEXT_REFRESH_QUERY)
+                queued = cur.fetchone()
+                if queued is None:
+                    conn.commit()
+                    return
+                author_id, genre_id, queued_at = queued
+
+                # The books are listed once; later ones already have the new name in their document
+                if author_id is not None:
+                    cur.execute("SELECT book_id FROM books WHERE author_id = %s ORDER BY book_id", (author_id,))
+                else:
+                    cur.execute("SELECT book_id FROM books WHERE genre_id = %s ORDER BY book_id", (genre_id,))
+                book_ids = [book_id for book_id, in cur.fetchall()]
+            conn.commit()
+
+            for start in range(0, len(book_ids), batch_size):
+                with conn.cursor() as cur:
+                    cur.execute(REFRESH_BATCH_QUERY, (book_ids[start:start + batch_size],))
+                    refreshed = cur.rowcount
+                conn.commit()
+                yield refreshed
+
+            with conn.cursor() as cur:
+                cur.execute(DONE_QUERY, (author_id, genre_id, queued_at))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def refresh_all_batches(batch_size=REFRESH_BATCH_SIZE):
+    """Rewrite the search document of every book in book_id order, yielding the number of books
+    refreshed by each batch.
+
+    Each batch is committed before its count is yielded.
+    """
+    conn = connect_to_db()
+    last_id = 0
+
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(ALL_BATCH_QUERY, (last_id, batch_size))
+                book_ids = [book_id for book_id, in cur.fetchall()]
+            conn.commit()
+            if not book_ids:
+                return
+            last_id = max(book_ids)
+            yield len(book_ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def watch_batches(batch_size=REFRESH_BATCH_SIZE, stop=None):
+    """Refresh the queued renames, then each rename as it is committed, yielding the number of
+    books refreshed by each batch.
+
+    Runs until stop, a threading.Event, is set, or forever without one.
+    """
+    listener = connect_to_db()
+    listener.autocommit = True
+
+    try:
+        with listener.cursor() as cur:
+            cur.execute(f"LISTEN {REFRESH_CHANNEL}")
+
+        while stop is None or not stop.is_set():
+            # Renames notified from here on are refreshed by this pass or the next one
+            listener.notifies.clear()
+            yield from refresh_batches(batch_size)
+
+            while not listener.notifies and (stop is None or not stop.is_set()):
+                if select.select([listener], [], [], WATCH_POLL_SECONDS)[0]:
+                    listener.poll()
+    finally:
+        listener.close()
+
+
+def refresh_search_documents(batch_size=REFRESH_BATCH_SIZE):
+    """Refresh the search documents of the books of every queued rename and return how many were refreshed."""
+    return sum(refresh_batches(batch_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.search_refresh", description="Refresh the search documents of books after author and genre renames.")
+    parser.add_argument("--batch-size", type=int, default=REFRESH_BATCH_SIZE, help=f"books refreshed per transaction (default: {REFRESH_BATCH_SIZE})")
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--watch", action="store_true", help="keep running and refresh every rename as soon as it is committed")
+    modes.add_argument("--all", action="store_true", help="rewrite the search document of every book, not only of renames")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    batches = refresh_all_batches if args.all else watch_batches if args.watch else refresh_batches
+
+    total = 0
+    try:
+        for refreshed in batches(args.batch_size):
+            total += refreshed
+            print(f"Refreshed {refreshed} book(s), {total} so far.", flush=True)
+    except KeyboardInterrupt:
+        pass
+    print(f"\nRefreshed the search documents of {total} book(s).\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,409 @@
+"""HTTP JSON service for the catalog and circulation desks.
+
+A long-running process that keeps its database pool and lookup cache warm, so terminals no
+longer pay for interpreter startup and a fresh connection on every action as they do with
+app.cli. Requests are served by a fixed pool of worker threads on top of app.services.
+
+Usage: ENV=production python -m app.server [--host HOST] [--port PORT] [--workers N]
+
+Endpoints (JSON in and out; lists are paginated or limited):
+
+    GET    /books?after=&before=&start=&size=      one page of books in ID order
+    GET    /books/search?q=SEARCH&limit=           books matching a keyword and/or field filters such
+                                                   as author:tolkien year:1950..1960, best first
+    GET    /books/ID
+    POST   /books                                  {"title", "author_id", "genre_id", "published_year"}
+    GET    /borrowers?q=KEYWORD&limit=             borrowers, optionally matching a keyword
+    GET    /borrowers/ID
+    POST   /borrowers                              {"name", "email", "phone"}
+    PATCH  /borrowers/ID                           any of {"name", "email", "phone"}
+    DELETE /borrowers/ID
+    GET    /loans?after=YYYY-MM-DD,ID&before=&start=&size=
+    GET    /loans/search?q=KEYWORD&limit=
+    GET    /loans/ID
+    POST   /loans                                  {"book_id", "borrower_id"} lends a book
+    POST   /loans/ID/return
+    POST   /loans/return                           {"loan_ids"} or {"book_ids"} returns many books at once
+
+The GET /loans endpoints leave archived loans out unless archived=1 is given.
+Errors are returned as {"error": message} with status 400, 404 or 409.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+from . import services
+from .borrowers import validate_borrower, validate_borrower_changes
+from .db_connection import POOL_MAX_SIZE, close_pool
+from .lookups import author_names, close_lookups
+from .output import PAGE_SIZE, json_value
+
+# Worker threads serving requests; each keep-alive connection occupies one while it is open
+WORKERS = 16
+
+# Seconds an idle keep-alive connection may hold its worker
+IDLE_TIMEOUT = 5
+
+# Default and maximum number of results of a search or borrower listing
+SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+# Largest accepted request body, in bytes
+MAX_BODY_SIZE = 64 * 1024
+
+
+class HTTPError(Exception):
+    """Raised by a handler to answer with an error status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _integer(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer.") from None
+
+
+def _query_integer(query, name, default=None):
+    values = query.get(name)
+    return _integer(values[0], name) if values else default
+
+
+def _page_size(query):
+    return min(max(_query_integer(query, "size", PAGE_SIZE), 1), MAX_SEARCH_LIMIT)
+
+
+def _limit(query):
+    return min(max(_query_integer(query, "limit", SEARCH_LIMIT), 0), MAX_SEARCH_LIMIT)
+
+
+def _keyword(query):
+    keyword = query.get("q", [""])[0].strip()
+    if not keyword:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The search keyword 'q' is required.")
+    return keyword
+
+
+def _required(body, field):
+    value = str(body.get(field) or "").strip()
+    if not value:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' is required.")
+    return value
+
+
+def _first(batches, limit):
+    # Take up to limit records from a batched generator and close it, which releases its cursor
+    try:
+        return list(itertools.islice((record for batch in batches for record in batch), limit))
+    finally:
+        batches.close()
+
+
+def _loan_key(query, name):
+    # Loan pages are keyed by (loan_date, loan_id), written as YYYY-MM-DD,ID as in the CLI
+    value = query.get(name, [None])[0]
+    if value is None:
+        return None
+    loan_date, _, loan_id = value.partition(",")
+    try:
+        loan_date = datetime.date.fromisoformat(loan_date)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be YYYY-MM-DD,LOAN_ID.") from None
+    return loan_date, _integer(loan_id, name)
+
+
+def _archived(query):
+    # Archived loans are left out unless the request asks for them with archived=1
+    return query.get("archived", ["0"])[0].lower() in ("1", "true", "yes")
+
+
+def _found(record, name, record_id):
+    if record is None:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No {name} found with ID {record_id}.")
+    return record
+
+
+def list_books(query, body):
+    return services.books_page(
+        after=_query_integer(query, "after"),
+        before=_query_integer(query, "before"),
+        start=_query_integer(query, "start"),
+        page_size=_page_size(query),
+    )
+
+
+def search_books(query, body):
+    return _first(services.find_books(_keyword(query)), _limit(query))
+
+
+def get_book(query, body, book_id):
+    return _found(services.get_book(book_id), "book", book_id)
+
+
+def add_book(query, body):
+    return services.create_book(
+        _required(body, "title"),
+        _integer(body.get("author_id"), "author_id"),
+        _integer(body.get("genre_id"), "genre_id"),
+        _integer(body.get("published_year"), "published_year"),
+    )
+
+
+def list_borrowers(query, body):
+    keyword = query.get("q", [""])[0].strip()
+    batches = services.find_borrowers(keyword) if keyword else services.iter_borrowers()
+    return _first(batches, _limit(query))
+
+
+def get_borrower(query, body, borrower_id):
+    return _found(services.get_borrower(borrower_id), "borrower", borrower_id)
+
+
+def add_borrower(query, body):
+    name, email, phone = (str(body.get(field, "")).strip() for field in ("name", "email", "phone"))
+    error = validate_borrower(name, email, phone)
+    if error:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, error)
+    return services.create_borrower(name, email, phone)
+
+
+def modify_borrower(query, body, borrower_id):
+    # Only the fields sent are validated and changed
+    changes = {field: str(body[field]).strip() for field in ("name", "email", "phone") if body.get(field) is not None}
+    error = validate_borrower_changes(changes)
+    if error:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, error)
+
+    borrower = _found(services.get_borrower(borrower_id), "borrower", borrower_id)
+    name, email, phone = (changes.get(field, getattr(borrower, field)) for field in ("name", "email", "phone"))
+    return _found(services.update_borrower(borrower_id, name, email, phone), "borrower", borrower_id)
+
+
+def remove_borrower(query, body, borrower_id):
+    if not services.delete_borrower(borrower_id):
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No borrower found with ID {borrower_id}.")
+    return {"deleted": borrower_id}
+
+
+def list_loans(query, body):
+    return services.loans_page(
+        after=_loan_key(query, "after"),
+        before=_loan_key(query, "before"),
+        start=_query_integer(query, "start"),
+        page_size=_page_size(query),
+        include_archived=_archived(query),
+    )
+
+
+def search_loans(query, body):
+    return _first(services.find_loans(_keyword(query), include_archived=_archived(query)), _limit(query))
+
+
+def get_loan(query, body, loan_id):
+    return _found(services.get_loan(loan_id, include_archived=_archived(query)), "loan", loan_id)
+
+
+# HTTP status and message for each failed create_loan result
+BORROW_ERRORS = {
+    services.BORROW_BOOK_NOT_FOUND: (HTTPStatus.NOT_FOUND, "Invalid book ID. This book does not exist."),
+    services.BORROW_BORROWER_NOT_FOUND: (HTTPStatus.NOT_FOUND, "Invalid borrower ID. This borrower does not exist."),
+    services.BORROW_BOOK_UNAVAILABLE: (HTTPStatus.CONFLICT, "This book is not available for borrowing."),
+}
+
+
+def borrow_book(query, body):
+    status, loan = services.create_loan(_integer(body.get("book_id"), "book_id"), _integer(body.get("borrower_id"), "borrower_id"))
+    if status != services.BORROW_OK:
+        raise HTTPError(*BORROW_ERRORS[status])
+    return loan
+
+
+def return_book(query, body, loan_id):
+    loan = services.close_loan(loan_id)
+    if loan is None:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No active loan found with ID {loan_id}.")
+    return loan
+
+
+def return_books(query, body):
+    # Drop-box returns: {"loan_ids": [...]} or {"book_ids": [...]}, closed in one transaction
+    by_book = "book_ids" in body
+    field = "book_ids" if by_book else "loan_ids"
+    ids = body.get(field)
+    if not isinstance(ids, list) or not ids:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'loan_ids' or 'book_ids' must be a non-empty list.")
+    closed, not_active = services.close_loans([_integer(value, field) for value in ids], by_book=by_book)
+    return {"returned": to_json(closed), "not_active": not_active}
+
+
+# (method, path pattern, handler, success status); a numeric group in the pattern is passed to the handler as an ID
+ROUTES = [
+    ("GET", re.compile(r"/books"), list_books, HTTPStatus.OK),
+    ("GET", re.compile(r"/books/search"), search_books, HTTPStatus.OK),
+    ("GET", re.compile(r"/books/(\d+)"), get_book, HTTPStatus.OK),
+    ("POST", re.compile(r"/books"), add_book, HTTPStatus.CREATED),
+    ("GET", re.compile(r"/borrowers"), list_borrowers, HTTPStatus.OK),
+    ("GET", re.compile(r"/borrowers/(\d+)"), get_borrower, HTTPStatus.OK),
+    ("POST", re.compile(r"/borrowers"), add_borrower, HTTPStatus.CREATED),
+    ("PATCH", re.compile(r"/borrowers/(\d+)"), modify_borrower, HTTPStatus.OK),
+    ("DELETE", re.compile(r"/borrowers/(\d+)"), remove_borrower, HTTPStatus.OK),
+    ("GET", re.compile(r"/loans"), list_loans, HTTPStatus.OK),
+    ("GET", re.compile(r"/loans/search"), search_loans, HTTPStatus.OK),
+    ("GET", re.compile(r"/loans/(\d+)"), get_loan, HTTPStatus.OK),
+    ("POST", re.compile(r"/loans"), borrow_book, HTTPStatus.CREATED),
+    ("POST", re.compile(r"/loans/(\d+)/return"), return_book, HTTPStatus.OK),
+    ("POST", re.compile(r"/loans/return"), return_books, HTTPStatus.OK),
+]
+
+
+def to_json(result):
+    # Records become objects keyed by their field names, lists of records become arrays
+    if isinstance(result, list):
+        return [to_json(item) for item in result]
+    if hasattr(result, "_asdict"):
+        return result._asdict()
+    return result
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Dispatches requests to the ROUTES handlers and writes their results as JSON."""
+
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+    server_version = "LibrarySystem"
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        allowed = False
+        try:
+            for route_method, pattern, handler, status in ROUTES:
+                match = pattern.fullmatch(path)
+                if not match:
+                    continue
+                allowed = True
+                if route_method != method:
+                    continue
+
+                body = self._read_body()
+                result = handler(parse_qs(url.query), body, *(int(group) for group in match.groups()))
+                self._send(status, to_json(result))
+                return
+
+            if allowed:
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {path}.")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}.")
+        except HTTPError as error:
+            self._send(error.status, {"error": str(error)})
+        except services.SearchQueryError as error:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+        except services.NotFoundError as error:
+            self._send(HTTPStatus.NOT_FOUND, {"error": str(error)})
+        except services.ConflictError as error:
+            self._send(HTTPStatus.CONFLICT, {"error": str(error)})
+        except Exception:
+            self.log_error("%s", traceback.format_exc())
+            self.close_connection = True
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "The request body is too large.")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body must be JSON.") from None
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object.")
+        return body
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, default=json_value, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        # No endpoint takes PUT; answered with a JSON 405 instead of the default HTML 501
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_request(self, code="-", size="-"):
+        # Access logging is left to a reverse proxy; errors still reach stderr through log_error
+        pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server that hands each connection to a fixed pool of worker threads."""
+
+    def __init__(self, address, handler_class=RequestHandler, workers=WORKERS):
+        super().__init__(address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        # Same as socketserver.ThreadingMixIn.process_request_thread, on a pooled thread
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=WORKERS, help=f"worker threads (default: {WORKERS}); database connections are capped at DB_POOL_MAX_SIZE ({POOL_MAX_SIZE})")
+    args = parser.parse_args()
+
+    # Warm the lookup cache so the first request does not pay for it
+    author_names()
+
+    server = PooledHTTPServer((args.host, args.port), workers=args.workers)
+    print(f"\nServing the library on http://{args.host}:{server.server_address[1]} with {args.workers} workers. Press Ctrl+C to stop.\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_lookups()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
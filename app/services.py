@@ -0,0 +1,885 @@
+"""Data access for books, borrowers and loans, returning records instead of printing.
+
+This module holds the SQL of the application. Its functions neither print nor prompt. They
+return the compact records of app.records, so the CLI, scripts and other front ends can share
+them without any formatting cost. app.books, app.borrowers and app.loans present the results
+on the terminal.
+
+Listing and search functions yield lists of records batch by batch from a server-side cursor.
+Rejected operations raise a ServiceError subclass whose message says why.
+"""
+import psycopg2
+import re
+from .db_connection import get_connection
+from .lookups import author_exists, author_names, genre_exists, genre_names, matching_author_ids, matching_genre_ids
+from .output import PAGE_SIZE, STREAM_BATCH_SIZE, stream_query
+from .records import Book, Borrower, CounterDrift, Loan
+
+# Result codes returned by create_loan
+BORROW_OK = "ok"
+BORROW_BOOK_NOT_FOUND = "book_not_found"
+BORROW_BORROWER_NOT_FOUND = "borrower_not_found"
+BORROW_BOOK_UNAVAILABLE = "book_unavailable"
+
+# Checks the book and borrower and inserts the loan in one round trip. The book is first claimed
+# in active_loans, whose primary key admits one active loan per book: a second desk's claim waits
+# for the first to commit and then does nothing, so no loan is inserted. No row lock needed.
+BORROW_QUERY = """
+    WITH book AS (
+        SELECT book_id, title FROM books WHERE book_id = %s
+    ),
+    borrower AS (
+        SELECT borrower_id, name FROM borrowers WHERE borrower_id = %s
+    ),
+    claim AS (
+        INSERT INTO active_loans (book_id, loan_id)
+        SELECT book.book_id, nextval('loans_loan_id_seq')
+        FROM book, borrower
+        ON CONFLICT (book_id) DO NOTHING
+        RETURNING book_id, loan_id
+    ),
+    loan AS (
+        INSERT INTO loans (loan_id, book_id, borrower_id, loan_date)
+        SELECT claim.loan_id, claim.book_id, borrower.borrower_id, CURRENT_DATE
+        FROM claim, borrower
+        RETURNING loan_id, loan_date
+    )
+    SELECT book.title, borrower.name, loan.loan_id, loan.loan_date
+    FROM (SELECT 1) AS request
+    LEFT JOIN book ON TRUE
+    LEFT JOIN borrower ON TRUE
+    LEFT JOIN loan ON TRUE
+"""
+
+# A book is available when it has no active loan, which a primary key probe of active_loans answers
+BOOK_AVAILABLE = "NOT EXISTS (SELECT 1 FROM active_loans WHERE active_loans.book_id = books.book_id)"
+
+BOOK_COLUMNS = f"books.book_id, books.title, books.author_id, books.genre_id, books.published_year, {BOOK_AVAILABLE} AS is_available"
+LISTED_BOOKS = "books.author_id IS NOT NULL AND books.genre_id IS NOT NULL"
+
+BORROWER_COLUMNS = "borrower_id, name, email, phone, total_loans, active_loans"
+
+# Loans together with the archived ones (see app/archive.py), under the name loans so that the
+# loan queries can read either
+ALL_LOANS = """(
+        SELECT loan_id, book_id, borrower_id, loan_date, return_date FROM loans
+        UNION ALL
+        SELECT loan_id, book_id, borrower_id, loan_date, return_date FROM loans_archive
+    ) AS loans"""
+
+_LOAN_SELECT = """
+    SELECT loans.loan_id, loans.book_id, books.title, loans.borrower_id, borrowers.name, loans.loan_date, loans.return_date
+    FROM {loans}
+    JOIN books ON loans.book_id = books.book_id
+    JOIN borrowers ON loans.borrower_id = borrowers.borrower_id
+"""
+LOAN_QUERY = _LOAN_SELECT.format(loans="loans")
+ALL_LOANS_QUERY = _LOAN_SELECT.format(loans=ALL_LOANS)
+
+
+class ServiceError(Exception):
+    """Raised when an operation is rejected; the message says why."""
+
+
+class NotFoundError(ServiceError):
+    """Raised when a referenced book, author, genre, borrower or loan does not exist."""
+
+
+class ConflictError(ServiceError):
+    """Raised when an operation conflicts with existing data, e.g. a duplicate borrower."""
+
+
+class SearchQueryError(ServiceError):
+    """Raised for a search filter with an invalid value, e.g. year:abc."""
+
+
+def book_records(rows, conn=None):
+    """Return the Book records of rows of BOOK_COLUMNS, optionally followed by the search score.
+
+    Names come from the lookup cache, which fetches any author or genre added since it was
+    loaded. A caller still holding its pooled connection passes it as conn, so the cache never
+    waits for a second one.
+    """
+    authors = author_names({row[2] for row in rows}, conn)
+    genres = genre_names({row[3] for row in rows}, conn)
+    return [
+        Book(book_id, title, author_id, authors.get(author_id), genre_id, genres.get(genre_id), published_year, is_available, *score)
+        for book_id, title, author_id, genre_id, published_year, is_available, *score in rows
+    ]
+
+
+def check_references(author_id, genre_id):
+    """Raise NotFoundError for an unknown author or genre; valid IDs cost no round trip."""
+    if not author_exists(author_id):
+        raise NotFoundError(f"Author ID {author_id} does not exist.")
+    if not genre_exists(genre_id):
+        raise NotFoundError(f"Genre ID {genre_id} does not exist.")
+
+
+def iter_books(batch_size=STREAM_BATCH_SIZE):
+    """Yield every book in book_id order, one list of Book records per batch."""
+    query = f"SELECT {BOOK_COLUMNS} FROM books WHERE {LISTED_BOOKS} ORDER BY books.book_id ASC"
+
+    with get_connection() as conn:
+        for rows in stream_query(conn, query, batch_size=batch_size):
+            yield book_records(rows, conn)
+
+
+def books_page_query(after, before, start, page_size):
+    """Return the query and parameters of a books_page call, and whether its rows come out reversed."""
+    if after is not None:
+        condition, key, order = "books.book_id > %s", after, "ASC"
+    elif before is not None:
+        condition, key, order = "books.book_id < %s", before, "DESC"
+    elif start is not None:
+        condition, key, order = "books.book_id >= %s", start, "ASC"
+    else:
+        condition, key, order = "TRUE", None, "ASC"
+
+    query = f"""
+        SELECT {BOOK_COLUMNS}
+        FROM books
+        WHERE {condition} AND {LISTED_BOOKS}
+        ORDER BY books.book_id {order}
+        LIMIT %s
+    """
+    return query, (key, page_size) if key is not None else (page_size,), order == "DESC"
+
+
+def books_page(after=None, before=None, start=None, page_size=PAGE_SIZE):
+    """Return one page of books in book_id order using keyset pagination.
+
+    Pass the last book_id of the current page as `after` for the next page, the first one as
+    `before` for the previous page, or a book_id as `start` for the page beginning there.
+    """
+    query, params, reversed_rows = books_page_query(after, before, start, page_size)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    books = book_records(rows)
+
+    # Pages fetched backwards come out in reverse order
+    return books[::-1] if reversed_rows else books
+
+
+def _prefix_tsquery(keyword):
+    # Turn a free-text keyword into a prefix tsquery ("harry pot" -> "harry:* & pot:*").
+    # Only word characters are kept, so the keyword can never inject tsquery syntax.
+    words = re.findall(r"\w+", keyword)
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def _parse_year(keyword):
+    # Return the keyword as a year when it is an integer, so it can be matched against the year index
+    return int(keyword) if re.fullmatch(r"-?\d{1,4}", keyword.strip()) else None
+
+
+# Every branch of the WHERE clause is served by an index: the search_vector GIN index, the title
+# trigram index and the published_year index. Parameters come from _find_books_params; without a
+# keyword they are all NULL and every book scores 0.
+_KEYWORD_MATCH = """(books.search_vector @@ to_tsquery('simple', %(tsquery)s)
+           OR books.title ILIKE %(pattern)s
+           OR books.author_id = ANY(%(author_ids)s)
+           OR books.genre_id = ANY(%(genre_ids)s)
+           OR books.published_year = %(year)s)"""
+
+_FIND_BOOKS_SELECT = f"""
+    SELECT {BOOK_COLUMNS},
+           ROUND((
+               COALESCE(ts_rank(books.search_vector, to_tsquery('simple', %(tsquery)s)), 0)
+               + CASE
+                     WHEN LOWER(books.title) = LOWER(%(keyword)s) THEN 1.0
+                     WHEN books.title ILIKE %(prefix)s THEN 0.5
+                     ELSE 0
+                 END
+               + CASE WHEN books.published_year = %(year)s THEN 1.0 ELSE 0 END
+           )::NUMERIC, 3) AS score
+    FROM books
+    WHERE ({LISTED_BOOKS}){{conditions}}
+    ORDER BY score DESC, books.book_id
+"""
+
+# Fields of a book search, e.g. "author:tolkien year:1950..1960 genre:fantasy available:true"
+BOOK_SEARCH_FIELDS = ("title", "author", "genre", "year", "available")
+
+# A search term: an optional field name and colon, then a word or a double-quoted phrase
+_SEARCH_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+_SEARCH_BOOLEANS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+def _find_books_params(keyword):
+    # Authors and genres whose names contain the keyword are found in the lookup cache and matched by ID
+    if keyword is None:
+        return {"keyword": None, "pattern": None, "prefix": None, "tsquery": None, "year": None, "author_ids": [], "genre_ids": []}
+    return {
+        "keyword": keyword,
+        "pattern": f"%{keyword}%",
+        "prefix": f"{keyword}%",
+        "tsquery": _prefix_tsquery(keyword),
+        "year": _parse_year(keyword),
+        "author_ids": matching_author_ids(keyword),
+        "genre_ids": matching_genre_ids(keyword),
+    }
+
+
+def parse_book_search(search):
+    """Split a book search into a list of (field, value) filters and the remaining plain keyword.
+
+    A term is a filter when it starts with one of BOOK_SEARCH_FIELDS and a colon; any other term
+    is part of the keyword, which is None if there is none. Double quotes keep a value or phrase
+    together (author:"le guin").
+    """
+    filters, words = [], []
+    for match in _SEARCH_TERM.finditer(search):
+        field, quoted, word = match.groups()
+        value = quoted if quoted is not None else word
+        if field and field.lower() in BOOK_SEARCH_FIELDS:
+            if not value.strip():
+                raise SearchQueryError(f"'{field}:' needs a value.")
+            filters.append((field.lower(), value.strip()))
+        elif field:
+            words.append(match.group(0))
+        else:
+            words.append(value)
+    keyword = " ".join(word for word in words if word.strip())
+    return filters, keyword or None
+
+
+def _year_range(value):
+    # Return the (first, last) years of a year filter: 1950, 1950..1960, 1950.. or ..1960
+    first, dots, last = value.partition("..")
+    if not dots:
+        last = first
+    if not (first or last) or not all(re.fullmatch(r"-?\d{1,4}", year) for year in (first, last) if year):
+        raise SearchQueryError(f"'year:{value}' must be a year or a range such as 1950..1960.")
+    return (int(first) if first else None), (int(last) if last else None)
+
+
+def _like_prefix(value):
+    # LIKE pattern for the values starting with `value`, taken literally
+    return re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+
+def _book_filter(field, value, name, params):
+    # Return the predicate of one filter, each served by an index, and add its parameters to params
+    # under names starting with `name`
+    if field == "title":
+        # Served by books_title_prefix_idx; LOWER of a constant is folded, so the pattern stays a prefix
+        params[name] = _like_prefix(value)
+        return f"LOWER(books.title) LIKE LOWER(%({name})s)"
+
+    if field in ("author", "genre"):
+        column = f"books.{field}_id"
+        if value.isdigit():
+            params[name] = int(value)
+            return f"{column} = %({name})s"
+        params[name] = matching_author_ids(value) if field == "author" else matching_genre_ids(value)
+        return f"{column} = ANY(%({name})s)"
+
+    if field == "year":
+        first, last = _year_range(value)
+        conditions = []
+        if first is not None:
+            params[f"{name}_first"] = first
+            conditions.append(f"books.published_year >= %({name}_first)s")
+        if last is not None:
+            params[f"{name}_last"] = last
+            conditions.append(f"books.published_year <= %({name}_last)s")
+        return " AND ".join(conditions)
+
+    if value.lower() not in _SEARCH_BOOLEANS:
+        raise SearchQueryError(f"'available:{value}' must be true or false.")
+    return BOOK_AVAILABLE if _SEARCH_BOOLEANS[value.lower()] else f"NOT {BOOK_AVAILABLE}"
+
+
+def find_books_query(search):
+    """Return the query and parameters of a book search (see find_books)."""
+    filters, keyword = parse_book_search(search)
+    params = _find_books_params(keyword if keyword or filters else search)
+
+    conditions = [_KEYWORD_MATCH] if keyword or not filters else []
+    for index, (field, value) in enumerate(filters):
+        conditions.append(_book_filter(field, value, f"{field}_{index}", params))
+    return _FIND_BOOKS_SELECT.format(conditions="".join(f"\n      AND {condition}" for condition in conditions)), params
+
+
+def _stream_books(query, params, batch_size):
+    with get_connection() as conn:
+        for rows in stream_query(conn, query, params, batch_size=batch_size):
+            yield book_records(rows, conn)
+
+
+def find_books(search, batch_size=STREAM_BATCH_SIZE):
+    """Return a generator of the books matching a search, best match first, one list per batch.
+
+    The search is a keyword matched by title, author, genre or year, and/or field filters that
+    narrow it down, e.g. "author:tolkien year:1950..1960 genre:fantasy available:true":
+
+        title:PREFIX            titles starting with PREFIX
+        author:NAME|ID          authors whose name contains NAME, or the author with this ID
+        genre:NAME|ID           likewise for genres
+        year:Y, year:Y1..Y2     published in Y, or from Y1 to Y2 (either end may be left out)
+        available:true|false    books on the shelf, or out on loan
+
+    Raises SearchQueryError for a filter with an invalid value, before any query runs. Each Book
+    carries its match score (see _FIND_BOOKS_SELECT); it is 0 for a search without a keyword.
+    """
+    query, params = find_books_query(search)
+    return _stream_books(query, params, batch_size)
+
+
+def get_book(book_id):
+    """Return the Book with this ID, or None."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {BOOK_COLUMNS} FROM books WHERE books.book_id = %s AND {LISTED_BOOKS}", (book_id,))
+        rows = cur.fetchall()
+
+    return book_records(rows)[0] if rows else None
+
+
+def create_book(title, author_id, genre_id, published_year):
+    """Insert an available book and return it; raises NotFoundError for an unknown author or genre."""
+    check_references(author_id, genre_id)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        # The foreign keys still catch an author or genre deleted since the cache was checked
+        try:
+            cur.execute(
+                """
+                INSERT INTO books (title, author_id, genre_id, published_year)
+                VALUES (%s, %s, %s, %s)
+                RETURNING book_id
+                """,
+                (title, author_id, genre_id, published_year),
+            )
+        except psycopg2.errors.ForeignKeyViolation:
+            conn.rollback()
+            raise NotFoundError(f"Author ID {author_id} or Genre ID {genre_id} no longer exists.") from None
+
+        book_id = cur.fetchone()[0]
+        conn.commit()
+
+    return book_records([(book_id, title, author_id, genre_id, published_year, True)])[0]
+
+
+def update_book(book_id, title, author_id, genre_id, published_year):
+    """Replace a book's details and return it, or None if there is no such book.
+
+    Raises NotFoundError for an unknown author or genre.
+    """
+    check_references(author_id, genre_id)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE books
+            SET title = %s, author_id = %s, genre_id = %s, published_year = %s
+            WHERE book_id = %s
+            RETURNING {BOOK_COLUMNS}
+            """,
+            (title, author_id, genre_id, published_year, book_id),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+
+    return book_records(rows)[0] if rows else None
+
+
+def delete_book(book_id):
+    """Delete a book with its loans and return whether it existed."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM books WHERE book_id = %s", (book_id,))
+        deleted = cur.rowcount > 0
+        conn.commit()
+
+    return deleted
+
+
+def load_books_csv(csv_file):
+    """Bulk-load books from an open CSV file with the header "title,author_id,genre_id,published_year".
+
+    The file is streamed through COPY into a temporary staging table, every row is validated
+    set-wise against authors and genres, and all valid rows are inserted in a single statement
+    with their search documents built from the joined names rather than by a per-row trigger
+    lookup. Returns the number of imported books and a list of (row, reason) for rejected rows.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMPORARY TABLE book_import (
+                row_number BIGINT GENERATED ALWAYS AS IDENTITY,
+                title TEXT,
+                author_id TEXT,
+                genre_id TEXT,
+                published_year TEXT
+            ) ON COMMIT DROP
+            """
+        )
+
+        # Columns are staged as text so malformed values become rejections instead of aborting COPY
+        cur.copy_expert(
+            """
+            COPY book_import (title, author_id, genre_id, published_year)
+            FROM STDIN WITH (FORMAT csv, HEADER true)
+            """,
+            csv_file,
+        )
+
+        cur.execute(
+            """
+            CREATE TEMPORARY TABLE book_import_checked ON COMMIT DROP AS
+            WITH typed AS (
+                SELECT row_number,
+                       BTRIM(title) AS title,
+                       CASE WHEN author_id ~ '^\\s*\\d{1,9}\\s*$' THEN author_id::INT END AS author_id,
+                       CASE WHEN genre_id ~ '^\\s*\\d{1,9}\\s*$' THEN genre_id::INT END AS genre_id,
+                       CASE WHEN published_year ~ '^\\s*-?\\d{1,9}\\s*$' THEN published_year::INT END AS published_year
+                FROM book_import
+            )
+            SELECT typed.row_number, typed.title, typed.author_id, typed.genre_id, typed.published_year,
+                   authors.name AS author, genres.name AS genre,
+                   CASE
+                       WHEN COALESCE(typed.title, '') = '' THEN 'Missing title'
+                       WHEN LENGTH(typed.title) > 255 THEN 'Title is longer than 255 characters'
+                       WHEN typed.author_id IS NULL THEN 'Author ID must be an integer'
+                       WHEN typed.genre_id IS NULL THEN 'Genre ID must be an integer'
+                       WHEN typed.published_year IS NULL THEN 'Published year must be an integer'
+                       WHEN authors.author_id IS NULL THEN 'Author ID ' || typed.author_id || ' does not exist'
+                       WHEN genres.genre_id IS NULL THEN 'Genre ID ' || typed.genre_id || ' does not exist'
+                   END AS error
+            FROM typed
+            LEFT JOIN authors ON authors.author_id = typed.author_id
+            LEFT JOIN genres ON genres.genre_id = typed.genre_id
+            """
+        )
+
+        cur.execute(
+            """
+            INSERT INTO books (title, author_id, genre_id, published_year, search_vector)
+            SELECT title, author_id, genre_id, published_year,
+                   setweight(to_tsvector('simple', title), 'A')
+                   || setweight(to_tsvector('simple', author), 'B')
+                   || setweight(to_tsvector('simple', genre), 'C')
+                   || setweight(to_tsvector('simple', published_year::TEXT), 'D')
+            FROM book_import_checked
+            WHERE error IS NULL
+            ORDER BY row_number
+            """
+        )
+        imported = cur.rowcount
+
+        cur.execute("SELECT row_number, error FROM book_import_checked WHERE error IS NOT NULL ORDER BY row_number")
+        rejected = cur.fetchall()
+
+        conn.commit()
+
+    return imported, rejected
+
+
+def iter_borrowers(batch_size=STREAM_BATCH_SIZE):
+    """Yield every borrower in borrower_id order, one list of Borrower records per batch."""
+    query = f"SELECT {BORROWER_COLUMNS} FROM borrowers ORDER BY borrower_id"
+
+    with get_connection() as conn:
+        for rows in stream_query(conn, query, batch_size=batch_size):
+            yield [Borrower._make(row) for row in rows]
+
+
+# Kinds of borrower search keyword (see borrower_keyword_kind)
+BORROWER_KEYWORD_EMAIL = "email"
+BORROWER_KEYWORD_PHONE = "phone"
+BORROWER_KEYWORD_NAME = "name"
+
+# An email address, and a phone number that may be written with separators ("+1 (555) 123-4567")
+_EMAIL_KEYWORD = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+_PHONE_KEYWORD = re.compile(r"\+?[\d\s().-]*\d[\d\s().-]*")
+
+# Exact identifiers are looked up through an index in a single round trip: emails through
+# borrowers_email_lower_key, phones (stored as digits only) through borrowers_phone_idx
+FIND_BORROWERS_BY_EMAIL_QUERY = f"SELECT {BORROWER_COLUMNS} FROM borrowers WHERE LOWER(email) = %s ORDER BY borrower_id"
+FIND_BORROWERS_BY_PHONE_QUERY = f"SELECT {BORROWER_COLUMNS} FROM borrowers WHERE phone = %s ORDER BY borrower_id"
+
+# Names match by trigram similarity, which forgives misspellings, or by substring, most similar
+# first; borrowers_name_trgm_idx serves both
+FIND_BORROWERS_BY_NAME_QUERY = f"""
+    SELECT {BORROWER_COLUMNS}
+    FROM borrowers
+    WHERE name %% %(name)s OR name ILIKE %(pattern)s
+    ORDER BY similarity(name, %(name)s) DESC, borrower_id
+"""
+
+
+def borrower_keyword_kind(keyword):
+    """Classify a borrower search keyword as an email, a phone number or a name.
+
+    Returns the BORROWER_KEYWORD_* kind with the value to look up: the email in lower case, the
+    digits of the phone number, or the name as given.
+    """
+    keyword = keyword.strip()
+    if _EMAIL_KEYWORD.fullmatch(keyword):
+        return BORROWER_KEYWORD_EMAIL, keyword.lower()
+    if _PHONE_KEYWORD.fullmatch(keyword):
+        return BORROWER_KEYWORD_PHONE, re.sub(r"\D", "", keyword)
+    return BORROWER_KEYWORD_NAME, keyword
+
+
+def find_borrowers_query(kind, value):
+    """Return the query and parameters of a borrower search for a keyword classified by borrower_keyword_kind."""
+    if kind == BORROWER_KEYWORD_EMAIL:
+        return FIND_BORROWERS_BY_EMAIL_QUERY, (value,)
+    if kind == BORROWER_KEYWORD_PHONE:
+        return FIND_BORROWERS_BY_PHONE_QUERY, (value,)
+    return FIND_BORROWERS_BY_NAME_QUERY, {"name": value, "pattern": f"%{value}%"}
+
+
+def normalize_contact(email, phone):
+    """Return a borrower's email in lower case and phone number as digits only, as they are stored.
+
+    Lookups by email or phone (see borrower_keyword_kind) compare against these forms.
+    """
+    return email.strip().lower(), re.sub(r"\D", "", phone)
+
+
+def find_borrowers(keyword, batch_size=STREAM_BATCH_SIZE):
+    """Yield the borrowers matching a keyword, one list of Borrower records per batch.
+
+    An email address or phone number (see borrower_keyword_kind) is looked up exactly, ignoring
+    case and separators, in one round trip. Any other keyword is matched against names, best
+    match first, forgiving misspellings.
+    """
+    kind, value = borrower_keyword_kind(keyword)
+
+    with get_connection() as conn:
+        if kind != BORROWER_KEYWORD_NAME:
+            with conn.cursor() as cur:
+                cur.execute(*find_borrowers_query(kind, value))
+                rows = cur.fetchall()
+            if rows:
+                yield [Borrower._make(row) for row in rows]
+            return
+
+        for rows in stream_query(conn, *find_borrowers_query(kind, value), batch_size=batch_size):
+            yield [Borrower._make(row) for row in rows]
+
+
+def get_borrower(borrower_id):
+    """Return the Borrower with this ID, or None."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {BORROWER_COLUMNS} FROM borrowers WHERE borrower_id = %s", (borrower_id,))
+        row = cur.fetchone()
+
+    return Borrower._make(row) if row else None
+
+
+def create_borrower(name, email, phone):
+    """Insert a borrower and return it; raises ConflictError if the email or phone is taken."""
+    email, phone = normalize_contact(email, phone)
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT borrower_id FROM borrowers WHERE LOWER(email) = %s OR phone = %s", (email, phone))
+        if cur.fetchone():
+            raise ConflictError(f"A borrower with email '{email}' or phone '{phone}' already exists.")
+
+        try:
+            cur.execute(
+                f"""
+                INSERT INTO borrowers (name, email, phone)
+                VALUES (%s, %s, %s)
+                RETURNING {BORROWER_COLUMNS}
+                """,
+                (name, email, phone),
+            )
+        except psycopg2.errors.UniqueViolation:
+            # Another desk registered the same email since the check
+            conn.rollback()
+            raise ConflictError(f"A borrower with email '{email}' already exists.") from None
+        borrower = Borrower._make(cur.fetchone())
+        conn.commit()
+
+    return borrower
+
+
+def update_borrower(borrower_id, name, email, phone):
+    """Replace a borrower's details and return the borrower, or None if there is no such borrower.
+
+    Raises ConflictError if the email belongs to another borrower.
+    """
+    email, phone = normalize_contact(email, phone)
+    with get_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute(
+                f"""
+                UPDATE borrowers
+                SET name = %s, email = %s, phone = %s
+                WHERE borrower_id = %s
+                RETURNING {BORROWER_COLUMNS}
+                """,
+                (name, email, phone, borrower_id),
+            )
+        except psycopg2.errors.UniqueViolation:
+            conn.rollback()
+            raise ConflictError(f"A borrower with email '{email}' already exists.") from None
+        row = cur.fetchone()
+        conn.commit()
+
+    return Borrower._make(row) if row else None
+
+
+def delete_borrower(borrower_id):
+    """Delete a borrower and their loan history and return whether they existed.
+
+    Raises ConflictError while the borrower still has books borrowed.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT name, active_loans FROM borrowers WHERE borrower_id = %s FOR UPDATE", (borrower_id,))
+        row = cur.fetchone()
+
+        if row is None:
+            return False
+        if row[1] > 0:
+            raise ConflictError(f"Borrower '{row[0]}' cannot be removed because they have {row[1]} book(s) currently borrowed.")
+
+        cur.execute("DELETE FROM borrowers WHERE borrower_id = %s", (borrower_id,))
+        conn.commit()
+
+    return True
+
+
+def check_loan_counts(repair=False):
+    """Compare the borrower loan counters with the loans table and return the drifted borrowers.
+
+    Archived loans count towards total_loans. With repair=True the drifted counters are
+    rewritten; loans is locked against writes meanwhile so that the counts cannot move
+    between the check and the update.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        if repair:
+            cur.execute("LOCK TABLE loans, loans_archive IN SHARE MODE")
+
+        cur.execute(
+            f"""
+            SELECT borrowers.borrower_id, borrowers.name,
+                   borrowers.total_loans, COALESCE(counts.total_loans, 0),
+                   borrowers.active_loans, COALESCE(counts.active_loans, 0)
+            FROM borrowers
+            LEFT JOIN (
+                SELECT borrower_id, COUNT(*) AS total_loans, COUNT(*) FILTER (WHERE return_date IS NULL) AS active_loans
+                FROM {ALL_LOANS}
+                GROUP BY borrower_id
+            ) AS counts ON counts.borrower_id = borrowers.borrower_id
+            WHERE (borrowers.total_loans, borrowers.active_loans)
+                  IS DISTINCT FROM (COALESCE(counts.total_loans, 0), COALESCE(counts.active_loans, 0))
+            ORDER BY borrowers.borrower_id
+            """
+        )
+        drifted = [CounterDrift._make(row) for row in cur.fetchall()]
+
+        if repair and drifted:
+            cur.execute(
+                f"""
+                UPDATE borrowers
+                SET (total_loans, active_loans) = (
+                    SELECT COUNT(*), COUNT(*) FILTER (WHERE return_date IS NULL)
+                    FROM {ALL_LOANS}
+                    WHERE loans.borrower_id = borrowers.borrower_id
+                )
+                WHERE borrower_id = ANY(%s)
+                """,
+                ([drift.borrower_id for drift in drifted],),
+            )
+        conn.commit()
+
+    return drifted
+
+
+def loan_query(include_archived):
+    """Return the SELECT ... FROM of loan records, over loans_archive too if asked, for a WHERE or ORDER BY to follow."""
+    return ALL_LOANS_QUERY if include_archived else LOAN_QUERY
+
+
+def iter_loans(batch_size=STREAM_BATCH_SIZE, include_archived=False):
+    """Yield every loan, newest first, one list of Loan records per batch.
+
+    Archived loans are left out unless include_archived is set.
+    """
+    query = loan_query(include_archived) + "ORDER BY loans.loan_date DESC, loans.loan_id DESC"
+
+    with get_connection() as conn:
+        for rows in stream_query(conn, query, batch_size=batch_size):
+            yield [Loan._make(row) for row in rows]
+
+
+def loans_page_query(after, before, start, page_size, include_archived=False):
+    """Return the query and parameters of a loans_page call, and whether its rows come out reversed."""
+    # The separate bound on loan_date lets the planner prune the partitions beyond the key
+    source = ALL_LOANS if include_archived else "loans"
+    if after is not None:
+        condition = "loans.loan_date <= %s AND (loans.loan_date, loans.loan_id) < (%s, %s)"
+        params, order = [after[0], *after], "DESC"
+    elif before is not None:
+        condition = "loans.loan_date >= %s AND (loans.loan_date, loans.loan_id) > (%s, %s)"
+        params, order = [before[0], *before], "ASC"
+    elif start is not None:
+        condition = f"""
+            (loans.loan_date, loans.loan_id) <= (SELECT loan_date, loan_id FROM {source} WHERE loan_id = %s)
+            AND loans.loan_date <= (SELECT loan_date FROM {source} WHERE loan_id = %s)
+        """
+        params, order = [start, start], "DESC"
+    else:
+        condition, params, order = "TRUE", [], "DESC"
+
+    query = loan_query(include_archived) + f"""
+        WHERE {condition}
+        ORDER BY loans.loan_date {order}, loans.loan_id {order}
+        LIMIT %s
+    """
+    return query, params + [page_size], order == "ASC"
+
+
+def loans_page(after=None, before=None, start=None, page_size=PAGE_SIZE, include_archived=False):
+    """Return one page of loans, newest first, using keyset pagination on (loan_date, loan_id).
+
+    `after` and `before` take the (loan_date, loan_id) key of the last or first loan on the
+    current page; `start` takes a loan_id and jumps to the page beginning with that loan.
+    Archived loans are paged through too if include_archived is set.
+    """
+    query, params, reversed_rows = loans_page_query(after, before, start, page_size, include_archived)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        loans = [Loan._make(row) for row in cur.fetchall()]
+
+    # Pages fetched backwards come out in reverse order
+    return loans[::-1] if reversed_rows else loans
+
+
+_FIND_LOANS_CONDITION = "WHERE books.title ILIKE %(pattern)s OR borrowers.name ILIKE %(pattern)s"
+FIND_LOANS_QUERY = LOAN_QUERY + _FIND_LOANS_CONDITION
+FIND_ALL_LOANS_QUERY = ALL_LOANS_QUERY + _FIND_LOANS_CONDITION
+
+
+def find_loans(keyword, batch_size=STREAM_BATCH_SIZE, include_archived=False):
+    """Yield the loans whose book title or borrower name contains the keyword.
+
+    Archived loans are searched too if include_archived is set.
+    """
+    query = FIND_ALL_LOANS_QUERY if include_archived else FIND_LOANS_QUERY
+
+    with get_connection() as conn:
+        for rows in stream_query(conn, query, {"pattern": f"%{keyword}%"}, batch_size=batch_size):
+            yield [Loan._make(row) for row in rows]
+
+
+def get_loan(loan_id, include_archived=False):
+    """Return the Loan with this ID, or None; archived loans are found only if include_archived is set."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(loan_query(include_archived) + "WHERE loans.loan_id = %s", (loan_id,))
+        row = cur.fetchone()
+
+    return Loan._make(row) if row else None
+
+
+def borrow_result(row, book_id, borrower_id):
+    """Turn the row of BORROW_QUERY into (BORROW_* code, Loan or None)."""
+    title, borrower, loan_id, loan_date = row
+    if title is None:
+        return BORROW_BOOK_NOT_FOUND, None
+    if borrower is None:
+        return BORROW_BORROWER_NOT_FOUND, None
+    if loan_id is None:
+        return BORROW_BOOK_UNAVAILABLE, None
+    return BORROW_OK, Loan(loan_id, book_id, title, borrower_id, borrower, loan_date, None)
+
+
+def create_loan(book_id, borrower_id):
+    """Lend a book in a single statement and return (BORROW_* code, Loan or None).
+
+    The active_loans table admits one active loan per book, so two desks can never lend the
+    same copy at once.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(BORROW_QUERY, (book_id, borrower_id))
+        row = cur.fetchone()
+        conn.commit()
+
+    return borrow_result(row, book_id, borrower_id)
+
+
+# Closes the active loans among the given loan IDs, or the active loans of the given book IDs, in
+# one statement and returns them with their book titles and borrower names; active_loan_trigger
+# frees the books. An active loan of a book is found through active_loans.
+_CLOSE_LOANS_QUERY = """
+    WITH closed AS (
+        UPDATE loans SET return_date = CURRENT_DATE
+        WHERE loan_id = ANY({loan_ids}) AND return_date IS NULL
+        RETURNING loan_id, book_id, borrower_id, loan_date, return_date
+    )
+    SELECT closed.loan_id, closed.book_id, books.title, closed.borrower_id, borrowers.name, closed.loan_date, closed.return_date
+    FROM closed
+    JOIN books ON books.book_id = closed.book_id
+    JOIN borrowers ON borrowers.borrower_id = closed.borrower_id
+    ORDER BY closed.loan_id
+"""
+CLOSE_LOANS_QUERY = _CLOSE_LOANS_QUERY.format(loan_ids="%s")
+CLOSE_BOOK_LOANS_QUERY = _CLOSE_LOANS_QUERY.format(loan_ids="ARRAY(SELECT loan_id FROM active_loans WHERE book_id = ANY(%s))")
+
+
+def closed_loans_result(rows, ids, by_book):
+    """Return the closed Loan records of rows and the requested IDs that had no active loan, in ID order."""
+    closed = [Loan._make(row) for row in rows]
+    found = {loan.book_id if by_book else loan.loan_id for loan in closed}
+    return closed, sorted(set(ids) - found)
+
+
+def close_loan(loan_id):
+    """Return the book of an active loan and return the closed Loan, or None if the loan is not active."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(CLOSE_LOANS_QUERY, ([loan_id],))
+        row = cur.fetchone()
+        conn.commit()
+
+    return Loan._make(row) if row else None
+
+
+def close_loans(ids, by_book=False):
+    """Return the books of many active loans at once, e.g. a drop box, in a single transaction.
+
+    `ids` are loan IDs, or book IDs if by_book is set. Returns the closed Loan records and the
+    IDs that had no active loan, both in ID order.
+    """
+    ids = list(ids)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(CLOSE_BOOK_LOANS_QUERY if by_book else CLOSE_LOANS_QUERY, (ids,))
+        rows = cur.fetchall()
+        conn.commit()
+
+    return closed_loans_result(rows, ids, by_book)
+
+
+def update_loan_return_date(loan_id, return_date):
+    """Change the return date of a returned loan and return it, or None if there is no such loan.
+
+    Raises ConflictError if the loan is still active or the date is before the loan date.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE loans
+            SET return_date = %(return_date)s
+            WHERE loan_id = %(loan_id)s AND return_date IS NOT NULL AND loan_date <= %(return_date)s
+            RETURNING loan_id
+            """,
+            {"loan_id": loan_id, "return_date": return_date},
+        )
+        updated = cur.fetchone()
+        conn.commit()
+
+    loan = get_loan(loan_id)
+    if loan is not None and not updated:
+        if loan.return_date is None:
+            raise ConflictError("This loan has not been returned yet. Modification is not allowed.")
+        raise ConflictError("The return date cannot be earlier than the loan date.")
+    return loan
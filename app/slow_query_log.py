@@ -0,0 +1,99 @@
+import logging
+import os
+import psycopg2
+import threading
+from logging.handlers import RotatingFileHandler
+from .db_connection import get_database_config
+
+# Log file, rotated once it reaches SLOW_QUERY_LOG_MAX_BYTES with SLOW_QUERY_LOG_BACKUPS old files kept
+SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "slow_queries.log"))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("DB_SLOW_QUERY_LOG_MAX_BYTES", str(5 * 2**20)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("DB_SLOW_QUERY_LOG_BACKUPS", "5"))
+
+# Whether the plan of a slow statement is captured; set DB_SLOW_QUERY_EXPLAIN=0 to log the statement only
+SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "1") != "0"
+
+# Limits for capturing a plan, so that it never waits long on the locks or runtime of the statement
+EXPLAIN_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+EXPLAIN_LOCK_TIMEOUT_MS = 1000
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger():
+    """Return the slow-query logger, opening its rotating log file on first use."""
+    global _logger
+
+    with _logger_lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(os.path.abspath(SLOW_QUERY_LOG)), exist_ok=True)
+            handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+            logger = logging.getLogger("library.slow_queries")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _logger = logger
+
+    return _logger
+
+
+def close_slow_query_log():
+    """Close the log file; the next slow statement opens it again."""
+    global _logger
+
+    with _logger_lock:
+        if _logger is not None:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+                handler.close()
+            _logger = None
+
+
+def explain(query, params=None):
+    """Return the plan of a statement and the EXPLAIN options it was captured with.
+
+    The statement runs again under EXPLAIN (ANALYZE, BUFFERS) on a separate connection, inside a
+    read-only transaction that is rolled back. Statements that write fail there instead of running
+    twice, and for those the estimated plan of a plain EXPLAIN is returned.
+    """
+    conn = psycopg2.connect(**get_database_config())
+    try:
+        with conn.cursor() as cur:
+            for options in ("ANALYZE, BUFFERS", "COSTS"):
+                try:
+                    cur.execute("SET TRANSACTION READ ONLY")
+                    cur.execute(f"SET LOCAL statement_timeout = {EXPLAIN_STATEMENT_TIMEOUT_MS}")
+                    cur.execute(f"SET LOCAL lock_timeout = {EXPLAIN_LOCK_TIMEOUT_MS}")
+                    cur.execute(f"EXPLAIN ({options}) {query}", params)
+                    return "\n".join(row[0] for row in cur.fetchall()), options
+                except psycopg2.errors.ReadOnlySqlTransaction:
+                    continue
+                finally:
+                    conn.rollback()
+    finally:
+        conn.close()
+
+
+def log_slow_query(statement, query, params=None, explain_plan=True, operation=None):
+    # Write a slow statement (a db_connection.StatementStats), its full SQL and parameters and, when
+    # explain_plan is set, its plan to the log. Never raises: the query it describes has already succeeded
+    lines = [
+        f"Slow statement: {statement.seconds * 1000:.1f} ms, {statement.rows} row(s), {statement.round_trips} round trip(s)"
+        + (f", operation '{operation}'" if operation else ""),
+        f"SQL: {' '.join(query.split())}",
+    ]
+    if params is not None:
+        lines.append(f"Parameters: {params!r}")
+
+    if explain_plan and SLOW_QUERY_EXPLAIN:
+        try:
+            plan, options = explain(query, params)
+            lines.append(f"Plan (EXPLAIN ({options})):")
+            lines.extend(f"    {line}" for line in plan.splitlines())
+        except psycopg2.Error as error:
+            lines.append(f"Plan unavailable: {str(error).strip()}")
+
+    get_logger().info("\n".join(lines))
@@ -0,0 +1,129 @@
+"""Compare circulation throughput of the synchronous and the asyncio data access APIs.
+
+Every client repeats one circulation cycle (search the catalog, borrow a book, return it) on a
+scratch book and borrower of its own until the time is up; --no-search leaves the search out,
+which otherwise dominates on a catalog without the search indexes. Synchronous clients are threads
+sharing the psycopg2 pool; asynchronous clients are tasks sharing the asyncpg pool in one event
+loop. Both pools hold up to 10 connections by default (DB_POOL_MAX_SIZE, DB_ASYNC_POOL_MAX_SIZE).
+The scratch rows are removed afterwards.
+
+Usage: ENV=production python -m benchmarks.bench_async [--clients 1 10 100] [--seconds N] [--no-search]
+"""
+import argparse
+import asyncio
+import threading
+import time
+from tabulate import tabulate
+from app import async_services, services
+from app.db_connection import close_pool
+from app.lookups import author_names, close_lookups
+from benchmarks.bench_suite import SCRATCH_TITLE, Scratch
+from benchmarks.common import summarize
+
+# The scratch books are found by their title; the search runs the full catalog query
+SEARCH_KEYWORD = SCRATCH_TITLE
+
+
+def sync_cycle(book_id, borrower_id, search=True):
+    if search:
+        for _ in services.find_books(SEARCH_KEYWORD):
+            pass
+    status, loan = services.create_loan(book_id, borrower_id)
+    services.close_loan(loan.loan_id)
+
+
+async def async_cycle(book_id, borrower_id, search=True):
+    if search:
+        async for _ in async_services.find_books(SEARCH_KEYWORD):
+            pass
+    status, loan = await async_services.create_loan(book_id, borrower_id)
+    await async_services.close_loan(loan.loan_id)
+
+
+def run_sync(desks, seconds, search):
+    # One thread per client; returns the per-cycle latencies in milliseconds, the number of failed
+    # cycles (e.g. timeouts waiting for a pooled connection) and the elapsed time
+    samples, errors = [], []
+    deadline = time.perf_counter() + seconds
+
+    def client(book_id, borrower_id):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                sync_cycle(book_id, borrower_id, search)
+            except Exception as error:
+                errors.append(error)
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=desk) for desk in desks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, len(errors), time.perf_counter() - started
+
+
+async def run_async(desks, seconds, search):
+    # One task per client in a single event loop
+    samples, errors = [], []
+    deadline = time.perf_counter() + seconds
+
+    async def client(book_id, borrower_id):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await async_cycle(book_id, borrower_id, search)
+            except Exception as error:
+                errors.append(error)
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+
+    # Open the pool before the clock starts, as the synchronous pool is already warm
+    await async_services.get_pool()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client(*desk) for desk in desks))
+    finally:
+        await async_services.close_pool()
+    return samples, len(errors), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100], help="numbers of concurrent clients (default: 1 10 100)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run (default: 5)")
+    parser.add_argument("--no-search", dest="search", action="store_false", help="leave the catalog search out of the cycle")
+    args = parser.parse_args()
+
+    # Load the lookup cache up front so that it is not counted against the first run
+    author_names()
+
+    scratch = Scratch()
+    rows = []
+    try:
+        desks = [(scratch.new_book(), scratch.new_borrower()) for _ in range(max(args.clients))]
+        sync_cycle(*desks[0], args.search)
+
+        for clients in args.clients:
+            runs = (
+                ("sync (threads)", lambda: run_sync(desks[:clients], args.seconds, args.search)),
+                ("asyncio", lambda: asyncio.run(run_async(desks[:clients], args.seconds, args.search))),
+            )
+            for api, run in runs:
+                samples, errors, elapsed = run()
+                stats = summarize(samples)
+                rows.append((clients, api, len(samples) / elapsed, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], errors))
+                print(f"{clients} client(s), {api}: {len(samples) / elapsed:.1f} cycles/s")
+    finally:
+        scratch.cleanup()
+        close_lookups()
+        close_pool()
+
+    print(f"\nOne cycle is {'a catalog search, ' if args.search else ''}a borrow and a return:\n")
+    print(tabulate(rows, ["Clients", "API", "Cycles/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Failed"], tablefmt="fancy_grid", floatfmt=".1f"))
+
+
+if __name__ == "__main__":
+    main()
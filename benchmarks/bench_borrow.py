@@ -0,0 +1,116 @@
+"""Compare borrow throughput of the legacy multi-statement path and the atomic BORROW_QUERY.
+
+Usage: ENV=production python -m benchmarks.bench_borrow [--books N] [--desks N]
+
+The benchmark creates its own author, genre, borrower and books and removes them afterwards.
+"""
+import argparse
+import threading
+import time
+from tabulate import tabulate
+from app.db_connection import close_pool, get_connection
+from app.services import BORROW_QUERY
+
+
+def legacy_borrow(conn, cur, book_id, borrower_id):
+    # The statement sequence borrow_book used before it became a single statement; the former
+    # is_available check and update are replaced by the equivalent lookup of an active loan
+    cur.execute("SELECT title FROM books WHERE book_id = %s", (book_id,))
+    cur.fetchone()
+    cur.execute("SELECT name FROM borrowers WHERE borrower_id = %s", (borrower_id,))
+    cur.fetchone()
+    cur.execute("SELECT 1 FROM loans WHERE book_id = %s AND return_date IS NULL", (book_id,))
+    if not cur.fetchone():
+        cur.execute(
+            "INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (%s, %s, CURRENT_DATE) RETURNING loan_id, loan_date",
+            (book_id, borrower_id),
+        )
+        cur.fetchone()
+    conn.commit()
+
+
+def atomic_borrow(conn, cur, book_id, borrower_id):
+    cur.execute(BORROW_QUERY, (book_id, borrower_id))
+    cur.fetchone()
+    conn.commit()
+
+
+def setup(book_count):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO authors (name) VALUES ('Benchmark Author') RETURNING author_id")
+        author_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO genres (name) VALUES ('Benchmark Genre') RETURNING genre_id")
+        genre_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO borrowers (name, email, phone) VALUES ('Benchmark', 'benchmark@example.invalid', '0') RETURNING borrower_id"
+        )
+        borrower_id = cur.fetchone()[0]
+        cur.execute(
+            """
+            INSERT INTO books (title, author_id, genre_id, published_year)
+            SELECT 'Benchmark ' || n, %s, %s, 2000 FROM generate_series(1, %s) AS n
+            RETURNING book_id
+            """,
+            (author_id, genre_id, book_count),
+        )
+        book_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    return author_id, genre_id, borrower_id, book_ids
+
+
+def reset(book_ids):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM loans WHERE book_id = ANY(%s)", (book_ids,))
+        conn.commit()
+
+
+def teardown(author_id, genre_id, borrower_id, book_ids):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM books WHERE book_id = ANY(%s)", (book_ids,))
+        cur.execute("DELETE FROM borrowers WHERE borrower_id = %s", (borrower_id,))
+        cur.execute("DELETE FROM authors WHERE author_id = %s", (author_id,))
+        cur.execute("DELETE FROM genres WHERE genre_id = %s", (genre_id,))
+        conn.commit()
+
+
+def run(borrow, book_ids, borrower_id, desks):
+    # Every desk borrows its own share of the books; returns borrows per second
+    shares = [book_ids[i::desks] for i in range(desks)]
+
+    def desk(share):
+        with get_connection() as conn, conn.cursor() as cur:
+            for book_id in share:
+                borrow(conn, cur, book_id, borrower_id)
+
+    threads = [threading.Thread(target=desk, args=(share,)) for share in shares]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(book_ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--desks", type=int, default=4)
+    args = parser.parse_args()
+
+    author_id, genre_id, borrower_id, book_ids = setup(args.books)
+    try:
+        rows = []
+        for name, borrow in (("legacy (4 statements)", legacy_borrow), ("atomic (1 statement)", atomic_borrow)):
+            for desks in (1, args.desks):
+                reset(book_ids)
+                rows.append((name, desks, run(borrow, book_ids, borrower_id, desks)))
+        reset(book_ids)
+    finally:
+        teardown(author_id, genre_id, borrower_id, book_ids)
+        close_pool()
+
+    print(tabulate(rows, ["Path", "Desks", "Borrows/s"], tablefmt="fancy_grid", floatfmt=".0f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Load-test the HTTP JSON service on localhost.
+
+Each client thread keeps one HTTP/1.1 connection open and sends a weighted mix of requests
+(book lookups, book pages, catalog searches and borrow + return pairs on scratch books) until
+the time is up. The service runs in a separate process, started here unless --url points at a
+running one. Reports requests per second and latency percentiles per request type.
+
+Usage: ENV=production python -m benchmarks.bench_http [--clients N] [--seconds N] [--url URL] [--workers N]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from tabulate import tabulate
+from app.db_connection import close_pool
+from benchmarks.bench_suite import Scratch, execute
+from benchmarks.common import summarize
+
+# Relative weight of each request type in the mix
+MIX = {"book": 50, "page": 20, "search": 10, "borrow+return": 20}
+
+SEARCH_KEYWORDS = ["the", "river", "night", "tolkien", "fantasy", "1937", "garden", "war"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers):
+    # Start app.server in its own process and wait until it accepts connections
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--port", str(port), "--workers", str(workers)],
+        stdout=subprocess.DEVNULL,
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit("\nThe server exited during startup.\n")
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("\nThe server did not start within 30 seconds.\n")
+
+
+def request(client, method, path, body=None):
+    client.request(method, path, body=json.dumps(body) if body is not None else None, headers={"Content-Type": "application/json"})
+    response = client.getresponse()
+    payload = json.loads(response.read())
+    if response.status >= 400:
+        raise RuntimeError(f"{method} {path}: {response.status} {payload.get('error')}")
+    return payload
+
+
+def run_client(host, port, desk, book_ids, deadline, seed, results):
+    # results maps each request type to (latencies in ms, error count)
+    rng = random.Random(seed)
+    kinds, weights = list(MIX), list(MIX.values())
+    client = http.client.HTTPConnection(host, port, timeout=60)
+    book_id, borrower_id = desk
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            try:
+                if kind == "book":
+                    request(client, "GET", f"/books/{rng.randint(*book_ids)}")
+                elif kind == "page":
+                    request(client, "GET", f"/books?start={rng.randint(*book_ids)}")
+                elif kind == "search":
+                    request(client, "GET", f"/books/search?q={rng.choice(SEARCH_KEYWORDS)}&limit=20")
+                else:
+                    loan = request(client, "POST", "/loans", {"book_id": book_id, "borrower_id": borrower_id})
+                    request(client, "POST", f"/loans/{loan['loan_id']}/return")
+            except (OSError, http.client.HTTPException, RuntimeError, ValueError):
+                results[kind][1].append(1)
+                client.close()
+                continue
+            results[kind][0].append((time.perf_counter() - start) * 1000)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections (default: 16)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of the test (default: 10)")
+    parser.add_argument("--url", help="test a running server instead of starting one, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--workers", type=int, default=16, help="worker threads of the started server (default: 16)")
+    args = parser.parse_args()
+
+    first_book, last_book = execute("SELECT ARRAY[MIN(book_id), MAX(book_id)] FROM books")
+    if first_book is None:
+        raise SystemExit("\nThe catalog is empty; fill it with benchmarks.datagen first.\n")
+
+    scratch = Scratch()
+    process = None
+    try:
+        desks = [(scratch.new_book(), scratch.new_borrower()) for _ in range(args.clients)]
+
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            process = start_server(port, args.workers)
+
+        results = {kind: ([], []) for kind in MIX}
+        deadline = time.perf_counter() + args.seconds
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=run_client, args=(host, port, desk, (first_book, last_book), deadline, index, results))
+            for index, desk in enumerate(desks)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        scratch.cleanup()
+        close_pool()
+
+    rows = []
+    for kind, (samples, errors) in results.items():
+        stats = summarize(samples)
+        rows.append((kind, len(samples), len(samples) / elapsed, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], len(errors)))
+    everything = [sample for samples, _ in results.values() for sample in samples]
+    stats = summarize(everything)
+    rows.append(("all", len(everything), len(everything) / elapsed, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], sum(len(errors) for _, errors in results.values())))
+
+    print(f"\n{args.clients} client(s) for {elapsed:.1f}s (a borrow+return pair counts as one request):\n")
+    print(tabulate(rows, ["Request", "Count", "Requests/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Errors"], tablefmt="fancy_grid", floatfmt=".1f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare scan throughput of per-event commits with kiosk mode's group commit.
+
+Every scratch book is borrowed and then returned by book ID, once through the service functions
+(one pooled connection checkout and one commit per scan, as the menus do) and once per group size
+through app.kiosk, fed from a queue as its TCP clients would. All scans are queued at once, like
+a backlog of scans, and the run ends when every result has been reported. Reports scans per second.
+
+Usage: ENV=production python -m benchmarks.bench_kiosk [--books N] [--group-sizes 1,10,100] [--group-ms MS]
+"""
+import argparse
+import queue
+import threading
+import time
+from tabulate import tabulate
+from app.db_connection import close_pool
+from app.kiosk import GROUP_MS, Kiosk, serve
+from app.services import close_loans, create_loan
+from benchmarks.bench_suite import SCRATCH_TITLE, Scratch, execute
+
+
+def scratch_books(scratch, count):
+    # Insert the scratch books in one statement and return their IDs, lowest first
+    execute(
+        "INSERT INTO books (title, author_id, genre_id, published_year) SELECT %s, %s, %s, 2000 FROM generate_series(1, %s)",
+        (SCRATCH_TITLE, scratch.author_id, scratch.genre_id, count),
+    )
+    first = execute("SELECT MIN(book_id) FROM books WHERE title = %s AND book_id > %s", (SCRATCH_TITLE, scratch.book_id))
+    return list(range(first, first + count))
+
+
+def run_services(book_ids, borrower_id):
+    # One commit per scan through the service functions; returns the number of scans
+    for book_id in book_ids:
+        create_loan(book_id, borrower_id)
+    for book_id in book_ids:
+        close_loans([book_id], by_book=True)
+    return 2 * len(book_ids)
+
+
+def run_kiosk(book_ids, borrower_id, group_size, group_ms):
+    # Feed every scan to a kiosk at once and return the number of results reported
+    lines = [f"borrow {book_id} {borrower_id}" for book_id in book_ids] + [f"return-book {book_id}" for book_id in book_ids]
+    events = queue.Queue()
+    results = []
+    kiosk = Kiosk(group_size, group_ms)
+    worker = threading.Thread(target=serve, args=(events, kiosk))
+    worker.start()
+
+    try:
+        for line in lines:
+            events.put((line, results.append))
+        events.put(None)
+        worker.join()
+    finally:
+        kiosk.close()
+    return len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=2000, help="scratch books, each borrowed and returned once per run (default: 2000)")
+    parser.add_argument("--group-sizes", default="1,10,100", help="comma-separated kiosk group sizes (default: 1,10,100)")
+    parser.add_argument("--group-ms", type=int, default=GROUP_MS, help=f"kiosk group time limit in ms (default: {GROUP_MS})")
+    args = parser.parse_args()
+
+    scratch = Scratch()
+    rows = []
+    try:
+        book_ids = scratch_books(scratch, args.books)
+        runs = [("services, commit per scan", lambda: run_services(book_ids, scratch.borrower_id))]
+        for size in (int(value) for value in args.group_sizes.split(",")):
+            runs.append((f"kiosk, group of {size}", lambda size=size: run_kiosk(book_ids, scratch.borrower_id, size, args.group_ms)))
+
+        for name, run in runs:
+            start = time.perf_counter()
+            scans = run()
+            rows.append((name, scans, scans / (time.perf_counter() - start)))
+    finally:
+        scratch.cleanup()
+        close_pool()
+
+    print(f"\nEach of {args.books} scratch book(s) borrowed and returned per run:\n")
+    print(tabulate(rows, ["Mode", "Scans", "Scans/s"], tablefmt="fancy_grid", floatfmt=".1f"))
+
+
+if __name__ == "__main__":
+    main()
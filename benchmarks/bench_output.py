@@ -0,0 +1,73 @@
+"""Measure how fast list_books dumps the catalog in each output format.
+
+Each format writes the whole catalog to /dev/null; the fancy_grid baseline builds one
+tabulate() table over every row in memory, as the listing functions did before streaming.
+
+Usage: ENV=production python -m benchmarks.bench_output [--repeat N] [--memory]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from tabulate import tabulate
+from app.books import BOOK_HEADERS, book_row, list_books
+from app.db_connection import close_pool, get_connection
+from app.lookups import author_names, close_lookups
+from app.output import OUTPUT_FORMATS
+from app.services import LISTED_BOOKS, iter_books
+
+
+def tabulate_all():
+    rows = [book_row(book) for books in iter_books() for book in books]
+    print(tabulate(rows, BOOK_HEADERS, tablefmt="fancy_grid"))
+
+
+def measure(func, repeat, memory):
+    # Best wall time over the runs; tracing allocations slows Python down a lot, so the peak
+    # memory comes from one extra traced run, and only when asked for
+    best, peak = float("inf"), None
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory", action="store_true", help="also report peak Python memory per format")
+    args = parser.parse_args()
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM books WHERE {LISTED_BOOKS}")
+        row_count = cur.fetchone()[0]
+
+    # Load the lookup cache up front so that it is not counted against the first format
+    author_names()
+
+    runs = {f"{output_format} (streamed)": (lambda output_format=output_format: list_books(output_format=output_format)) for output_format in OUTPUT_FORMATS}
+    runs["fancy_grid (tabulate, all rows)"] = tabulate_all
+
+    rows = []
+    for name, func in runs.items():
+        seconds, peak = measure(func, args.repeat, args.memory)
+        rows.append((name, seconds, row_count / seconds, peak))
+
+    close_lookups()
+    close_pool()
+
+    print(f"\nCatalog of {row_count} books, best of {args.repeat} run(s):\n")
+    print(tabulate(rows, ["Format", "Seconds", "Rows/s", "Peak memory (MiB)"], tablefmt="fancy_grid", floatfmt=".1f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Compare per-operation latency with a fresh connection per call and with the pool.
+
+Usage: ENV=production python -m benchmarks.bench_pool [--iterations N]
+"""
+import argparse
+from tabulate import tabulate
+from app.db_connection import close_pool, connect_to_db, get_connection
+from .common import summarize, time_calls
+
+# A typical desk lookup: one short indexed query per operation
+QUERY = "SELECT title FROM books WHERE book_id = %s"
+
+
+def without_pool():
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(QUERY, (1,))
+    cur.fetchone()
+    cur.close()
+    conn.close()
+
+
+def with_pool():
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(QUERY, (1,))
+        cur.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    # Warm up the pool so its first connect is not counted
+    with_pool()
+
+    results = {
+        "connect per operation": summarize(time_calls(without_pool, args.iterations)),
+        "pooled connection": summarize(time_calls(with_pool, args.iterations)),
+    }
+    close_pool()
+
+    rows = [(name, s["mean_ms"], s["p50_ms"], s["p95_ms"], s["p99_ms"], 1000 / s["mean_ms"]) for name, s in results.items()]
+    print(tabulate(rows, ["Mode", "Mean (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Ops/s"], tablefmt="fancy_grid", floatfmt=".3f"))
+
+    speedup = results["connect per operation"]["mean_ms"] / results["pooled connection"]["mean_ms"]
+    print(f"\nPooled connections are {speedup:.1f}x faster per operation.\n")
+
+
+if __name__ == "__main__":
+    main()
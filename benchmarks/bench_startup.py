@@ -0,0 +1,56 @@
+"""Measure the import time of the CLI entry point against its startup budget.
+
+Each run starts a fresh interpreter with `python -X importtime` and reads the cumulative
+import time of app.cli; the median over the runs is compared with STARTUP_BUDGET_MS.
+
+Usage: python -m benchmarks.bench_startup [--runs N] [--module MODULE]
+"""
+import argparse
+import re
+import subprocess
+import sys
+from tabulate import tabulate
+from app.cli import STARTUP_BUDGET_MS
+from .common import summarize
+
+# "import time:      self [us] |  cumulative [us] | module" lines written to stderr
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.*)$")
+
+
+def import_time_ms(module):
+    """Return the cumulative import time of a module in a fresh interpreter, in milliseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match and match.group(3).strip() == module:
+            return int(match.group(2)) / 1000
+    raise RuntimeError(f"{module} not found in the import time report")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--module", action="append", help="module to measure (default: app.cli and app.interactive)")
+    args = parser.parse_args()
+
+    modules = args.module or ["app.cli", "app.interactive"]
+    results = {module: summarize([import_time_ms(module) for _ in range(args.runs)]) for module in modules}
+
+    rows = [(module, s["mean_ms"], s["p50_ms"], s["p95_ms"]) for module, s in results.items()]
+    print(tabulate(rows, ["Module", "Mean (ms)", "p50 (ms)", "p95 (ms)"], tablefmt="fancy_grid", floatfmt=".1f"))
+
+    cli_ms = results.get("app.cli", {}).get("p50_ms")
+    if cli_ms is not None:
+        within = cli_ms <= STARTUP_BUDGET_MS
+        print(f"\napp.cli imports in {cli_ms:.1f} ms (budget {STARTUP_BUDGET_MS} ms): {'within budget' if within else 'OVER BUDGET'}.\n")
+        return 0 if within else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
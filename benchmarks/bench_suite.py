@@ -0,0 +1,265 @@
+"""Time every public operation of the books, borrowers and loans modules.
+
+Each operation runs against the configured database with its output sent to /dev/null.
+The suite reports p50/p95/p99 latency and peak Python memory per operation and saves the
+results, with the row counts and git commit they were measured at, as JSON so that a later
+run can be compared against them. Operations that write work on scratch rows created for
+the run and removed afterwards, so the database is left as it was found. Fill the database
+with benchmarks/datagen.py first to measure at a realistic scale.
+
+Usage: ENV=production python -m benchmarks.bench_suite [--iterations N] [--output FILE] [--compare OLD.json]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from tabulate import tabulate
+from app.books import add_book, get_books_page, import_books, list_books, modify_book, remove_book, search_books
+from app.borrowers import add_borrower, modify_borrower, reconcile_loan_counts, remove_borrower_by_id, search_borrowers, view_borrowers
+from app.db_connection import close_pool, get_connection, track_operation
+from app.loans import borrow_book, get_loans_page, modify_loan, return_book, search_loan, view_loans
+from app.lookups import author_names, close_lookups
+from benchmarks.common import summarize
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "bench_suite.json")
+
+# Title and email domain of every scratch row, so that a run that crashed can still be cleaned up
+SCRATCH_TITLE = "Benchmark Suite Scratch Book"
+SCRATCH_DOMAIN = "bench-suite.invalid"
+
+# Rows per CSV file imported by the import_books benchmark
+IMPORT_ROWS = 1000
+
+# Full scans run this many times fewer than the other operations
+SCAN_DIVISOR = 10
+
+
+def execute(query, params=()):
+    # Run one statement in its own transaction and return the first column of its first row, if any
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        row = cur.fetchone() if cur.description else None
+        conn.commit()
+    return row[0] if row else None
+
+
+def row_counts():
+    counts = {}
+    for table in ("authors", "genres", "books", "borrowers", "loans"):
+        counts[table] = execute(f"SELECT COUNT(*) FROM {table}")
+    return counts
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Scratch:
+    """Scratch book and borrower the writing operations work on, plus their cleanup."""
+
+    def __init__(self):
+        self.author_id = execute("SELECT MIN(author_id) FROM authors")
+        self.genre_id = execute("SELECT MIN(genre_id) FROM genres")
+        if self.author_id is None or self.genre_id is None:
+            raise SystemExit("\nThe suite needs at least one author and one genre; run benchmarks.datagen first.\n")
+        self.sequence = 0
+        self.book_id = self.new_book()
+        self.borrower_id = self.new_borrower()
+
+    def new_book(self):
+        return execute(
+            "INSERT INTO books (title, author_id, genre_id, published_year) VALUES (%s, %s, %s, 2000) RETURNING book_id",
+            (SCRATCH_TITLE, self.author_id, self.genre_id),
+        )
+
+    def new_contact(self):
+        # Unique email and phone, as add_borrower rejects duplicates of either
+        self.sequence += 1
+        return f"scratch.{os.getpid()}.{self.sequence}@{SCRATCH_DOMAIN}", f"0{os.getpid() % 10**5:05d}{self.sequence:05d}"
+
+    def new_borrower(self):
+        return execute(
+            "INSERT INTO borrowers (name, email, phone) VALUES ('Benchmark Borrower', %s, %s) RETURNING borrower_id",
+            self.new_contact(),
+        )
+
+    def borrow(self):
+        # Lend the scratch book without going through the timed code path; returns the loan ID
+        return execute(
+            "INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (%s, %s, CURRENT_DATE) RETURNING loan_id",
+            (self.book_id, self.borrower_id),
+        )
+
+    def give_back(self):
+        execute("UPDATE loans SET return_date = CURRENT_DATE WHERE book_id = %s AND return_date IS NULL", (self.book_id,))
+
+    def cleanup(self):
+        # Loans of scratch books and borrowers go with them (ON DELETE CASCADE)
+        execute("DELETE FROM books WHERE title = %s", (SCRATCH_TITLE,))
+        execute("DELETE FROM borrowers WHERE email LIKE %s", (f"%@{SCRATCH_DOMAIN}",))
+
+
+def run_case(func, iterations, setup=None):
+    # Time func over the iterations, calling setup (untimed) before each call for its arguments.
+    # The peak memory and the query counts come from one extra traced call, as tracing slows
+    # every allocation down
+    samples = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    with track_operation("bench_suite") as operation:
+        func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    return {**summarize(samples), "peak_mib": peak, "statements": operation.statement_count, "round_trips": operation.round_trips}
+
+
+def build_cases(scratch, csv_path, iterations):
+    # (name, function, iterations, setup) for every public operation
+    scans = max(1, iterations // SCAN_DIVISOR)
+    sample_book = execute("SELECT title FROM books WHERE title <> %s ORDER BY book_id LIMIT 1", (SCRATCH_TITLE,)) or "book"
+    keyword = sample_book.split()[0]
+    sample_email = execute("SELECT email FROM borrowers ORDER BY borrower_id LIMIT 1") or "reader@example.com"
+    sample_phone = execute("SELECT phone FROM borrowers ORDER BY borrower_id LIMIT 1") or "5551234"
+    sample_name = (execute("SELECT name FROM borrowers ORDER BY borrower_id LIMIT 1") or "reader").split()[-1]
+    today = datetime.date.today().isoformat()
+
+    def returned_loan():
+        loan_id = scratch.borrow()
+        scratch.give_back()
+        return (loan_id,)
+
+    def borrowable():
+        scratch.give_back()
+        return (scratch.book_id, scratch.borrower_id)
+
+    def active_loan():
+        scratch.give_back()
+        return (scratch.borrow(),)
+
+    return [
+        ("books.list_books", list_books, scans, None),
+        ("books.get_books_page", get_books_page, iterations, None),
+        ("books.get_books_page (middle)", lambda: get_books_page(start=scratch.book_id // 2), iterations, None),
+        ("books.search_books", lambda: search_books(keyword), iterations, None),
+        ("books.add_book", lambda: add_book(SCRATCH_TITLE, scratch.author_id, scratch.genre_id, 2000), iterations, None),
+        ("books.import_books", lambda: import_books(csv_path), scans, None),
+        ("books.remove_book", lambda book_id: remove_book(book_id, confirm=False), iterations, lambda: (scratch.new_book(),)),
+        ("books.modify_book", lambda: modify_book(scratch.book_id, changes={"published_year": 2001}), iterations, None),
+        ("borrowers.view_borrowers", view_borrowers, scans, None),
+        ("borrowers.search_borrowers (email)", lambda: search_borrowers(sample_email), iterations, None),
+        ("borrowers.search_borrowers (phone)", lambda: search_borrowers(sample_phone), iterations, None),
+        ("borrowers.search_borrowers (name)", lambda: search_borrowers(sample_name), iterations, None),
+        ("borrowers.add_borrower", lambda email, phone: add_borrower("Benchmark Borrower", email, phone), iterations, scratch.new_contact),
+        ("borrowers.remove_borrower_by_id", lambda borrower_id: remove_borrower_by_id(borrower_id, confirm=False), iterations, lambda: (scratch.new_borrower(),)),
+        ("borrowers.modify_borrower", lambda: modify_borrower(scratch.borrower_id, changes={"name": "Benchmark Borrower"}), iterations, None),
+        ("borrowers.reconcile_loan_counts", reconcile_loan_counts, scans, None),
+        ("loans.view_loans", view_loans, scans, None),
+        ("loans.get_loans_page", get_loans_page, iterations, None),
+        ("loans.search_loan", lambda: search_loan(keyword), iterations, None),
+        ("loans.borrow_book", borrow_book, iterations, borrowable),
+        ("loans.return_book", return_book, iterations, active_loan),
+        ("loans.modify_loan", lambda loan_id: modify_loan(loan_id, new_return_date=today), iterations, returned_loan),
+    ]
+
+
+def write_import_csv(path, scratch):
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["title", "author_id", "genre_id", "published_year"])
+        for _ in range(IMPORT_ROWS):
+            writer.writerow([SCRATCH_TITLE, scratch.author_id, scratch.genre_id, 2000])
+
+
+def compare(results, old_path):
+    with open(old_path, encoding="utf-8") as old_file:
+        old = json.load(old_file)
+
+    rows = []
+    for name, stats in results["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            rows.append((name, None, stats["p50_ms"], None, None, stats["p95_ms"], None))
+            continue
+        rows.append((
+            name,
+            before["p50_ms"], stats["p50_ms"], change(before["p50_ms"], stats["p50_ms"]),
+            before["p95_ms"], stats["p95_ms"], change(before["p95_ms"], stats["p95_ms"]),
+        ))
+
+    print(f"\nCompared with {old_path} (commit {old.get('commit')}, {old.get('timestamp')}):\n")
+    headers = ["Operation", "Old p50 (ms)", "New p50 (ms)", "p50 change", "Old p95 (ms)", "New p95 (ms)", "p95 change"]
+    print(tabulate(rows, headers, tablefmt="fancy_grid", floatfmt=".2f", missingval="-"))
+
+
+def change(before, after):
+    return f"{(after - before) / before:+.0%}" if before else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50, help="calls per operation (default: 50; full scans run a tenth as often)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"where to save the results (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="compare the results with an earlier run")
+    args = parser.parse_args()
+
+    counts = row_counts()
+
+    # Load the lookup cache up front so that it is not counted against the first operation
+    author_names()
+
+    scratch = Scratch()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w", encoding="utf-8") as devnull:
+            csv_path = os.path.join(directory, "books.csv")
+            write_import_csv(csv_path, scratch)
+
+            for name, func, iterations, setup in build_cases(scratch, csv_path, args.iterations):
+                with redirect_stdout(devnull):
+                    results[name] = run_case(func, iterations, setup)
+                print(f"{name}: p50 {results[name]['p50_ms']:.2f} ms")
+    finally:
+        scratch.cleanup()
+        close_lookups()
+        close_pool()
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "row_counts": counts,
+        "iterations": args.iterations,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    rows = [(name, stats["count"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["peak_mib"], stats["round_trips"]) for name, stats in results.items()]
+    print(f"\nRow counts: {', '.join(f'{table} {count}' for table, count in counts.items())}\n")
+    print(tabulate(rows, ["Operation", "Calls", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Peak memory (MiB)", "Round trips"], tablefmt="fancy_grid", floatfmt=".2f"))
+    print(f"\nResults saved to {args.output}.\n")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Generate a synthetic library at production scale with COPY.
+
+Rows are produced on the fly and streamed through COPY FROM STDIN, so memory stays flat for
+any volume. Popularity is skewed the way real circulation data is: a few authors write most
+of the books, a few books account for most of the loans, and a few borrowers borrow most.
+Each skew follows a Zipf distribution; --skew sets its exponent (0 gives uniform data).
+
+Usage: ENV=production python -m benchmarks.datagen [--books N] [--borrowers N] [--loans N] [--reset]
+
+For example --books 5000000 --borrowers 1000000 --loans 50000000 for a large branch network.
+Generated rows are appended after the existing ones unless --reset empties the tables first.
+"""
+import argparse
+import datetime
+import itertools
+import random
+import time
+from app.db_connection import connect_to_db
+
+FIRST_NAMES = [
+    "Ada", "Alan", "Alice", "Amara", "Ana", "Ben", "Carla", "Chen", "Clara", "David", "Elena", "Emil", "Fatima", "Felix",
+    "Grace", "Hana", "Hugo", "Ines", "Ivan", "Jamal", "Jane", "Jonas", "Kai", "Lara", "Leo", "Lucia", "Maya", "Mateo",
+    "Nina", "Noah", "Olga", "Omar", "Paula", "Pedro", "Rosa", "Sami", "Sofia", "Tariq", "Uma", "Victor", "Wen", "Yara",
+]
+LAST_NAMES = [
+    "Abbott", "Alvarez", "Baker", "Becker", "Costa", "Dubois", "Evans", "Fischer", "Garcia", "Haddad", "Hansen", "Ito",
+    "Jensen", "Kim", "Kowalski", "Larsen", "Lopez", "Martin", "Meyer", "Moreau", "Nakamura", "Novak", "Okafor", "Olsen",
+    "Patel", "Quinn", "Rossi", "Santos", "Schmidt", "Silva", "Tanaka", "Turner", "Usman", "Vargas", "Weber", "Young",
+]
+TITLE_WORDS = [
+    "the", "of", "and", "night", "house", "river", "secret", "last", "garden", "city", "war", "light", "shadow", "stone",
+    "king", "queen", "winter", "summer", "song", "road", "sea", "fire", "glass", "silent", "lost", "golden", "iron",
+    "island", "forest", "dream", "letter", "map", "clock", "storm", "mountain", "bridge", "empire", "child", "wolf",
+    "star", "memory", "dark", "little", "long", "broken", "hidden", "wild", "red", "blue", "green", "white", "black",
+    "journey", "return", "tale", "book", "voice", "silence", "harbor", "tower", "history", "science", "art", "love",
+]
+GENRES = [
+    "Fantasy", "Science Fiction", "Mystery", "Thriller", "Romance", "Historical Fiction", "Horror", "Poetry", "Drama",
+    "Biography", "History", "Science", "Philosophy", "Travel", "Children", "Young Adult", "Graphic Novel", "Cooking",
+]
+
+# Share of generated loans still out, and how far back the loan history reaches
+ACTIVE_LOAN_SHARE = 0.02
+HISTORY_DAYS = 10 * 365
+
+
+class CopyStream:
+    """File-like object that feeds generated lines to copy_expert without building the file in memory."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = "".join(itertools.islice(self._lines, 1000))
+            if not chunk:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def zipf_weights(count, skew):
+    """Return cumulative Zipf weights for ranks 1..count, for random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def skewed_ids(rng, first_id, count, skew, k, chunk=10_000):
+    # Yield k IDs drawn from first_id .. first_id + count - 1 with Zipf popularity. The ranks are
+    # shuffled so popularity does not follow insertion order, and IDs are drawn a chunk at a time
+    ranks = list(range(first_id, first_id + count))
+    rng.shuffle(ranks)
+    weights = zipf_weights(count, skew)
+    population = range(count)
+    for start in range(0, k, chunk):
+        for index in rng.choices(population, cum_weights=weights, k=min(chunk, k - start)):
+            yield ranks[index]
+
+
+def copy(cur, table, columns, lines):
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", CopyStream(lines))
+    return cur.rowcount
+
+
+def next_id(cur, table, column):
+    cur.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}")
+    return cur.fetchone()[0]
+
+
+def generate(conn, books, borrowers, loans, authors=None, skew=1.0, seed=42, reset=False, log=print):
+    """Append a synthetic library to the database in one transaction and return the row counts."""
+    rng = random.Random(seed)
+    authors = authors or max(1, books // 25)
+    cur = conn.cursor()
+
+    if reset:
+        cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE")
+
+    def step(message, func):
+        start = time.perf_counter()
+        rows = func()
+        log(f"{message}: {rows} rows in {time.perf_counter() - start:.1f}s")
+        return rows
+
+    first_author = next_id(cur, "authors", "author_id")
+    step("authors", lambda: copy(cur, "authors", ["author_id", "name"], (
+        f"{author_id}\t{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}\n" for author_id in range(first_author, first_author + authors)
+    )))
+
+    first_genre = next_id(cur, "genres", "genre_id")
+    step("genres", lambda: copy(cur, "genres", ["genre_id", "name"], (
+        f"{first_genre + index}\t{name}\n" for index, name in enumerate(GENRES)
+    )))
+
+    # Books are staged and inserted with their search documents built set-wise, like import_books
+    first_book = next_id(cur, "books", "book_id")
+    author_ids = skewed_ids(rng, first_author, authors, skew, books)
+    genre_ids = skewed_ids(rng, first_genre, len(GENRES), skew, books)
+    word_weights = zipf_weights(len(TITLE_WORDS), skew)
+    cur.execute("CREATE TEMPORARY TABLE book_staging (LIKE books INCLUDING DEFAULTS) ON COMMIT DROP")
+    step("books (staged)", lambda: copy(cur, "book_staging", ["book_id", "title", "author_id", "genre_id", "published_year"], (
+        f"{book_id}\t{' '.join(rng.choices(TITLE_WORDS, cum_weights=word_weights, k=rng.randint(1, 5))).capitalize()}"
+        f"\t{author_id}\t{genre_id}\t{int(rng.triangular(1800, 2025, 2015))}\n"
+        for book_id, author_id, genre_id in zip(range(first_book, first_book + books), author_ids, genre_ids)
+    )))
+
+    def insert_books():
+        cur.execute(
+            """
+            INSERT INTO books (book_id, title, author_id, genre_id, published_year, search_vector)
+            SELECT book_staging.book_id, book_staging.title, book_staging.author_id, book_staging.genre_id,
+                   book_staging.published_year,
+                   setweight(to_tsvector('simple', book_staging.title), 'A')
+                   || setweight(to_tsvector('simple', authors.name), 'B')
+                   || setweight(to_tsvector('simple', genres.name), 'C')
+                   || setweight(to_tsvector('simple', book_staging.published_year::TEXT), 'D')
+            FROM book_staging
+            JOIN authors ON authors.author_id = book_staging.author_id
+            JOIN genres ON genres.genre_id = book_staging.genre_id
+            """
+        )
+        return cur.rowcount
+
+    step("books", insert_books)
+
+    first_borrower = next_id(cur, "borrowers", "borrower_id")
+
+    def borrower_line(borrower_id):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return f"{borrower_id}\t{first} {last}\t{first.lower()}.{last.lower()}.{borrower_id}@example.com\t5{borrower_id:010d}\n"
+
+    step("borrowers", lambda: copy(cur, "borrowers", ["borrower_id", "name", "email", "phone"], (
+        borrower_line(borrower_id) for borrower_id in range(first_borrower, first_borrower + borrowers)
+    )))
+
+    # Loans are copied with the loan triggers disabled; the active loans and the borrower counters
+    # are then derived set-wise, which is far cheaper than trigger statements per loan
+    today = datetime.date.today().toordinal()
+    active = min(int(loans * ACTIVE_LOAN_SHARE), books // 3)
+    active_books = iter(rng.sample(range(first_book, first_book + books), active))
+    loan_books = skewed_ids(rng, first_book, books, skew, loans - active)
+    loan_borrowers = skewed_ids(rng, first_borrower, borrowers, skew, loans)
+
+    def loan_line(index, borrower_id):
+        if index < active:
+            loan_date = today - rng.randint(0, 60)
+            return f"{next(active_books)}\t{borrower_id}\t{datetime.date.fromordinal(loan_date)}\t\\N\n"
+        loan_date = today - rng.randint(14, HISTORY_DAYS)
+        return_date = min(today, loan_date + rng.randint(1, 60))
+        return f"{next(loan_books)}\t{borrower_id}\t{datetime.date.fromordinal(loan_date)}\t{datetime.date.fromordinal(return_date)}\n"
+
+    # Yearly partitions for the whole history, so the loans are not routed to the default partition
+    cur.execute("SELECT create_loan_partitions(CURRENT_DATE - %s, CURRENT_DATE)", (HISTORY_DAYS,))
+    cur.execute("ALTER TABLE loans DISABLE TRIGGER USER")
+    step("loans", lambda: copy(cur, "loans", ["book_id", "borrower_id", "loan_date", "return_date"], (
+        loan_line(index, borrower_id) for index, borrower_id in enumerate(loan_borrowers)
+    )))
+    cur.execute("ALTER TABLE loans ENABLE TRIGGER USER")
+
+    def derive_state():
+        cur.execute(
+            """
+            INSERT INTO active_loans (book_id, loan_id)
+            SELECT book_id, loan_id FROM loans WHERE return_date IS NULL
+            ON CONFLICT (book_id) DO NOTHING
+            """
+        )
+        cur.execute(
+            """
+            UPDATE borrowers
+            SET total_loans = counts.total_loans, active_loans = counts.active_loans
+            FROM (
+                SELECT borrower_id, COUNT(*) AS total_loans, COUNT(*) FILTER (WHERE return_date IS NULL) AS active_loans
+                FROM loans
+                GROUP BY borrower_id
+            ) AS counts
+            WHERE counts.borrower_id = borrowers.borrower_id
+            """
+        )
+        return cur.rowcount
+
+    step("borrower counters", derive_state)
+
+    # Explicit IDs bypass the sequences, so move them past the generated rows
+    for table, column in (("authors", "author_id"), ("genres", "genre_id"), ("books", "book_id"), ("borrowers", "borrower_id"), ("loans", "loan_id")):
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT COALESCE(MAX({column}), 1) FROM {table}))")
+
+    # COPY into authors and genres fires the statement triggers, but make sure caches reload
+    cur.execute("SELECT pg_notify('library_lookups', 'authors'), pg_notify('library_lookups', 'genres')")
+    conn.commit()
+
+    cur.execute("ANALYZE authors, genres, books, borrowers, loans, active_loans")
+    cur.close()
+
+    return {"authors": authors, "genres": len(GENRES), "books": books, "borrowers": borrowers, "loans": loans}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--borrowers", type=int, default=20_000)
+    parser.add_argument("--loans", type=int, default=500_000)
+    parser.add_argument("--authors", type=int, help="number of authors (default: one per 25 books)")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of popularity (default: 1.0, 0 is uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="empty all library tables first")
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    conn.autocommit = False
+    try:
+        start = time.perf_counter()
+        generate(conn, args.books, args.borrowers, args.loans, args.authors, args.skew, args.seed, args.reset)
+        print(f"\nGenerated the library in {time.perf_counter() - start:.1f}s.\n")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+-- Trigram operator classes back the substring (ILIKE) searches on titles and names
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+
 CREATE TABLE authors (
     author_id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL
@@ -16,62 +20,373 @@ CREATE TABLE books (
     author_id INT REFERENCES authors(author_id) ON DELETE SET NULL,
     genre_id INT REFERENCES genres(genre_id) ON DELETE SET NULL,
     published_year INT NOT NULL,
-    is_available BOOLEAN DEFAULT TRUE
+    search_vector TSVECTOR
 );
 
 
 CREATE TABLE borrowers (
     borrower_id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
-    email VARCHAR(255) UNIQUE NOT NULL,
-    phone VARCHAR(20) NOT NULL
+    email VARCHAR(255) NOT NULL,
+    phone VARCHAR(20) NOT NULL,
+    total_loans INT NOT NULL DEFAULT 0,
+    active_loans INT NOT NULL DEFAULT 0
 );
 
 
+-- Loans are range-partitioned by loan_date, one partition per year (see create_loan_partitions),
+-- so queries bounded by date only read the years they need and old years can be detached whole.
+-- The primary key must include the partition key; loan_id alone stays unique through its sequence.
 CREATE TABLE loans (
-    loan_id SERIAL PRIMARY KEY,
+    loan_id SERIAL,
     book_id INT REFERENCES books(book_id) ON DELETE CASCADE,
     borrower_id INT REFERENCES borrowers(borrower_id) ON DELETE CASCADE,
     loan_date DATE NOT NULL DEFAULT CURRENT_DATE,
     return_date DATE,
-    CHECK (return_date IS NULL OR loan_date <= return_date)
+    CHECK (return_date IS NULL OR loan_date <= return_date),
+    PRIMARY KEY (loan_id, loan_date)
+) PARTITION BY RANGE (loan_date);
+
+-- Takes loans dated outside every yearly partition until create_loan_partitions moves them out
+CREATE TABLE loans_default PARTITION OF loans DEFAULT;
+
+-- The active loan of every lent book. A unique index on loans can only span partitions if it
+-- includes loan_date, so one active loan per book is enforced by this table's primary key instead.
+CREATE TABLE active_loans (
+    book_id INT PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+    loan_id INT NOT NULL
+);
+
+-- Returned loans moved out of loans by python -m app.archive. Archived loans are never active
+-- and still count towards the borrowers' total_loans.
+CREATE TABLE loans_archive (
+    loan_id INT PRIMARY KEY,
+    book_id INT REFERENCES books(book_id) ON DELETE CASCADE,
+    borrower_id INT REFERENCES borrowers(borrower_id) ON DELETE CASCADE,
+    loan_date DATE NOT NULL,
+    return_date DATE NOT NULL,
+    CHECK (loan_date <= return_date)
 );
 
 
-CREATE OR REPLACE FUNCTION update_book_availability()
+-- Create the yearly loan partitions covering first_date .. last_date that do not exist yet, and
+-- return how many were created. Loans of those years held by the default partition are moved
+-- into the new partition with the loan triggers muted, as they are neither new nor removed.
+CREATE OR REPLACE FUNCTION create_loan_partitions(first_date DATE, last_date DATE)
+RETURNS INT AS $$
+DECLARE
+    year INT;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    FOR year IN EXTRACT(YEAR FROM first_date)::INT .. EXTRACT(YEAR FROM last_date)::INT LOOP
+        partition_name := format('loans_%s', year);
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        EXECUTE format('CREATE TABLE %I (LIKE loans INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+
+        PERFORM set_config('library.moving_loans', 'on', TRUE);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM loans_default WHERE loan_date >= %L AND loan_date < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+            make_date(year, 1, 1), make_date(year + 1, 1, 1), partition_name
+        );
+        PERFORM set_config('library.moving_loans', 'off', TRUE);
+
+        EXECUTE format(
+            'ALTER TABLE loans ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, make_date(year, 1, 1), make_date(year + 1, 1, 1)
+        );
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Keep active_loans in step with the loans table. A loan that makes a second active loan of its
+-- book is rejected; a borrow that already claimed the book for this loan passes.
+CREATE OR REPLACE FUNCTION update_active_loans()
 RETURNS TRIGGER AS $$
 BEGIN
-    -- Update the availability status of the book associated with the loan
-    UPDATE books
-    SET is_available = FALSE
-    WHERE book_id = NEW.book_id;
+    IF current_setting('library.moving_loans', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        DELETE FROM active_loans WHERE book_id = OLD.book_id AND loan_id = OLD.loan_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+        INSERT INTO active_loans (book_id, loan_id) VALUES (NEW.book_id, NEW.loan_id)
+        ON CONFLICT (book_id) DO NOTHING;
+
+        IF NOT FOUND AND NOT EXISTS (SELECT 1 FROM active_loans WHERE book_id = NEW.book_id AND loan_id = NEW.loan_id) THEN
+            RAISE unique_violation USING
+                MESSAGE = format('Book %s already has an active loan', NEW.book_id),
+                CONSTRAINT = 'active_loans_pkey';
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER active_loan_trigger
+AFTER INSERT OR DELETE OR UPDATE OF book_id, return_date ON loans
+FOR EACH ROW
+EXECUTE FUNCTION update_active_loans();
+
+-- TRUNCATE skips row triggers, so empty active_loans with the loans table
+CREATE OR REPLACE FUNCTION reset_active_loans()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM active_loans;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER active_loan_truncate_trigger
+AFTER TRUNCATE ON loans
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_active_loans();
+
+-- Keep the per-borrower loan counters in step with the loans table: every loan counts towards
+-- total_loans, and loans without a return date also count towards active_loans
+CREATE OR REPLACE FUNCTION update_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Loans moved between partitions by create_loan_partitions, or into loans_archive, are already counted
+    IF current_setting('library.moving_loans', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.borrower_id IS NOT DISTINCT FROM NEW.borrower_id THEN
+        -- Returning a loan (or undoing a return) only moves the active count
+        UPDATE borrowers
+        SET active_loans = active_loans + (NEW.return_date IS NULL)::INT - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans - 1,
+            active_loans = active_loans - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = OLD.borrower_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans + 1,
+            active_loans = active_loans + (NEW.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_count_trigger
+AFTER INSERT OR DELETE ON loans
+FOR EACH ROW
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+CREATE TRIGGER loan_count_update_trigger
+AFTER UPDATE OF borrower_id, return_date ON loans
+FOR EACH ROW
+WHEN (OLD.borrower_id IS DISTINCT FROM NEW.borrower_id OR (OLD.return_date IS NULL) <> (NEW.return_date IS NULL))
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+-- Archived loans count towards total_loans until they are removed with their book or borrower
+CREATE TRIGGER loan_archive_count_trigger
+AFTER INSERT OR DELETE ON loans_archive
+FOR EACH ROW
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+-- TRUNCATE skips row triggers, so recount when loans or loans_archive is emptied. Counters can
+-- only drop, so borrowers already at zero are skipped; when both tables are emptied, as in a
+-- TRUNCATE ... CASCADE, the recount reads nothing.
+CREATE OR REPLACE FUNCTION reset_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE borrowers
+    SET (total_loans, active_loans) = (
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE return_date IS NULL)
+        FROM (
+            SELECT return_date FROM loans WHERE loans.borrower_id = borrowers.borrower_id
+            UNION ALL
+            SELECT return_date FROM loans_archive WHERE loans_archive.borrower_id = borrowers.borrower_id
+        ) AS loans
+    )
+    WHERE total_loans <> 0 OR active_loans <> 0;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_truncate_trigger
+AFTER TRUNCATE ON loans
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_borrower_loan_counts();
+
+CREATE TRIGGER loan_archive_truncate_trigger
+AFTER TRUNCATE ON loans_archive
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_borrower_loan_counts();
+
+
+-- Build the full-text document of a book: title, author name, genre name and publication year,
+-- weighted in that order
+CREATE OR REPLACE FUNCTION book_search_vector(book_title TEXT, book_author_id INT, book_genre_id INT, book_published_year INT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(book_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM authors WHERE author_id = book_author_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM genres WHERE genre_id = book_genre_id), '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(book_published_year::TEXT, '')), 'D');
+$$ LANGUAGE sql STABLE;
+
+-- Keep books.search_vector current whenever a book's title, author, genre or year changes
+CREATE OR REPLACE FUNCTION update_book_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := book_search_vector(NEW.title, NEW.author_id, NEW.genre_id, NEW.published_year);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Inserts that already carry a search_vector (bulk imports compute it set-wise) skip the lookup
+CREATE TRIGGER book_search_vector_insert_trigger
+BEFORE INSERT ON books
+FOR EACH ROW
+WHEN (NEW.search_vector IS NULL)
+EXECUTE FUNCTION update_book_search_vector();
+
+CREATE TRIGGER book_search_vector_update_trigger
+BEFORE UPDATE OF title, author_id, genre_id, published_year ON books
+FOR EACH ROW
+EXECUTE FUNCTION update_book_search_vector();
+
+-- Authors and genres renamed since the search documents of their books were last refreshed.
+-- A rename only queues its author or genre here and notifies book_search_refresh on commit;
+-- python -m app.search_refresh then rewrites the documents in batches of short transactions
+-- rather than all within the renaming one.
+CREATE TABLE book_search_refreshes (
+    author_id INT UNIQUE REFERENCES authors(author_id) ON DELETE CASCADE,
+    genre_id INT UNIQUE REFERENCES genres(genre_id) ON DELETE CASCADE,
+    queued_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+    CHECK ((author_id IS NULL) <> (genre_id IS NULL))
+);
+
+CREATE OR REPLACE FUNCTION queue_author_book_search_refresh()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO book_search_refreshes (author_id) VALUES (NEW.author_id)
+    ON CONFLICT (author_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    PERFORM pg_notify('book_search_refresh', '');
 
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
--- Create the trigger that calls the function after entering a loan
-CREATE TRIGGER loan_insert_trigger
-AFTER INSERT ON loans
+CREATE TRIGGER author_rename_trigger
+AFTER UPDATE OF name ON authors
 FOR EACH ROW
-EXECUTE FUNCTION update_book_availability();
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION queue_author_book_search_refresh();
 
--- Create the function to update the state of is_available to TRUE when the book is returned
-CREATE OR REPLACE FUNCTION update_book_availability_on_return()
+CREATE OR REPLACE FUNCTION queue_genre_book_search_refresh()
 RETURNS TRIGGER AS $$
 BEGIN
-    -- Update the availability status of the book associated with the loan
-    UPDATE books
-    SET is_available = TRUE
-    WHERE book_id = NEW.book_id;
+    INSERT INTO book_search_refreshes (genre_id) VALUES (NEW.genre_id)
+    ON CONFLICT (genre_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    PERFORM pg_notify('book_search_refresh', '');
 
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
--- Create the trigger that calls the function after updating return_date in loans
-CREATE TRIGGER loan_return_trigger
-AFTER UPDATE OF return_date ON loans
+CREATE TRIGGER genre_rename_trigger
+AFTER UPDATE OF name ON genres
 FOR EACH ROW
-WHEN (NEW.return_date IS NOT NULL)
-EXECUTE FUNCTION update_book_availability_on_return();
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION queue_genre_book_search_refresh();
+
+-- Tell in-process author and genre caches (app/lookups.py) that a lookup table changed
+CREATE OR REPLACE FUNCTION notify_lookup_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('library_lookups', TG_TABLE_NAME);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER authors_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON authors
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_lookup_change();
+
+CREATE TRIGGER genres_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON genres
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_lookup_change();
+
+
+-- Indexes serving search_books: full-text matches, substring and title prefix matches, and year lookups
+CREATE INDEX books_search_vector_idx ON books USING GIN (search_vector);
+CREATE INDEX books_title_trgm_idx ON books USING GIN (title gin_trgm_ops);
+CREATE INDEX authors_name_trgm_idx ON authors USING GIN (name gin_trgm_ops);
+CREATE INDEX genres_name_trgm_idx ON genres USING GIN (name gin_trgm_ops);
+CREATE INDEX books_title_prefix_idx ON books (LOWER(title) text_pattern_ops);
+CREATE INDEX books_published_year_idx ON books (published_year);
+CREATE INDEX books_author_id_idx ON books (author_id);
+CREATE INDEX books_genre_id_idx ON books (genre_id);
+
+-- Book listings and pages read every column they show from this index, not from the heap rows
+CREATE INDEX books_listing_idx ON books (book_id) INCLUDE (title, author_id, genre_id, published_year);
+
+-- Indexes for the hot loan and borrower queries (see db/migrations/002_hot_query_indexes.sql);
+-- indexes on loans are created on every partition
+CREATE INDEX loans_book_id_idx ON loans (book_id);
+CREATE INDEX loans_borrower_id_idx ON loans (borrower_id) INCLUDE (book_id);
+CREATE INDEX loans_active_borrower_idx ON loans (borrower_id) WHERE return_date IS NULL;
+CREATE INDEX loans_loan_date_loan_id_idx ON loans (loan_date, loan_id);
+CREATE INDEX borrowers_phone_idx ON borrowers (phone);
+
+-- Indexes behind the borrower search: emails are unique whatever their case (see
+-- db/migrations/011_borrower_email_unique_lower.sql), and names are matched by trigrams
+CREATE UNIQUE INDEX borrowers_email_lower_key ON borrowers (LOWER(email));
+CREATE INDEX borrowers_name_trgm_idx ON borrowers USING GIN (name gin_trgm_ops);
+
+-- Indexes for the loan queries that include archived loans (see db/migrations/007_loans_archive.sql)
+CREATE INDEX loans_archive_book_id_idx ON loans_archive (book_id);
+CREATE INDEX loans_archive_borrower_id_idx ON loans_archive (borrower_id);
+CREATE INDEX loans_archive_loan_date_loan_id_idx ON loans_archive (loan_date, loan_id);
+
+-- Partitions for this year and the next; python -m app.partitions create adds later ones
+SELECT create_loan_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '1 year')::DATE);
+
+
+-- Migrations already contained in this file; python -m app.migrations applies any newer ones
+CREATE TABLE schema_migrations (
+    version VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO schema_migrations (version, name) VALUES
+('001', 'catalog_search'),
+('002', 'hot_query_indexes'),
+('003', 'borrower_loan_counters'),
+('004', 'lookup_notifications'),
+('005', 'active_loan_per_book'),
+('006', 'partitioned_loans'),
+('007', 'loans_archive'),
+('008', 'title_prefix_index'),
+('009', 'book_search_refresh'),
+('010', 'borrower_lookup_indexes'),
+('011', 'borrower_email_unique_lower'),
+('012', 'book_search_year');
@@ -0,0 +1,88 @@
+-- Catalog search: trigram indexes, the books.search_vector document and its triggers,
+-- plus the indexes behind exact year, author and genre lookups.
+-- check: books_search_vector_idx | SELECT book_id FROM books WHERE search_vector @@ to_tsquery('simple', 'hobbit')
+-- check: books_title_trgm_idx | SELECT book_id FROM books WHERE title ILIKE '%hobbit%'
+-- check: books_published_year_idx | SELECT book_id FROM books WHERE published_year = 1937
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE OR REPLACE FUNCTION book_search_vector(book_title TEXT, book_author_id INT, book_genre_id INT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(book_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM authors WHERE author_id = book_author_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM genres WHERE genre_id = book_genre_id), '')), 'C');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION update_book_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := book_search_vector(NEW.title, NEW.author_id, NEW.genre_id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_search_vector_insert_trigger ON books;
+CREATE TRIGGER book_search_vector_insert_trigger
+BEFORE INSERT ON books
+FOR EACH ROW
+WHEN (NEW.search_vector IS NULL)
+EXECUTE FUNCTION update_book_search_vector();
+
+DROP TRIGGER IF EXISTS book_search_vector_update_trigger ON books;
+CREATE TRIGGER book_search_vector_update_trigger
+BEFORE UPDATE OF title, author_id, genre_id ON books
+FOR EACH ROW
+EXECUTE FUNCTION update_book_search_vector();
+
+CREATE OR REPLACE FUNCTION refresh_author_book_search_vectors()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE books
+    SET search_vector = book_search_vector(title, author_id, genre_id)
+    WHERE author_id = NEW.author_id;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS author_rename_trigger ON authors;
+CREATE TRIGGER author_rename_trigger
+AFTER UPDATE OF name ON authors
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION refresh_author_book_search_vectors();
+
+CREATE OR REPLACE FUNCTION refresh_genre_book_search_vectors()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE books
+    SET search_vector = book_search_vector(title, author_id, genre_id)
+    WHERE genre_id = NEW.genre_id;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS genre_rename_trigger ON genres;
+CREATE TRIGGER genre_rename_trigger
+AFTER UPDATE OF name ON genres
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION refresh_genre_book_search_vectors();
+
+CREATE INDEX IF NOT EXISTS books_search_vector_idx ON books USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS books_title_trgm_idx ON books USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS authors_name_trgm_idx ON authors USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS genres_name_trgm_idx ON genres USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS books_published_year_idx ON books (published_year);
+CREATE INDEX IF NOT EXISTS books_author_id_idx ON books (author_id);
+CREATE INDEX IF NOT EXISTS books_genre_id_idx ON books (genre_id);
+
+-- Backfill the documents of books that existed before this migration. This runs after the
+-- indexes are built: an index created over freshly updated rows would not be usable until
+-- the next transaction, and the EXPLAIN checks run inside this one.
+UPDATE books
+SET search_vector = book_search_vector(title, author_id, genre_id)
+WHERE search_vector IS NULL;
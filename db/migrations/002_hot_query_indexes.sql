@@ -0,0 +1,21 @@
+-- Indexes for the hot loan and borrower queries, which had nothing but primary keys to use.
+-- check: loans_book_id_idx | SELECT loan_id FROM loans WHERE book_id = 1
+-- check: loans_borrower_id_idx | SELECT COUNT(book_id) FROM loans WHERE borrower_id = 1
+-- check: loans_active_borrower_idx | SELECT COUNT(*) FROM loans WHERE borrower_id = 1 AND return_date IS NULL
+-- check: loans_loan_date_loan_id_idx | SELECT loan_id FROM loans ORDER BY loan_date DESC, loan_id DESC LIMIT 20
+-- check: borrowers_phone_idx | SELECT borrower_id FROM borrowers WHERE email = 'a@b.c' OR phone = '5551234'
+
+-- Joins from loans to books, and the ON DELETE CASCADE from books
+CREATE INDEX IF NOT EXISTS loans_book_id_idx ON loans (book_id);
+
+-- Joins from loans to borrowers; book_id is included so COUNT(loans.book_id) per borrower is index-only
+CREATE INDEX IF NOT EXISTS loans_borrower_id_idx ON loans (borrower_id) INCLUDE (book_id);
+
+-- Active loans of a borrower (remove_borrower_by_id); only unreturned loans are indexed
+CREATE INDEX IF NOT EXISTS loans_active_borrower_idx ON loans (borrower_id) WHERE return_date IS NULL;
+
+-- Loan history order in view_loans and its keyset pagination
+CREATE INDEX IF NOT EXISTS loans_loan_date_loan_id_idx ON loans (loan_date, loan_id);
+
+-- Duplicate phone check in add_borrower (email is already covered by its unique constraint)
+CREATE INDEX IF NOT EXISTS borrowers_phone_idx ON borrowers (phone);
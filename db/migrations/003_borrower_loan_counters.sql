@@ -0,0 +1,80 @@
+-- Denormalized per-borrower loan counters maintained by triggers, so the borrower views no
+-- longer aggregate the whole loan history on every call.
+
+ALTER TABLE borrowers ADD COLUMN IF NOT EXISTS total_loans INT NOT NULL DEFAULT 0;
+ALTER TABLE borrowers ADD COLUMN IF NOT EXISTS active_loans INT NOT NULL DEFAULT 0;
+
+-- Keep the per-borrower loan counters in step with the loans table: every loan counts towards
+-- total_loans, and loans without a return date also count towards active_loans
+CREATE OR REPLACE FUNCTION update_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.borrower_id IS NOT DISTINCT FROM NEW.borrower_id THEN
+        -- Returning a loan (or undoing a return) only moves the active count
+        UPDATE borrowers
+        SET active_loans = active_loans + (NEW.return_date IS NULL)::INT - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans - 1,
+            active_loans = active_loans - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = OLD.borrower_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans + 1,
+            active_loans = active_loans + (NEW.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS loan_count_trigger ON loans;
+CREATE TRIGGER loan_count_trigger
+AFTER INSERT OR DELETE ON loans
+FOR EACH ROW
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+DROP TRIGGER IF EXISTS loan_count_update_trigger ON loans;
+CREATE TRIGGER loan_count_update_trigger
+AFTER UPDATE OF borrower_id, return_date ON loans
+FOR EACH ROW
+WHEN (OLD.borrower_id IS DISTINCT FROM NEW.borrower_id OR (OLD.return_date IS NULL) <> (NEW.return_date IS NULL))
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+-- TRUNCATE skips row triggers, so reset the counters when the loans table is emptied
+CREATE OR REPLACE FUNCTION reset_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE borrowers
+    SET total_loans = 0, active_loans = 0
+    WHERE total_loans <> 0 OR active_loans <> 0;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS loan_truncate_trigger ON loans;
+CREATE TRIGGER loan_truncate_trigger
+AFTER TRUNCATE ON loans
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_borrower_loan_counts();
+
+-- Backfill the counters from the existing loans; the lock keeps loans from changing meanwhile
+LOCK TABLE loans IN SHARE MODE;
+
+UPDATE borrowers
+SET total_loans = counts.total_loans, active_loans = counts.active_loans
+FROM (
+    SELECT borrower_id, COUNT(*) AS total_loans, COUNT(*) FILTER (WHERE return_date IS NULL) AS active_loans
+    FROM loans
+    GROUP BY borrower_id
+) AS counts
+WHERE borrowers.borrower_id = counts.borrower_id;
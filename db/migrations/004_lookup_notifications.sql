@@ -0,0 +1,22 @@
+-- Change notifications for the authors and genres lookup tables, so that processes caching
+-- them (app/lookups.py) reload a table only after it has actually changed.
+CREATE OR REPLACE FUNCTION notify_lookup_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('library_lookups', TG_TABLE_NAME);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS authors_notify_trigger ON authors;
+CREATE TRIGGER authors_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON authors
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_lookup_change();
+
+DROP TRIGGER IF EXISTS genres_notify_trigger ON genres;
+CREATE TRIGGER genres_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON genres
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_lookup_change();
@@ -0,0 +1,29 @@
+-- At most one active loan (no return date) per book, enforced by a partial unique index instead
+-- of the books.is_available flag, which two triggers kept in step with the loans table.
+-- check: loans_active_book_idx | SELECT loan_id FROM loans WHERE book_id = 1 AND return_date IS NULL
+
+-- Availability is now derived from the loans themselves
+DROP TRIGGER IF EXISTS loan_insert_trigger ON loans;
+DROP TRIGGER IF EXISTS loan_return_trigger ON loans;
+DROP FUNCTION IF EXISTS update_book_availability();
+DROP FUNCTION IF EXISTS update_book_availability_on_return();
+
+-- Reconcile books lent out more than once at a time: the latest loan stays active, and every
+-- earlier one is closed on the date the book was lent again. The lock keeps loans from changing
+-- meanwhile; loan_count_update_trigger corrects the borrowers' active counts.
+LOCK TABLE loans IN SHARE ROW EXCLUSIVE MODE;
+
+UPDATE loans
+SET return_date = superseded.next_loan_date
+FROM (
+    SELECT loan_id, LEAD(loan_date) OVER (PARTITION BY book_id ORDER BY loan_date, loan_id) AS next_loan_date
+    FROM loans
+    WHERE return_date IS NULL
+) AS superseded
+WHERE loans.loan_id = superseded.loan_id AND superseded.next_loan_date IS NOT NULL;
+
+-- Borrowing inserts against this index (INSERT ... ON CONFLICT DO NOTHING), and availability checks probe it
+CREATE UNIQUE INDEX IF NOT EXISTS loans_active_book_idx ON loans (book_id) WHERE return_date IS NULL;
+
+-- A flag that disagreed with the loans no longer matters once it is gone
+ALTER TABLE books DROP COLUMN IF EXISTS is_available;
@@ -0,0 +1,209 @@
+-- Range-partition loans by loan_date, one partition per year, and move the one-active-loan-per-book
+-- guarantee from the partial unique index of 005 to the active_loans table.
+
+-- The old table is renamed and stripped of the names the partitioned table takes over; the lock
+-- keeps loans from changing until the copy is complete
+LOCK TABLE loans IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE loans RENAME TO loans_unpartitioned;
+ALTER TABLE loans_unpartitioned DROP CONSTRAINT loans_pkey;
+ALTER TABLE loans_unpartitioned DROP CONSTRAINT loans_book_id_fkey;
+ALTER TABLE loans_unpartitioned DROP CONSTRAINT loans_borrower_id_fkey;
+ALTER TABLE loans_unpartitioned DROP CONSTRAINT loans_check;
+DROP INDEX loans_book_id_idx, loans_borrower_id_idx, loans_active_borrower_idx, loans_loan_date_loan_id_idx, loans_active_book_idx;
+ALTER TABLE loans_unpartitioned ALTER COLUMN loan_id DROP DEFAULT;
+ALTER SEQUENCE loans_loan_id_seq OWNED BY NONE;
+
+CREATE TABLE loans (
+    loan_id INT NOT NULL DEFAULT nextval('loans_loan_id_seq'),
+    book_id INT REFERENCES books(book_id) ON DELETE CASCADE,
+    borrower_id INT REFERENCES borrowers(borrower_id) ON DELETE CASCADE,
+    loan_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    return_date DATE,
+    CHECK (return_date IS NULL OR loan_date <= return_date),
+    PRIMARY KEY (loan_id, loan_date)
+) PARTITION BY RANGE (loan_date);
+
+-- Takes loans dated outside every yearly partition until create_loan_partitions moves them out
+CREATE TABLE loans_default PARTITION OF loans DEFAULT;
+
+-- The active loan of every lent book. A unique index on loans can only span partitions if it
+-- includes loan_date, so one active loan per book is enforced by this table's primary key instead.
+CREATE TABLE IF NOT EXISTS active_loans (
+    book_id INT PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+    loan_id INT NOT NULL
+);
+
+
+-- Create the yearly loan partitions covering first_date .. last_date that do not exist yet, and
+-- return how many were created. Loans of those years held by the default partition are moved
+-- into the new partition with the loan triggers muted, as they are neither new nor removed.
+CREATE OR REPLACE FUNCTION create_loan_partitions(first_date DATE, last_date DATE)
+RETURNS INT AS $$
+DECLARE
+    year INT;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    FOR year IN EXTRACT(YEAR FROM first_date)::INT .. EXTRACT(YEAR FROM last_date)::INT LOOP
+        partition_name := format('loans_%s', year);
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        EXECUTE format('CREATE TABLE %I (LIKE loans INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+
+        PERFORM set_config('library.moving_loans', 'on', TRUE);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM loans_default WHERE loan_date >= %L AND loan_date < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+            make_date(year, 1, 1), make_date(year + 1, 1, 1), partition_name
+        );
+        PERFORM set_config('library.moving_loans', 'off', TRUE);
+
+        EXECUTE format(
+            'ALTER TABLE loans ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, make_date(year, 1, 1), make_date(year + 1, 1, 1)
+        );
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Keep active_loans in step with the loans table. A loan that makes a second active loan of its
+-- book is rejected; a borrow that already claimed the book for this loan passes.
+CREATE OR REPLACE FUNCTION update_active_loans()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('library.moving_loans', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+        DELETE FROM active_loans WHERE book_id = OLD.book_id AND loan_id = OLD.loan_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+        INSERT INTO active_loans (book_id, loan_id) VALUES (NEW.book_id, NEW.loan_id)
+        ON CONFLICT (book_id) DO NOTHING;
+
+        IF NOT FOUND AND NOT EXISTS (SELECT 1 FROM active_loans WHERE book_id = NEW.book_id AND loan_id = NEW.loan_id) THEN
+            RAISE unique_violation USING
+                MESSAGE = format('Book %s already has an active loan', NEW.book_id),
+                CONSTRAINT = 'active_loans_pkey';
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER active_loan_trigger
+AFTER INSERT OR DELETE OR UPDATE OF book_id, return_date ON loans
+FOR EACH ROW
+EXECUTE FUNCTION update_active_loans();
+
+-- TRUNCATE skips row triggers, so empty active_loans with the loans table
+CREATE OR REPLACE FUNCTION reset_active_loans()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM active_loans;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER active_loan_truncate_trigger
+AFTER TRUNCATE ON loans
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_active_loans();
+
+ALTER SEQUENCE loans_loan_id_seq OWNED BY loans.loan_id;
+
+-- Keep the per-borrower loan counters in step with the loans table: every loan counts towards
+-- total_loans, and loans without a return date also count towards active_loans
+CREATE OR REPLACE FUNCTION update_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Loans moved between partitions by create_loan_partitions are already counted
+    IF current_setting('library.moving_loans', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.borrower_id IS NOT DISTINCT FROM NEW.borrower_id THEN
+        -- Returning a loan (or undoing a return) only moves the active count
+        UPDATE borrowers
+        SET active_loans = active_loans + (NEW.return_date IS NULL)::INT - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans - 1,
+            active_loans = active_loans - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = OLD.borrower_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans + 1,
+            active_loans = active_loans + (NEW.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_count_trigger
+AFTER INSERT OR DELETE ON loans
+FOR EACH ROW
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+CREATE TRIGGER loan_count_update_trigger
+AFTER UPDATE OF borrower_id, return_date ON loans
+FOR EACH ROW
+WHEN (OLD.borrower_id IS DISTINCT FROM NEW.borrower_id OR (OLD.return_date IS NULL) <> (NEW.return_date IS NULL))
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+-- TRUNCATE skips row triggers, so reset the counters when the loans table is emptied
+CREATE OR REPLACE FUNCTION reset_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE borrowers
+    SET total_loans = 0, active_loans = 0
+    WHERE total_loans <> 0 OR active_loans <> 0;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_truncate_trigger
+AFTER TRUNCATE ON loans
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_borrower_loan_counts();
+
+
+-- Partitions for every year with loans through next year, then the loans themselves. The triggers
+-- are muted while copying: the borrower counters already include these loans.
+SELECT create_loan_partitions(
+    COALESCE((SELECT MIN(loan_date) FROM loans_unpartitioned), CURRENT_DATE),
+    GREATEST((SELECT MAX(loan_date) FROM loans_unpartitioned), (CURRENT_DATE + INTERVAL '1 year')::DATE)
+);
+
+SET LOCAL library.moving_loans = 'on';
+INSERT INTO loans (loan_id, book_id, borrower_id, loan_date, return_date)
+SELECT loan_id, book_id, borrower_id, loan_date, return_date FROM loans_unpartitioned;
+SET LOCAL library.moving_loans = 'off';
+
+-- loans_active_book_idx guaranteed a single active loan per book up to now
+INSERT INTO active_loans (book_id, loan_id)
+SELECT book_id, loan_id FROM loans WHERE return_date IS NULL;
+
+DROP TABLE loans_unpartitioned;
+
+CREATE INDEX loans_book_id_idx ON loans (book_id);
+CREATE INDEX loans_borrower_id_idx ON loans (borrower_id) INCLUDE (book_id);
+CREATE INDEX loans_active_borrower_idx ON loans (borrower_id) WHERE return_date IS NULL;
+CREATE INDEX loans_loan_date_loan_id_idx ON loans (loan_date, loan_id);
@@ -0,0 +1,85 @@
+-- Add loans_archive, the cold storage for long-returned loans that python -m app.archive moves
+-- out of loans in batches.
+-- check: loans_archive_loan_date_loan_id_idx | SELECT loan_id FROM loans_archive ORDER BY loan_date DESC, loan_id DESC LIMIT 20
+
+CREATE TABLE loans_archive (
+    loan_id INT PRIMARY KEY,
+    book_id INT REFERENCES books(book_id) ON DELETE CASCADE,
+    borrower_id INT REFERENCES borrowers(borrower_id) ON DELETE CASCADE,
+    loan_date DATE NOT NULL,
+    return_date DATE NOT NULL,
+    CHECK (loan_date <= return_date)
+);
+
+-- Joins to books and borrowers, and the ON DELETE CASCADE from both
+CREATE INDEX loans_archive_book_id_idx ON loans_archive (book_id);
+CREATE INDEX loans_archive_borrower_id_idx ON loans_archive (borrower_id);
+
+-- Loan history order when archived loans are included
+CREATE INDEX loans_archive_loan_date_loan_id_idx ON loans_archive (loan_date, loan_id);
+
+-- Archived loans keep counting towards total_loans; the archive job mutes the counter triggers
+-- with library.moving_loans while it moves them
+CREATE OR REPLACE FUNCTION update_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Loans moved between partitions by create_loan_partitions, or into loans_archive, are already counted
+    IF current_setting('library.moving_loans', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.borrower_id IS NOT DISTINCT FROM NEW.borrower_id THEN
+        -- Returning a loan (or undoing a return) only moves the active count
+        UPDATE borrowers
+        SET active_loans = active_loans + (NEW.return_date IS NULL)::INT - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans - 1,
+            active_loans = active_loans - (OLD.return_date IS NULL)::INT
+        WHERE borrower_id = OLD.borrower_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE borrowers
+        SET total_loans = total_loans + 1,
+            active_loans = active_loans + (NEW.return_date IS NULL)::INT
+        WHERE borrower_id = NEW.borrower_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_archive_count_trigger
+AFTER INSERT OR DELETE ON loans_archive
+FOR EACH ROW
+EXECUTE FUNCTION update_borrower_loan_counts();
+
+-- Emptying loans no longer means every counter is zero, as archived loans remain
+CREATE OR REPLACE FUNCTION reset_borrower_loan_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE borrowers
+    SET (total_loans, active_loans) = (
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE return_date IS NULL)
+        FROM (
+            SELECT return_date FROM loans WHERE loans.borrower_id = borrowers.borrower_id
+            UNION ALL
+            SELECT return_date FROM loans_archive WHERE loans_archive.borrower_id = borrowers.borrower_id
+        ) AS loans
+    )
+    WHERE total_loans <> 0 OR active_loans <> 0;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER loan_archive_truncate_trigger
+AFTER TRUNCATE ON loans_archive
+FOR EACH STATEMENT
+EXECUTE FUNCTION reset_borrower_loan_counts();
@@ -0,0 +1,5 @@
+-- Index for the title:PREFIX filter of the book search. It matches case-insensitive prefixes with
+-- a btree range scan, whatever the collation, and does not depend on pg_trgm.
+-- check: books_title_prefix_idx | SELECT book_id FROM books WHERE LOWER(title) LIKE 'hob%'
+
+CREATE INDEX IF NOT EXISTS books_title_prefix_idx ON books (LOWER(title) text_pattern_ops);
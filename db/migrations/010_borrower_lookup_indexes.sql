@@ -0,0 +1,8 @@
+-- Indexes behind the borrower search: exact email lookups whatever the case (the unique
+-- constraint on email is case-sensitive), and trigram matching of names. Phone numbers are
+-- looked up through borrowers_phone_idx from 002.
+-- check: borrowers_email_lower_idx | SELECT borrower_id FROM borrowers WHERE LOWER(email) = 'john.doe@mail.com'
+-- check: borrowers_name_trgm_idx | SELECT borrower_id FROM borrowers WHERE name ILIKE '%doe%'
+
+CREATE INDEX IF NOT EXISTS borrowers_email_lower_idx ON borrowers (LOWER(email));
+CREATE INDEX IF NOT EXISTS borrowers_name_trgm_idx ON borrowers USING GIN (name gin_trgm_ops);
@@ -0,0 +1,38 @@
+-- Emails are unique whatever their case, so a lookup by email finds at most one borrower. The
+-- services store emails in lower case and phone numbers as digits only; existing rows are
+-- normalized the same way, and the case-sensitive unique constraint this index supersedes is
+-- dropped with the plain index from 010.
+-- Borrowers whose emails only differ in case (or surrounding spaces) cannot be normalized
+-- automatically: the migration stops and lists them, to be merged or changed by hand first.
+-- 002's phone check ORed in an email lookup that relied on the dropped constraint, so it is
+-- restated here for the phone alone.
+-- check: borrowers_email_lower_key | SELECT borrower_id FROM borrowers WHERE LOWER(email) = 'john.doe@mail.com'
+-- recheck: borrowers_phone_idx | SELECT borrower_id FROM borrowers WHERE phone = '5551234'
+
+DO $$
+DECLARE
+    clashes TEXT;
+BEGIN
+    SELECT string_agg(format('%s (borrower IDs %s)', email, borrower_ids), '; ' ORDER BY email)
+    INTO clashes
+    FROM (
+        SELECT LOWER(TRIM(email)) AS email, string_agg(borrower_id::TEXT, ', ' ORDER BY borrower_id) AS borrower_ids
+        FROM borrowers
+        GROUP BY LOWER(TRIM(email))
+        HAVING COUNT(*) > 1
+    ) AS clashing;
+
+    IF clashes IS NOT NULL THEN
+        RAISE EXCEPTION 'Borrowers share an email whatever its case; merge or change them before upgrading: %', clashes;
+    END IF;
+END;
+$$;
+
+ALTER TABLE borrowers DROP CONSTRAINT IF EXISTS borrowers_email_key;
+
+UPDATE borrowers
+SET email = LOWER(TRIM(email)), phone = regexp_replace(phone, '\D', '', 'g')
+WHERE email <> LOWER(TRIM(email)) OR phone ~ '\D';
+
+CREATE UNIQUE INDEX IF NOT EXISTS borrowers_email_lower_key ON borrowers (LOWER(email));
+DROP INDEX IF EXISTS borrowers_email_lower_idx;
@@ -0,0 +1,52 @@
+-- Add the publication year to the books' search documents, so that a keyword like 1954 finds the
+-- books of that year (ranked below title, author and genre matches), and notify the search
+-- refresh worker (python -m app.search_refresh --watch) of every queued rename on commit.
+-- Only the functions and triggers change here, so books keep their current documents until
+-- they are rewritten in batches of short transactions afterwards:
+--     python -m app.search_refresh --all
+
+CREATE OR REPLACE FUNCTION book_search_vector(book_title TEXT, book_author_id INT, book_genre_id INT, book_published_year INT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(book_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM authors WHERE author_id = book_author_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM genres WHERE genre_id = book_genre_id), '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(book_published_year::TEXT, '')), 'D');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION update_book_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := book_search_vector(NEW.title, NEW.author_id, NEW.genre_id, NEW.published_year);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS book_search_vector(TEXT, INT, INT);
+
+DROP TRIGGER IF EXISTS book_search_vector_update_trigger ON books;
+CREATE TRIGGER book_search_vector_update_trigger
+BEFORE UPDATE OF title, author_id, genre_id, published_year ON books
+FOR EACH ROW
+EXECUTE FUNCTION update_book_search_vector();
+
+CREATE OR REPLACE FUNCTION queue_author_book_search_refresh()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO book_search_refreshes (author_id) VALUES (NEW.author_id)
+    ON CONFLICT (author_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    PERFORM pg_notify('book_search_refresh', '');
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION queue_genre_book_search_refresh()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO book_search_refreshes (genre_id) VALUES (NEW.genre_id)
+    ON CONFLICT (genre_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+    PERFORM pg_notify('book_search_refresh', '');
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,120 @@
+import datetime
+import pytest
+from app import cli
+from app.archive import archive_batches, archive_loans, main
+from app.db_connection import connect_to_db
+from app.services import check_loan_counts, delete_book, find_loans, get_loan, iter_loans, loans_page
+
+TODAY = datetime.date.today()
+LONG_AGO = TODAY - datetime.timedelta(days=800)
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    conn.rollback()
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Fixture with three loans returned long ago, one returned yesterday and one still active
+@pytest.fixture(scope="function")
+def loan_history(db_connection):
+    cur = db_connection.cursor()
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Old Book', 1, 1, 2000), ('New Book', 1, 1, 2000)")
+    cur.execute(
+        """
+        INSERT INTO loans (book_id, borrower_id, loan_date, return_date) VALUES
+        (1, 1, %(long_ago)s, %(long_ago)s + 10),
+        (1, 1, %(long_ago)s + 20, %(long_ago)s + 30),
+        (1, 1, %(long_ago)s + 40, %(long_ago)s + 50),
+        (2, 1, %(today)s - 5, %(today)s - 1),
+        (2, 1, %(today)s, NULL)
+        """,
+        {"long_ago": LONG_AGO, "today": TODAY},
+    )
+    db_connection.commit()
+
+    yield cur
+
+    cur.close()
+
+
+# Test that only long-returned loans are archived, batch by batch, and that the counters still include them
+def test_archive_loans(db_connection, loan_history):
+    cur = loan_history
+
+    assert list(archive_batches(days=365, batch_size=2)) == [2, 1], "Loans were not archived in batches"
+    assert archive_loans(days=365) == 0, "A second run archived loans again"
+
+    cur.execute("SELECT loan_id FROM loans ORDER BY loan_id")
+    assert cur.fetchall() == [(4,), (5,)], "Recent and active loans should stay in loans"
+    cur.execute("SELECT loan_id FROM loans_archive ORDER BY loan_id")
+    assert cur.fetchall() == [(1,), (2,), (3,)], "Long-returned loans were not archived"
+    cur.execute("SELECT total_loans, active_loans FROM borrowers")
+    assert cur.fetchone() == (5, 1), "Archiving changed the borrower counters"
+    assert check_loan_counts() == [], "Counters drifted from loans and loans_archive"
+
+
+# Test that archived loans are listed, paged, searched and found only when asked for
+def test_include_archived(db_connection, loan_history):
+    archive_loans(days=365)
+
+    assert [loan.loan_id for loans in iter_loans() for loan in loans] == [5, 4], "Archived loans were listed"
+    assert [loan.loan_id for loans in iter_loans(include_archived=True) for loan in loans] == [5, 4, 3, 2, 1]
+
+    assert [loan.loan_id for loan in loans_page(start=4, page_size=2)] == [4], "Archived loans were paged through"
+    assert [loan.loan_id for loan in loans_page(start=4, page_size=2, include_archived=True)] == [4, 3]
+    assert [loan.loan_id for loan in loans_page(start=2, page_size=2, include_archived=True)] == [2, 1], "Paging did not start at an archived loan"
+
+    assert [loan.loan_id for loans in find_loans("Old") for loan in loans] == [], "Archived loans were searched"
+    assert sorted(loan.loan_id for loans in find_loans("Old", include_archived=True) for loan in loans) == [1, 2, 3]
+
+    assert get_loan(1) is None, "An archived loan was found without asking"
+    assert get_loan(1, include_archived=True).title == "Old Book"
+
+
+# Test that removing a book or emptying loans keeps the counters in step with the archive
+def test_archive_counters(db_connection, loan_history):
+    cur = loan_history
+    archive_loans(days=365)
+
+    cur.execute("TRUNCATE TABLE loans")
+    db_connection.commit()
+    cur.execute("SELECT total_loans, active_loans FROM borrowers")
+    assert cur.fetchone() == (3, 0), "Emptying loans dropped the archived loans from the counters"
+
+    assert delete_book(1)
+    cur.execute("SELECT COUNT(*) FROM loans_archive")
+    assert cur.fetchone()[0] == 0, "The archived loans of a removed book were kept"
+    cur.execute("SELECT total_loans, active_loans FROM borrowers")
+    assert cur.fetchone() == (0, 0), "Removing a book did not drop its archived loans from the counters"
+
+
+# Test the archive command line, and the --archived flag of the loan commands
+def test_main(db_connection, loan_history, capsys):
+    assert main(["--days", "365"]) == 0
+    assert "Archived 3 loan(s) returned more than 365 day(s) ago." in capsys.readouterr().out, "The archived total was not reported"
+
+    cli.main(["loans", "search", "Old", "--format", "csv"])
+    assert capsys.readouterr().out.count("Old Book") == 0, "Archived loans were searched without --archived"
+    cli.main(["loans", "search", "Old", "--format", "csv", "--archived"])
+    assert capsys.readouterr().out.count("Old Book") == 3, "--archived did not search the archived loans"
@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+import threading
+from app import async_services, lookups
+from app.async_services import (
+    close_loan,
+    close_loans,
+    create_book,
+    create_borrower,
+    create_loan,
+    delete_borrower,
+    find_books,
+    get_book,
+    update_loan_return_date,
+)
+from app.db_connection import connect_to_db
+from app.services import BORROW_BOOK_UNAVAILABLE, BORROW_OK, ConflictError
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+def run(coroutine):
+    # Run a coroutine in a fresh event loop, closing the asyncpg pool bound to it afterwards
+    async def scenario():
+        try:
+            return await coroutine
+        finally:
+            await async_services.close_pool()
+
+    return asyncio.run(scenario())
+
+
+# Test that psycopg2 placeholders are rewritten as numbered asyncpg parameters
+def test_numbered_placeholders():
+    assert async_services._numbered("SELECT %s, %s") == ("SELECT $1, $2", (None, None))
+    assert async_services._numbered("WHERE a = %(x)s OR b = %(y)s OR c = %(x)s") == ("WHERE a = $1 OR b = $2 OR c = $1", ("x", "y"))
+
+
+# Test that concurrent borrows of one book in one event loop lend it exactly once
+def test_async_concurrent_borrows(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Contested Book', 1, 1, 2000)")
+    for index in range(10):
+        cur.execute("INSERT INTO borrowers (name, email, phone) VALUES (%s, %s, %s)", (f"Reader {index}", f"reader{index}@example.com", str(index)))
+    conn.commit()
+
+    async def scenario():
+        return await asyncio.gather(*(create_loan(1, borrower_id) for borrower_id in range(1, 11)))
+
+    statuses = [status for status, _ in run(scenario())]
+    assert statuses.count(BORROW_OK) == 1, "The book was lent more than once"
+    assert statuses.count(BORROW_BOOK_UNAVAILABLE) == 9
+
+    cur.execute("SELECT COUNT(*) FROM loans")
+    assert cur.fetchone()[0] == 1, "Expected exactly one loan"
+
+
+# Test a borrow, search and return cycle through the async API
+def test_async_circulation(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Async Adventures', 1, 1, 2000)")
+    conn.commit()
+
+    async def scenario():
+        borrower = await create_borrower("Async Reader", "async@example.com", "555")
+        status, loan = await create_loan(1, borrower.borrower_id)
+        found = [book async for books in find_books("adventures") for book in books]
+        lent = await get_book(1)
+        returned = await close_loan(loan.loan_id)
+        again = await close_loan(loan.loan_id)
+        bulk = await close_loans([loan.loan_id, 999])
+        modified = await update_loan_return_date(loan.loan_id, returned.return_date.isoformat())
+        return status, found, lent, returned, again, bulk, modified, await get_book(1)
+
+    status, found, lent, returned, again, bulk, modified, book = run(scenario())
+
+    assert status == BORROW_OK
+    assert [book.title for book in found] == ["Async Adventures"], "Search did not find the book"
+    assert found[0].author == "Sample Author", "Author name was not resolved"
+    assert not lent.is_available, "Borrowed book should be unavailable"
+    assert returned.title == "Async Adventures" and returned.borrower == "Async Reader"
+    assert again is None, "A returned loan was closed twice"
+    assert bulk == ([], [returned.loan_id, 999]), "A bulk return closed a returned loan"
+    assert modified.return_date == returned.return_date
+    assert book.is_available, "Returned book should be available"
+
+
+# Test that the async API raises the same errors as the synchronous services
+def test_async_conflicts(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Kept Book', 1, 1, 2000)")
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Keeper', 'keeper@example.com', '123')")
+    conn.commit()
+
+    async def scenario():
+        await create_loan(1, 1)
+        with pytest.raises(ConflictError):
+            await create_borrower("Copy", "keeper@example.com", "999")
+        copy = await create_borrower("Copy", "copy@example.com", "999")
+        with pytest.raises(ConflictError):
+            await async_services.update_borrower(copy.borrower_id, "Copy", "keeper@example.com", "999")
+        with pytest.raises(ConflictError):
+            await delete_borrower(1)
+
+    run(scenario())
+
+    cur.execute("SELECT COUNT(*) FROM borrowers")
+    assert cur.fetchone()[0] == 2, "Borrower with an active loan was removed"
+
+
+# Test that the lookup cache is reloaded in a worker thread, not on the event loop
+def test_async_lookups_off_loop(db_connection, monkeypatch):
+    loads = []
+    load = lookups._cache._load
+    monkeypatch.setattr(lookups._cache, "_load", lambda conn=None: loads.append(threading.current_thread()) or load(conn))
+    lookups._cache.invalidate()
+
+    async def scenario():
+        book = await create_book("Threaded Book", 1, 1, 2000)
+        assert book.author == "Sample Author"
+        assert (await get_book(book.book_id)).genre == "Sample Genre"
+
+    run(scenario())
+
+    assert loads and threading.main_thread() not in loads, "The lookup cache was loaded on the event loop"
@@ -1,7 +1,9 @@
+import json
 import pytest
 from unittest.mock import patch
 from app.db_connection import connect_to_db
-from app.books import add_book, list_books, remove_book, modify_book, search_books
+from app.books import add_book, get_books_page, import_books, list_books, remove_book, modify_book, search_books
+from app.search_refresh import refresh_search_documents
 
 
 # Fixture to connect to the test database and clean up after each test
@@ -47,6 +49,70 @@ def test_list_books(db_connection, capsys):
 
     cur.close()
 
+# Test machine-readable listing and search output
+def test_list_and_search_books_machine_formats(db_connection, capsys):
+    for i in range(3):
+        add_book(f"Format Book {i+1}", 1, 1, 2020 + i)
+    capsys.readouterr()
+
+    list_books(batch_size=2, output_format="jsonl")
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["title"] for record in records] == ["Format Book 1", "Format Book 2", "Format Book 3"]
+    assert records[0]["author"] == "Sample Author", "Author name not resolved"
+
+    search_books("Format Book 2", output_format="csv")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "book_id,title,author,genre,published_year,availability,match"
+    assert lines[1].startswith("2,Format Book 2,Sample Author,Sample Genre,2021,Available,"), "Best match is not first"
+    assert "Total number" not in "\n".join(lines), "Summary line mixed into CSV output"
+
+# Test that listing streams every batch when the catalog is larger than one batch
+def test_list_books_streams_in_batches(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    for i in range(5):
+        add_book(f"Streamed Book {i+1}", 1, 1, 2020 + i)
+    capsys.readouterr()
+
+    list_books(batch_size=2)
+
+    captured = capsys.readouterr()
+
+    for i in range(5):
+        assert f"Streamed Book {i+1}" in captured.out, f"Streamed Book {i+1} not found in the output"
+
+    assert captured.out.count("Book ID") == 1, "Header should be printed once for the whole stream"
+    assert "Total number of books: 5" in captured.out, "Total book count is incorrect"
+
+    cur.close()
+
+
+# Test keyset pagination through books: next page, previous page and jump to an ID
+def test_get_books_page_navigation(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    for i in range(7):
+        add_book(f"Paged Book {i+1}", 1, 1, 2000 + i)
+
+    first = get_books_page(page_size=3)
+    assert [book[0] for book in first] == [1, 2, 3], "First page is incorrect"
+
+    second = get_books_page(after=first[-1][0], page_size=3)
+    assert [book[0] for book in second] == [4, 5, 6], "Next page is incorrect"
+
+    previous = get_books_page(before=second[0][0], page_size=3)
+    assert [book[0] for book in previous] == [1, 2, 3], "Previous page is incorrect"
+
+    jumped = get_books_page(start=6, page_size=3)
+    assert [book[0] for book in jumped] == [6, 7], "Jump to ID page is incorrect"
+
+    assert get_books_page(after=7, page_size=3) == [], "Page past the end should be empty"
+
+    cur.close()
+
+
 # Test searching for a book that exists in the database
 def test_search_books_found(db_connection, capsys):
     conn = db_connection
@@ -79,6 +145,89 @@ def test_search_books_not_found(db_connection, capsys):
     cur.close()
 
 
+# Test searching by author name, genre name and exact published year
+def test_search_books_by_author_genre_and_year(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_book("Year Book", 1, 1, 1984)
+    add_book("Other Book", 1, 1, 2001)
+    capsys.readouterr()
+
+    search_books("Sample Author")
+    captured = capsys.readouterr()
+    assert "Total number of books found: 2" in captured.out, "Author name search is incorrect"
+
+    search_books("Genre")
+    captured = capsys.readouterr()
+    assert "Total number of books found: 2" in captured.out, "Genre name search is incorrect"
+
+    search_books("1984")
+    captured = capsys.readouterr()
+    assert "Year Book" in captured.out and "Other Book" not in captured.out, "Year search is incorrect"
+    assert "Total number of books found: 1" in captured.out, "Year search count is incorrect"
+
+    cur.close()
+
+# Test searching with field filters, and the error for an invalid one
+def test_search_books_with_filters(db_connection, capsys):
+    add_book("Year Book", 1, 1, 1984)
+    add_book("1984", 1, 1, 1949)
+    capsys.readouterr()
+
+    search_books("1984")
+    assert "Total number of books found: 2" in capsys.readouterr().out, "Keyword should match titles and years"
+
+    search_books("year:1984")
+    captured = capsys.readouterr()
+    assert "Year Book" in captured.out and "Total number of books found: 1" in captured.out, "Year filter is incorrect"
+
+    search_books("year:1940..1950 title:19")
+    captured = capsys.readouterr()
+    assert "Total number of books found: 1" in captured.out and "Year Book" not in captured.out, "Year range and title prefix are incorrect"
+
+    search_books("year:soon")
+    assert "Error: 'year:soon' must be a year or a range" in capsys.readouterr().out, "Invalid filter was not reported"
+
+# Test that search results are ranked with the best match first
+def test_search_books_ranked_by_relevance(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_book("The Hobbit Companion", 1, 1, 2001)
+    add_book("Hobbit", 1, 1, 1937)
+    capsys.readouterr()
+
+    search_books("hobbit")
+
+    captured = capsys.readouterr()
+    assert "Match" in captured.out, "Match score column not found"
+    assert captured.out.index("Hobbit ") < captured.out.index("The Hobbit Companion"), "Exact title match is not ranked first"
+
+    cur.close()
+
+# Test that books are found by their author's new name at once, and that the refresh job updates their search document
+def test_search_books_after_author_rename(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_book("Renamed Author Book", 1, 1, 2024)
+
+    cur.execute("UPDATE authors SET name = 'Ursula Le Guin' WHERE author_id = 1")
+    conn.commit()
+
+    capsys.readouterr()
+    search_books("Ursula")
+    captured = capsys.readouterr()
+    assert "Renamed Author Book" in captured.out, "Book not found by the new author name"
+
+    assert refresh_search_documents() == 1, "The renamed author's book was not refreshed"
+    cur.execute("SELECT search_vector @@ to_tsquery('simple', 'ursula') FROM books WHERE title = 'Renamed Author Book'")
+    assert cur.fetchone()[0] is True, "Search document was not refreshed after the rename"
+
+    cur.close()
+
+
 # Test adding a book with valid author_id and genre_id
 def test_add_book_success(db_connection, capsys):
     conn = db_connection
@@ -131,6 +280,43 @@ def test_add_book_invalid_genre(db_connection, capsys):
     cur.close()
 
 
+# Test bulk importing books from CSV, with invalid rows rejected and reported
+def test_import_books(db_connection, capsys, tmp_path):
+    conn = db_connection
+    cur = conn.cursor()
+
+    csv_path = tmp_path / "books.csv"
+    csv_path.write_text(
+        "title,author_id,genre_id,published_year\n"
+        "Imported One,1,1,2001\n"
+        "\"Imported, Two\",1,1,2002\n"
+        "Bad Author,999,1,2003\n"
+        "Bad Genre,1,999,2004\n"
+        "Bad Year,1,1,soon\n"
+        ",1,1,2005\n",
+        encoding="utf-8",
+    )
+
+    imported, rejected = import_books(str(csv_path))
+
+    assert imported == 2, "Valid rows were not imported"
+    assert rejected == [
+        (3, "Author ID 999 does not exist"),
+        (4, "Genre ID 999 does not exist"),
+        (5, "Published year must be an integer"),
+        (6, "Missing title"),
+    ], "Rejected rows were not reported correctly"
+
+    captured = capsys.readouterr()
+    assert "Imported 2 book(s)" in captured.out, "Import summary not found"
+    assert "Rejected 4 row(s)." in captured.out, "Rejection summary not found"
+
+    cur.execute("SELECT title, published_year FROM books ORDER BY book_id")
+    assert cur.fetchall() == [("Imported One", 2001), ("Imported, Two", 2002)], "Imported books are incorrect"
+
+    cur.close()
+
+
 # Test removing a book that exists in the database
 @patch("builtins.input", return_value="yes")
 def test_remove_book_exists(mock_input, db_connection, capsys):
@@ -228,3 +414,26 @@ def test_modify_book_invalid_genre(mock_input, db_connection, capsys):
     assert "Error: Genre ID 999 does not exist" in captured.out, "Error message for invalid genre ID not found"
 
     cur.close()
+
+
+# Test that scripted changes keep only the missing fields, even when a given value is falsy
+def test_modify_book_changes(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_book("Original Title", 1, 1, 2024)
+
+    cur.execute("SELECT book_id FROM books WHERE title = 'Original Title'")
+    book_id = cur.fetchone()[0]
+
+    modify_book(book_id, {"published_year": 0, "title": None})
+
+    cur.execute("SELECT title, published_year FROM books WHERE book_id = %s", (book_id,))
+    assert cur.fetchone() == ("Original Title", 0), "A year 0 change was dropped"
+
+    modify_book(book_id, {"title": "  "})
+
+    cur.execute("SELECT title FROM books WHERE book_id = %s", (book_id,))
+    assert cur.fetchone()[0] == "Original Title", "A blank title replaced the current one"
+
+    cur.close()
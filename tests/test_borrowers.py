@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch
 from app.db_connection import connect_to_db
-from app.borrowers import view_borrowers, search_borrowers, add_borrower, remove_borrower_by_id, modify_borrower
+from app.borrowers import view_borrowers, search_borrowers, add_borrower, remove_borrower_by_id, modify_borrower, reconcile_loan_counts
 
 
 # Fixture to connect to the test database and clean up after each test
@@ -238,4 +238,83 @@ def test_modify_borrower_invalid_phone(mock_input, db_connection, capsys):
 
     assert "Error: Phone number must contain only digits." in captured.out, "Phone validation error not triggered"
 
-    cur.close()
\ No newline at end of file
+    cur.close()
+
+# Test that the loan counters follow loans being created, returned and deleted
+def test_borrower_loan_counters(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_borrower("John Doe", "john.doe@example.com", "1234567890")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Book 1', 1, 1, 2022), ('Book 2', 1, 1, 2022)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id) VALUES (1, 1), (2, 1)")
+    conn.commit()
+
+    cur.execute("SELECT total_loans, active_loans FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == (2, 2), "Counters were not incremented by new loans"
+
+    cur.execute("UPDATE loans SET return_date = CURRENT_DATE WHERE loan_id = 1")
+    conn.commit()
+
+    cur.execute("SELECT total_loans, active_loans FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == (2, 1), "Active counter was not decremented by a return"
+
+    cur.execute("DELETE FROM loans WHERE loan_id = 2")
+    conn.commit()
+
+    cur.execute("SELECT total_loans, active_loans FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == (1, 0), "Counters were not decremented by a deleted loan"
+
+    cur.close()
+
+# Test that the borrower views show the counters and removal is refused while loans are active
+@patch("builtins.input", return_value="yes")
+def test_borrower_views_use_counters(mock_input, db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_borrower("John Doe", "john.doe@example.com", "1234567890")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Book 1', 1, 1, 2022)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id) VALUES (1, 1)")
+    conn.commit()
+    capsys.readouterr()
+
+    view_borrowers()
+    captured = capsys.readouterr()
+    assert "Active Loans" in captured.out, "Active loan counter not shown"
+
+    remove_borrower_by_id(1)
+    captured = capsys.readouterr()
+    assert "cannot be removed because they have 1 book(s) currently borrowed" in captured.out, "Borrower with an active loan was not protected"
+
+    cur.close()
+
+# Test that reconciliation reports drifted counters and repairs them
+def test_reconcile_loan_counts(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    add_borrower("John Doe", "john.doe@example.com", "1234567890")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Book 1', 1, 1, 2022)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id) VALUES (1, 1)")
+    cur.execute("UPDATE borrowers SET total_loans = 7, active_loans = 0 WHERE borrower_id = 1")
+    conn.commit()
+
+    assert reconcile_loan_counts() == [(1, "John Doe", 7, 1, 0, 1)], "Drift was not detected"
+
+    cur.execute("SELECT total_loans, active_loans FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == (7, 0), "Check-only run modified the counters"
+    conn.commit()
+
+    reconcile_loan_counts(repair=True)
+
+    captured = capsys.readouterr()
+    assert "Repaired the loan counters of 1 borrower(s)." in captured.out, "Repair message not found"
+
+    cur.execute("SELECT total_loans, active_loans FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == (1, 1), "Counters were not repaired"
+    conn.commit()
+
+    assert reconcile_loan_counts() == [], "Counters still drift after the repair"
+
+    cur.close()
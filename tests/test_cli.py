@@ -0,0 +1,135 @@
+import io
+import pytest
+import subprocess
+import sys
+from app.cli import main
+from app.db_connection import connect_to_db
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Test that importing the CLI loads none of the heavy modules
+def test_cli_imports_lazily():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.cli; print(sorted(m for m in ('inquirer', 'tabulate', 'psycopg2', 'app.books') if m in sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]", f"CLI imported heavy modules at startup: {result.stdout}"
+
+
+# Test adding and searching books through subcommands
+def test_cli_books_add_and_search(db_connection, capsys):
+    assert main(["books", "add", "Scripted Book", "1", "1", "2001"]) == 0
+    assert main(["books", "search", "scripted"]) == 0
+
+    captured = capsys.readouterr()
+    assert "Book 'Scripted Book' (ID: 1) added successfully." in captured.out, "Book was not added"
+    assert "Total number of books found: 1" in captured.out, "Book was not found by the search"
+
+
+# Test that a failed borrow is reported through the exit status
+def test_cli_loans_borrow_exit_status(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Lent Book', 1, 1, 2000)")
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Reader', 'reader@example.com', '123')")
+    conn.commit()
+
+    assert main(["loans", "borrow", "1", "1"]) == 0, "Borrowing an available book failed"
+    assert main(["loans", "borrow", "1", "1"]) == 1, "Borrowing a lent book did not fail"
+
+    captured = capsys.readouterr()
+    assert "This book is not available for borrowing." in captured.out
+
+    cur.close()
+
+
+# Test a drop-box return of several books, with IDs read from stdin
+def test_cli_loans_return_many(db_connection, capsys, monkeypatch):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Box Book 1', 1, 1, 2000), ('Box Book 2', 1, 1, 2000)")
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Reader', 'reader@example.com', '123')")
+    conn.commit()
+    assert main(["loans", "borrow", "1", "1"]) == 0
+    assert main(["loans", "borrow", "2", "1"]) == 0
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("2\n7\n"))
+    assert main(["loans", "return", "--books", "1", "--file", "-"]) == 1, "A book without an active loan was not reported"
+
+    captured = capsys.readouterr()
+    assert "Returned 2 book(s) successfully." in captured.out, "Books were not returned"
+    assert "No active loan found for book ID(s): 7" in captured.out
+    cur.execute("SELECT COUNT(*) FROM active_loans")
+    assert cur.fetchone()[0] == 0, "Returned books still have an active loan"
+
+    cur.close()
+
+
+# Test removing and modifying without prompts
+def test_cli_non_interactive_changes(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    assert main(["borrowers", "add", "Reader", "reader@example.com", "123"]) == 0
+    assert main(["borrowers", "modify", "1", "--phone", "456"]) == 0
+    cur.execute("SELECT name, phone FROM borrowers WHERE borrower_id = 1")
+    assert cur.fetchone() == ("Reader", "456"), "Borrower was not modified"
+
+    assert main(["borrowers", "remove", "1", "--yes"]) == 0
+    cur.execute("SELECT COUNT(*) FROM borrowers")
+    assert cur.fetchone()[0] == 0, "Borrower was not removed"
+
+    cur.close()
+
+
+# Test that invalid borrower data is rejected before reaching the database
+def test_cli_borrowers_add_validation(db_connection, capsys):
+    assert main(["borrowers", "add", "Reader", "not-an-email", "123"]) == 1
+
+    captured = capsys.readouterr()
+    assert "Error: Invalid email format." in captured.out
+
+
+# Test that malformed arguments are rejected by the parser
+def test_cli_rejects_bad_arguments(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["loans", "borrow", "one", "1"])
+
+    assert exit_info.value.code == 2
+
+
+# Test that --stats reports the command's queries on stderr and leaves stdout alone
+def test_cli_stats(db_connection, capsys):
+    assert main(["--stats", "books", "search", "nothing", "--format", "jsonl"]) == 0
+
+    captured = capsys.readouterr()
+    assert captured.out == "", "Statistics leaked into the machine-readable output"
+    assert "'books search': " in captured.err and "round trip(s)" in captured.err, "Statistics were not printed"
@@ -0,0 +1,137 @@
+import pytest
+import threading
+from psycopg2 import extensions, pool
+from app.db_connection import ConnectionPool, get_connection, get_database_config, get_pool, recent_operations, track_operation
+from app.output import stream_query
+
+
+# Fixture providing a small private pool so tests don't disturb the shared one
+@pytest.fixture(scope="function")
+def small_pool():
+    connection_pool = ConnectionPool(1, 2, timeout=0.2, **get_database_config())
+
+    yield connection_pool
+
+    connection_pool.closeall()
+
+
+# Test that a returned connection is handed out again instead of opening a new one
+def test_pool_reuses_connections(small_pool):
+    with small_pool.connection() as conn:
+        first_backend = conn.get_backend_pid()
+
+    with small_pool.connection() as conn:
+        second_backend = conn.get_backend_pid()
+
+    assert first_backend == second_backend, "Pool opened a new connection instead of reusing the idle one"
+
+
+# Test that an unfinished transaction is rolled back when the connection is returned
+def test_pool_rolls_back_on_return(small_pool):
+    with small_pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+
+    with small_pool.connection() as conn:
+        assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE, "Transaction leaked back into the pool"
+
+
+# Test that a connection closed behind the pool's back is replaced on checkout
+def test_pool_replaces_closed_connection(small_pool):
+    with small_pool.connection() as conn:
+        stale = conn
+
+    stale.close()
+
+    with small_pool.connection() as conn:
+        assert conn is not stale, "Closed connection was handed out again"
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        assert cur.fetchone() == (1,)
+
+
+# Test that a stale idle connection is pinged and replaced when the server dropped it
+def test_pool_health_check_replaces_dead_connection(small_pool):
+    small_pool.health_check_interval = 0
+
+    with small_pool.connection() as conn:
+        stale_backend = conn.get_backend_pid()
+
+    with get_connection() as killer:
+        cur = killer.cursor()
+        cur.execute("SELECT pg_terminate_backend(%s)", (stale_backend,))
+        killer.commit()
+
+    with small_pool.connection() as conn:
+        assert conn.get_backend_pid() != stale_backend, "Dead connection survived the health check"
+
+
+# Test that the pool never hands out more connections than its maximum size
+def test_pool_is_bounded(small_pool):
+    with small_pool.connection(), small_pool.connection():
+        with pytest.raises(pool.PoolError):
+            small_pool.getconn()
+
+    # Both slots are free again once the connections are returned
+    with small_pool.connection(), small_pool.connection():
+        pass
+
+
+# Test that concurrent threads share the pool without exceeding its size
+def test_pool_thread_safety(small_pool):
+    small_pool.timeout = 5
+    backends = set()
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(10):
+                with small_pool.connection() as conn:
+                    backends.add(conn.get_backend_pid())
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, f"Worker failed: {errors}"
+    assert len(backends) <= 2, "Pool opened more connections than its maximum size"
+
+
+# Test that the shared pool is created once and reused across calls
+def test_get_pool_is_shared():
+    assert get_pool() is get_pool(), "Shared pool was recreated"
+
+
+# Test that a tracked operation records its statements, fetched rows and commits
+def test_track_operation_records_statements(small_pool):
+    with small_pool.connection() as conn:
+        with track_operation("two queries") as operation:
+            cur = conn.cursor()
+            cur.execute("SELECT generate_series(1, 3)")
+            cur.execute("SELECT 1 WHERE FALSE")
+            conn.commit()
+
+        # Queries outside the operation are not recorded
+        cur.execute("SELECT 1")
+
+    assert operation.statement_count == 2, "Statements were not counted"
+    assert [statement.rows for statement in operation.statements] == [3, 0], "Returned rows were not counted"
+    assert len(operation.commit_seconds) == 1, "Commit was not timed"
+    assert operation.round_trips == 3, "Round trips should be two queries and one commit"
+    assert recent_operations()[-1] is operation, "Finished operation was not kept"
+
+
+# Test that rows streamed from a server-side cursor count every FETCH round trip
+def test_track_operation_counts_server_side_fetches(small_pool):
+    with small_pool.connection() as conn, track_operation("stream") as operation:
+        batches = list(stream_query(conn, "SELECT generate_series(1, 25)", batch_size=10))
+
+    assert [len(rows) for rows in batches] == [10, 10, 5]
+    statement = operation.statements[0]
+    assert statement.rows == 25, "Streamed rows were not counted"
+    assert statement.round_trips == 5, "Expected DECLARE, three full or partial FETCHes and the final empty FETCH"
@@ -0,0 +1,92 @@
+import io
+import json
+import pytest
+from app.db_connection import connect_to_db
+from app.kiosk import EVENT_ERROR, EVENT_INVALID, RETURN_NO_ACTIVE_LOAN, RETURN_OK, Kiosk, main
+from app.services import BORROW_BOOK_UNAVAILABLE, BORROW_OK
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre, two books and a borrower
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Kiosk Book 1', 1, 1, 2000), ('Kiosk Book 2', 1, 1, 2000)")
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Reader', 'reader@example.com', '123')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    conn.rollback()
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+def count_loans(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM loans")
+        count = cur.fetchone()[0]
+    conn.commit()
+    return count
+
+
+# Test that events are committed in groups and answered, in order, only once their group has committed
+def test_group_commit(db_connection):
+    results = []
+    kiosk = Kiosk(group_size=4, group_ms=60000)
+    try:
+        kiosk.submit("borrow 1 1", results.append)
+        kiosk.submit("borrow 1 1", results.append)
+        kiosk.submit("scan 1", results.append)
+        assert results == [], "Results were sent before their group committed"
+        assert count_loans(db_connection) == 0, "The open group is visible to other connections"
+
+        kiosk.submit("return-book 1", results.append)
+        assert count_loans(db_connection) == 1, "A full group was not committed"
+        kiosk.submit("return 1", results.append)
+        assert kiosk.timeout() > 0, "The event after a commit should open a new group"
+    finally:
+        kiosk.close()
+
+    results = [json.loads(result) for result in results]
+    assert [result["status"] for result in results] == [BORROW_OK, BORROW_BOOK_UNAVAILABLE, EVENT_INVALID, RETURN_OK, RETURN_NO_ACTIVE_LOAN]
+    assert results[0]["loan"]["title"] == "Kiosk Book 1" and results[3]["loan"]["return_date"] is not None
+
+
+# Test that a failed event is rolled back to its savepoint without losing the rest of its group
+def test_failed_event(db_connection):
+    results = []
+    kiosk = Kiosk(group_size=3, group_ms=60000)
+    try:
+        kiosk.submit("borrow 1 1", results.append)
+        kiosk.submit("return 99999999999", results.append)
+        kiosk.submit("borrow 2 1", results.append)
+    finally:
+        kiosk.close()
+
+    results = [json.loads(result) for result in results]
+    assert [result["status"] for result in results] == [BORROW_OK, EVENT_ERROR, BORROW_OK]
+    assert "out of range" in results[1]["error"], "The database error was not reported"
+    assert count_loans(db_connection) == 2, "The failed event took the rest of its group with it"
+
+
+# Test kiosk mode on stdin, committing on the timer as well as on the group size
+def test_main_stdin(db_connection, monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO("borrow 1 1\nborrow 2 1\n\nreturn-book 1\nreturn 42\n"))
+    assert main(["--group-size", "3", "--group-ms", "5"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["event"] for line in lines] == ["borrow 1 1", "borrow 2 1", "return-book 1", "return 42"]
+    assert [json.loads(line)["status"] for line in lines] == [BORROW_OK, BORROW_OK, RETURN_OK, RETURN_NO_ACTIVE_LOAN]
+    assert count_loans(db_connection) == 2
@@ -1,7 +1,21 @@
+import json
+import psycopg2
 import pytest
+import threading
 from unittest.mock import patch
 from app.db_connection import connect_to_db
-from app.loans import view_loans, search_loan, borrow_book, return_book, modify_loan
+from app.loans import (
+    BORROW_BOOK_NOT_FOUND,
+    BORROW_BOOK_UNAVAILABLE,
+    BORROW_BORROWER_NOT_FOUND,
+    BORROW_OK,
+    view_loans,
+    search_loan,
+    borrow_book,
+    get_loans_page,
+    return_book,
+    modify_loan,
+)
 
 
 # Fixture to connect to the test database and clean up after each test
@@ -103,6 +117,25 @@ def test_search_loan_found(db_connection, capsys):
 
     cur.close()
 
+# Test loan listing and search as JSON Lines
+def test_view_and_search_loans_jsonl(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (1, 1, '2024-05-01')")
+    conn.commit()
+
+    view_loans(output_format="jsonl")
+    search_loan("Jane", output_format="jsonl")
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    expected = {"loan_id": 1, "book_title": "Test Book", "borrower": "Jane Doe", "loan_date": "2024-05-01", "return_date": None}
+    assert records == [expected, expected], "Loans were not written as JSON Lines"
+
+    cur.close()
+
 # Test searching for a loan with a keyword that does not match any loan
 def test_search_loan_not_found(db_connection, capsys):
     conn = db_connection
@@ -125,7 +158,7 @@ def test_return_book_successful(db_connection, capsys):
     cur = conn.cursor()
 
     cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
-    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year, is_available) VALUES ('Test Book', 1, 1, 2023, FALSE)")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
     conn.commit()
 
     cur.execute("SELECT borrower_id FROM borrowers WHERE email = 'jane.doe@example.com'")
@@ -147,9 +180,8 @@ def test_return_book_successful(db_connection, capsys):
     assert f"Loan ID {loan_id}: Book 'Test Book' returned successfully." in captured.out, "Book return message not found"
     assert "Return Date" in captured.out, "Return date not displayed"
 
-    cur.execute("SELECT is_available FROM books WHERE book_id = %s", (book_id,))
-    is_available = cur.fetchone()[0]
-    assert is_available is True, "Book was not marked as available after return"
+    cur.execute("SELECT COUNT(*) FROM loans WHERE book_id = %s AND return_date IS NULL", (book_id,))
+    assert cur.fetchone()[0] == 0, "Book is still lent out after return"
 
     cur.close()
 
@@ -175,4 +207,152 @@ def test_modify_loan_not_found(db_connection, capsys):
     captured = capsys.readouterr()
     assert "Loan not found with ID: 999" in captured.out, "Loan not found message not displayed"
 
-    cur.close()
\ No newline at end of file
+    cur.close()
+
+
+# Test borrowing an available book creates a loan and marks the book as borrowed
+def test_borrow_book_successful(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
+    conn.commit()
+
+    result = borrow_book(1, 1)
+
+    captured = capsys.readouterr()
+    assert result == BORROW_OK, "Borrow did not report success"
+    assert "Book 'Test Book' borrowed successfully by Jane Doe." in captured.out, "Borrow message not found"
+
+    cur.execute("SELECT COUNT(*) FROM loans WHERE book_id = 1 AND return_date IS NULL")
+    assert cur.fetchone()[0] == 1, "Loan was not created"
+
+    cur.close()
+
+# Test borrowing a book that is already lent out
+def test_borrow_book_unavailable(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (1, 1, CURRENT_DATE)")
+    conn.commit()
+
+    result = borrow_book(1, 1)
+
+    captured = capsys.readouterr()
+    assert result == BORROW_BOOK_UNAVAILABLE, "Unavailable book was not reported"
+    assert "Error: This book is not available for borrowing." in captured.out, "Unavailable message not found"
+
+    cur.execute("SELECT COUNT(*) FROM loans")
+    assert cur.fetchone()[0] == 1, "Loan was created for an unavailable book"
+
+    cur.close()
+
+# Test borrowing with a book ID or borrower ID that does not exist
+def test_borrow_book_invalid_ids(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
+    conn.commit()
+
+    assert borrow_book(999, 1) == BORROW_BOOK_NOT_FOUND, "Missing book was not reported"
+    assert borrow_book(1, 999) == BORROW_BORROWER_NOT_FOUND, "Missing borrower was not reported"
+
+    captured = capsys.readouterr()
+    assert "Error: Invalid book ID. This book does not exist." in captured.out, "Invalid book message not found"
+    assert "Error: Invalid borrower ID. This borrower does not exist." in captured.out, "Invalid borrower message not found"
+
+    cur.execute("SELECT COUNT(*) FROM loans")
+    assert cur.fetchone()[0] == 0, "Loan was created with invalid IDs"
+
+    cur.close()
+
+# Stress test: many desks borrowing the same copies at once never lend a copy twice
+def test_borrow_book_concurrent_desks(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    desks = 8
+    copies = 5
+
+    for i in range(desks):
+        cur.execute("INSERT INTO borrowers (name, email, phone) VALUES (%s, %s, %s)", (f"Desk {i}", f"desk{i}@example.com", f"555000{i}"))
+    for i in range(copies):
+        cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES (%s, 1, 1, 2023)", (f"Copy {i}",))
+    conn.commit()
+
+    results = []
+    barrier = threading.Barrier(desks)
+
+    def desk(borrower_id):
+        barrier.wait()
+        for book_id in range(1, copies + 1):
+            results.append((book_id, borrow_book(book_id, borrower_id)))
+
+    threads = [threading.Thread(target=desk, args=(i + 1,)) for i in range(desks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    successes = [book_id for book_id, result in results if result == BORROW_OK]
+    assert sorted(successes) == list(range(1, copies + 1)), "Each copy must be lent exactly once"
+
+    cur.execute("SELECT book_id, COUNT(*) FROM loans GROUP BY book_id HAVING COUNT(*) > 1")
+    assert cur.fetchall() == [], "A copy was lent twice"
+
+    cur.execute("SELECT COUNT(*) FROM loans WHERE return_date IS NULL")
+    assert cur.fetchone()[0] == copies, "Borrowed copies do not all have an active loan"
+
+    cur.close()
+
+# Test that the schema itself rejects a second active loan of the same book
+def test_second_active_loan_rejected(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Test Book', 1, 1, 2023)")
+    cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date, return_date) VALUES (1, 1, '2024-01-01', '2024-01-10')")
+    cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (1, 1, CURRENT_DATE)")
+    conn.commit()
+
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (1, 1, CURRENT_DATE)")
+    conn.rollback()
+
+    cur.close()
+
+# Test keyset pagination through loans, newest first with loan_id breaking date ties
+def test_get_loans_page_navigation(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    for i in range(5):
+        cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES (%s, 1, 1, 2023)", (f"Book {i+1}",))
+    loan_dates = ["2024-01-01", "2024-01-02", "2024-01-02", "2024-01-03", "2024-01-04"]
+    for book_id, loan_date in enumerate(loan_dates, start=1):
+        cur.execute("INSERT INTO loans (book_id, borrower_id, loan_date) VALUES (%s, 1, %s)", (book_id, loan_date))
+    conn.commit()
+
+    first = get_loans_page(page_size=2)
+    assert [loan[0] for loan in first] == [5, 4], "First page is incorrect"
+
+    second = get_loans_page(after=(first[-1][3], first[-1][0]), page_size=2)
+    assert [loan[0] for loan in second] == [3, 2], "Next page is incorrect"
+
+    previous = get_loans_page(before=(second[0][3], second[0][0]), page_size=2)
+    assert [loan[0] for loan in previous] == [5, 4], "Previous page is incorrect"
+
+    jumped = get_loans_page(start=2, page_size=2)
+    assert [loan[0] for loan in jumped] == [2, 1], "Jump to ID page is incorrect"
+
+    assert get_loans_page(start=999, page_size=2) == [], "Jump to a missing loan should be empty"
+
+    cur.close()
@@ -0,0 +1,173 @@
+import pytest
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+from app import lookups, services
+from app.db_connection import connect_to_db
+from app.lookups import LookupCache, author_exists, author_name, genre_exists, matching_author_ids
+from app.services import books_page, find_books, get_book, iter_books
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Fixture providing a private cache so tests can count its loads
+@pytest.fixture(scope="function")
+def cache():
+    lookup_cache = LookupCache()
+
+    yield lookup_cache
+
+    lookup_cache.close()
+
+
+def wait_for(condition, timeout=2):
+    # Notifications arrive asynchronously after the commit, so poll briefly for their effect
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# Test that both lookup tables are loaded once and then served from memory
+def test_cache_loads_once(db_connection, cache):
+    with patch.object(cache, "_load", wraps=cache._load) as load:
+        for _ in range(5):
+            assert cache.table("authors") == {1: "Sample Author"}
+            assert cache.table("genres") == {1: "Sample Genre"}
+            assert cache.exists("authors", 1)
+
+    assert load.call_count == 1, "Lookup tables were reloaded without a change"
+
+
+# Test that renaming an author invalidates the cache through NOTIFY
+def test_cache_invalidated_on_rename(db_connection, cache):
+    conn = db_connection
+    cur = conn.cursor()
+
+    assert cache.table("authors")[1] == "Sample Author"
+
+    cur.execute("UPDATE authors SET name = 'Renamed Author' WHERE author_id = 1")
+    conn.commit()
+
+    assert wait_for(lambda: cache.table("authors")[1] == "Renamed Author"), "Rename was not picked up from the notification"
+
+    cur.close()
+
+
+# Test that an ID added after the cache was loaded is found without waiting for the notification
+def test_cache_fetches_on_miss(db_connection, cache):
+    conn = db_connection
+    cur = conn.cursor()
+
+    assert not cache.exists("genres", 2)
+
+    cur.execute("INSERT INTO genres (name) VALUES ('Poetry')")
+    cur.execute("INSERT INTO authors (name) VALUES ('New Author'), ('Newer Author')")
+    conn.commit()
+
+    with patch.object(cache, "_drain_notifications"), patch.object(cache, "_load") as load:
+        assert cache.exists("genres", 2), "New genre was not found after a cache miss"
+        assert cache.names("authors", {1, 2, 3, None}) == {1: "Sample Author", 2: "New Author", 3: "Newer Author"}, "New authors were not named"
+
+    assert load.call_count == 0, "A miss reloaded the whole cache instead of fetching the missing IDs"
+
+    cur.close()
+
+
+# Test that books by an author added since the cache was loaded come with the author's name
+def test_book_names_after_miss(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    assert author_name(1) == "Sample Author"
+    cur.execute("INSERT INTO authors (name) VALUES ('New Author')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('New Book', 2, 1, 2020)")
+    conn.commit()
+
+    with patch.object(lookups._cache, "_drain_notifications"):
+        assert get_book(1).author == "New Author", "The new author's name was missing"
+
+    cur.close()
+
+
+# Test that a lost listener connection is reopened and the cache reloaded
+def test_cache_survives_listener_loss(db_connection, cache):
+    conn = db_connection
+    cur = conn.cursor()
+
+    cache.table("authors")
+    cache._listener.close()
+
+    cur.execute("UPDATE authors SET name = 'Renamed Author' WHERE author_id = 1")
+    conn.commit()
+
+    assert cache.table("authors")[1] == "Renamed Author", "Stale names served after the listener was lost"
+
+    cur.close()
+
+
+# Test the module-level helpers used by the books module
+def test_lookup_helpers(db_connection):
+    assert author_exists(1)
+    assert not author_exists(999)
+    assert genre_exists(1)
+    assert author_name(1) == "Sample Author"
+    assert matching_author_ids("sample") == [1]
+    assert matching_author_ids("nobody") == []
+
+
+# Test that a cache reload never checks out a second pooled connection while a book listing holds one
+def test_lookups_reuse_held_connection(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Held Book', 1, 1, 2020)")
+    conn.commit()
+
+    held = []
+    get_connection = services.get_connection
+
+    @contextmanager
+    def services_connection():
+        with get_connection() as pooled:
+            held.append(pooled)
+            try:
+                yield pooled
+            finally:
+                held.pop()
+
+    @contextmanager
+    def lookups_connection():
+        assert not held, "The lookup cache asked for a second connection while one was held"
+        with get_connection() as pooled:
+            yield pooled
+
+    with patch.object(services, "get_connection", services_connection), patch.object(lookups, "get_connection", lookups_connection):
+        for listing in (lambda: [book for batch in iter_books() for book in batch], lambda: books_page(), lambda: [book for batch in find_books("held") for book in batch]):
+            lookups._cache.invalidate()
+            assert [book.author for book in listing()] == ["Sample Author"]
+
+    cur.close()
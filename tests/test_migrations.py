@@ -0,0 +1,134 @@
+import psycopg2
+import pytest
+import re
+from app.db_connection import connect_to_db
+from app.migrations import Migration, MigrationError, apply_migration, load_migrations, upgrade, verify
+
+HOT_QUERY_INDEXES = [
+    "loans_book_id_idx",
+    "loans_borrower_id_idx",
+    "loans_active_borrower_idx",
+    "loans_loan_date_loan_id_idx",
+    "borrowers_phone_idx",
+]
+
+
+# Fixture to connect to the test database
+@pytest.fixture(scope="function")
+def db_connection():
+    conn = connect_to_db()
+
+    yield conn
+
+    conn.rollback()
+    conn.close()
+
+
+# Test that migrations are discovered in version order with their EXPLAIN checks
+def test_load_migrations():
+    migrations = load_migrations()
+
+    versions = [migration.version for migration in migrations]
+    assert versions == sorted(versions, key=int), "Migrations are not ordered by version"
+    assert versions[:2] == ["001", "002"], "Known migrations not found"
+
+    hot_query = migrations[1]
+    assert hot_query.name == "hot_query_indexes"
+    assert [check.index for check in hot_query.checks] == HOT_QUERY_INDEXES, "EXPLAIN checks were not parsed"
+
+
+# Test upgrading a database that is missing a migration: the indexes come back and every plan changes
+def test_upgrade_applies_pending_migration(db_connection, capsys):
+    conn = db_connection
+    cur = conn.cursor()
+
+    for index in HOT_QUERY_INDEXES:
+        cur.execute(f"DROP INDEX {index}")
+    cur.execute("DELETE FROM schema_migrations WHERE version = '002'")
+    conn.commit()
+
+    applied = upgrade()
+
+    captured = capsys.readouterr()
+    assert applied == ["002"], "Pending migration was not applied"
+    assert "Applied migration 002_hot_query_indexes." in captured.out, "Migration message not found"
+    # loans is partitioned, so the plans read the partitions (loans_2026 and so on)
+    assert re.search(r"loans_loan_date_loan_id_idx: .+  ->  Index Only Scan Backward using loans_\w+_loan_date_loan_id_idx", captured.out), "Plan change not reported"
+
+    cur.execute("SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)", (HOT_QUERY_INDEXES,))
+    assert len(cur.fetchall()) == len(HOT_QUERY_INDEXES), "Indexes were not created"
+
+    assert upgrade() == [], "Applied migration ran twice"
+    assert not [failure for failure in verify() if failure[0] == "002"], "Indexes are not used after the upgrade"
+
+    cur.close()
+
+
+# Test that a migration whose index is not used is rolled back and not recorded
+def test_failed_check_rolls_back(db_connection, tmp_path):
+    conn = db_connection
+    cur = conn.cursor()
+
+    path = tmp_path / "999_useless_index.sql"
+    path.write_text(
+        "-- check: books_title_len_idx | SELECT book_id FROM books WHERE title = 'x'\n"
+        "CREATE INDEX books_title_len_idx ON books (LENGTH(title));\n",
+        encoding="utf-8",
+    )
+    migration = Migration("999", "useless_index", str(path), load_migrations(str(tmp_path))[0].checks)
+
+    with pytest.raises(MigrationError):
+        apply_migration(conn, migration)
+
+    cur.execute("SELECT COUNT(*) FROM pg_indexes WHERE indexname = 'books_title_len_idx'")
+    assert cur.fetchone()[0] == 0, "Failed migration was not rolled back"
+
+    cur.execute("SELECT COUNT(*) FROM schema_migrations WHERE version = '999'")
+    assert cur.fetchone()[0] == 0, "Failed migration was recorded"
+
+    cur.close()
+
+
+# Test that 011 stops on emails that only differ in case, and normalizes the borrowers once they are fixed
+def test_email_case_clash_stops_upgrade(db_connection):
+    conn = db_connection
+    cur = conn.cursor()
+
+    # Put the borrowers table back as it was before 011
+    cur.execute("TRUNCATE TABLE borrowers RESTART IDENTITY CASCADE")
+    cur.execute("DROP INDEX borrowers_email_lower_key")
+    cur.execute("ALTER TABLE borrowers ADD CONSTRAINT borrowers_email_key UNIQUE (email)")
+    cur.execute("CREATE INDEX borrowers_email_lower_idx ON borrowers (LOWER(email))")
+    cur.execute("DELETE FROM schema_migrations WHERE version = '011'")
+    cur.execute(
+        """
+        INSERT INTO borrowers (name, email, phone) VALUES
+        ('Upper', 'A@x.com', '555-1234'), ('Lower', 'a@x.com', '5555678'), ('Other', 'Other@X.com', '5550000')
+        """
+    )
+    conn.commit()
+
+    try:
+        with pytest.raises(psycopg2.Error, match=r"a@x\.com \(borrower IDs 1, 2\)"):
+            upgrade()
+
+        cur.execute("SELECT email FROM borrowers ORDER BY borrower_id")
+        assert cur.fetchall() == [("A@x.com",), ("a@x.com",), ("Other@X.com",)], "The stopped migration changed borrowers"
+
+        cur.execute("UPDATE borrowers SET email = 'lower@x.com' WHERE borrower_id = 2")
+        conn.commit()
+        assert upgrade() == ["011"], "The migration did not apply once the clash was resolved"
+
+        cur.execute("SELECT email, phone FROM borrowers ORDER BY borrower_id")
+        assert cur.fetchall() == [("a@x.com", "5551234"), ("lower@x.com", "5555678"), ("other@x.com", "5550000")], "Borrowers were not normalized"
+        assert not [failure for failure in verify() if failure[0] in ("002", "011")], "Borrower indexes are not used after the upgrade"
+    finally:
+        # Restore the schema of db/init.sql whatever happened
+        conn.rollback()
+        cur.execute("TRUNCATE TABLE borrowers RESTART IDENTITY CASCADE")
+        cur.execute("ALTER TABLE borrowers DROP CONSTRAINT IF EXISTS borrowers_email_key")
+        cur.execute("DROP INDEX IF EXISTS borrowers_email_lower_idx")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS borrowers_email_lower_key ON borrowers (LOWER(email))")
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES ('011', 'borrower_email_unique_lower') ON CONFLICT DO NOTHING")
+        conn.commit()
+        cur.close()
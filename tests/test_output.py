@@ -0,0 +1,69 @@
+import io
+import json
+import pytest
+from datetime import date
+from decimal import Decimal
+from app.output import StreamingGrid, print_stream, write_csv, write_jsonl, write_stream
+
+
+# Test that the streaming grid matches the fancy_grid layout for a single batch
+def test_streaming_grid_layout():
+    grid = StreamingGrid(["ID", "Title"])
+
+    lines = (grid.render_batch([(1, "Dune"), (22, "Emma")]) + "\n" + grid.render_footer()).split("\n")
+
+    assert lines[0] == "╒════╤═══════╕"
+    assert lines[1] == "│ ID │ Title │"
+    assert lines[2] == "╞════╪═══════╡"
+    assert lines[3] == "│  1 │ Dune  │"
+    assert lines[5] == "│ 22 │ Emma  │"
+    assert lines[-1] == "╘════╧═══════╛"
+
+
+# Test that later batches keep the column widths of the first batch
+def test_streaming_grid_keeps_widths_across_batches():
+    grid = StreamingGrid(["ID", "Title"])
+
+    first = grid.render_batch([(1, "Dune")]).split("\n")
+    second = grid.render_batch([(2, "A Longer Title")]).split("\n")
+
+    widths = {len(line) for line in first + second}
+    assert len(widths) == 1, "Batches are not aligned"
+    assert any("Title" in line for line in second), "Long value was lost while wrapping"
+
+
+# Test that print_stream reports the number of rows and prints nothing for an empty stream
+def test_print_stream_counts_rows(capsys):
+    assert print_stream(iter([[(1, "a")], [(2, "b"), (3, "c")]]), ["ID", "Name"]) == 3
+    assert print_stream(iter([]), ["ID", "Name"]) == 0
+
+    captured = capsys.readouterr()
+    assert captured.out.count("ID") == 1, "Empty stream should print no grid"
+
+
+# Test that JSON Lines output has one object per row with typed values
+def test_write_jsonl():
+    out = io.StringIO()
+
+    total = write_jsonl(iter([[(1, "Dune", date(2024, 5, 1), Decimal("0.5"))], [(2, None, None, None)]]), ["Book ID", "Title", "Loan Date", "Match"], out)
+
+    lines = out.getvalue().splitlines()
+    assert total == 2
+    assert json.loads(lines[0]) == {"book_id": 1, "title": "Dune", "loan_date": "2024-05-01", "match": 0.5}
+    assert json.loads(lines[1]) == {"book_id": 2, "title": None, "loan_date": None, "match": None}
+
+
+# Test that CSV output has a header line and quotes values that need it
+def test_write_csv():
+    out = io.StringIO()
+
+    total = write_csv(iter([[(1, "Dune, Part One")], [(2, None)]]), ["Book ID", "Title"], out)
+
+    assert total == 2
+    assert out.getvalue() == 'book_id,title\n1,"Dune, Part One"\n2,\n'
+
+
+# Test that an unknown format is rejected
+def test_write_stream_unknown_format():
+    with pytest.raises(ValueError):
+        write_stream(iter([]), ["ID"], "xml")
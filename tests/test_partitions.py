@@ -0,0 +1,127 @@
+import datetime
+import pytest
+from app.db_connection import connect_to_db
+from app.partitions import PartitionError, create_partitions, detach_partition, main
+from app.services import check_loan_counts, close_loan, get_book, loans_page_query
+
+LAST_YEAR = datetime.date.today().year - 1
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    conn.rollback()
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Fixture with a returned and an active loan from last year, which the default partition takes in
+@pytest.fixture(scope="function")
+def last_year_loans(db_connection):
+    cur = db_connection.cursor()
+
+    # Set aside a loans partition for last year, attached or left detached by an earlier run, so the
+    # loans land in the default partition; it is put back afterwards
+    cur.execute(
+        "SELECT to_regclass(%s) IS NOT NULL, EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s))",
+        (f"loans_{LAST_YEAR}", f"loans_{LAST_YEAR}"),
+    )
+    kept, attached = cur.fetchone()
+    if attached:
+        cur.execute(f"ALTER TABLE loans DETACH PARTITION loans_{LAST_YEAR}")
+    if kept:
+        cur.execute(f"ALTER TABLE loans_{LAST_YEAR} RENAME TO loans_{LAST_YEAR}_kept")
+
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Jane Doe', 'jane.doe@example.com', '987654321')")
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Returned Book', 1, 1, 2000), ('Lent Book', 1, 1, 2000)")
+    cur.execute(
+        "INSERT INTO loans (book_id, borrower_id, loan_date, return_date) VALUES (1, 1, %s, %s), (2, 1, %s, NULL)",
+        (datetime.date(LAST_YEAR, 3, 1), datetime.date(LAST_YEAR, 3, 20), datetime.date(LAST_YEAR, 5, 1)),
+    )
+    db_connection.commit()
+
+    cur.execute("SELECT DISTINCT tableoid::regclass::TEXT FROM loans")
+    assert cur.fetchall() == [("loans_default",)], "Last year's loans should start in the default partition"
+    db_connection.commit()
+
+    yield cur
+
+    # Drop the partition the test created and put back the one set aside; the default partition
+    # must hold no loans of last year to attach it again
+    db_connection.rollback()
+    cur.execute(f"DROP TABLE IF EXISTS loans_{LAST_YEAR}")
+    if kept:
+        cur.execute(f"ALTER TABLE loans_{LAST_YEAR}_kept RENAME TO loans_{LAST_YEAR}")
+    if attached:
+        cur.execute("TRUNCATE TABLE loans CASCADE")
+        cur.execute(f"ALTER TABLE loans ATTACH PARTITION loans_{LAST_YEAR} FOR VALUES FROM ('{LAST_YEAR}-01-01') TO ('{LAST_YEAR + 1}-01-01')")
+    db_connection.commit()
+    cur.close()
+
+
+# Test that creating partitions moves loans out of the default partition without touching the counters
+def test_create_partitions_moves_default_loans(db_connection, last_year_loans):
+    cur = last_year_loans
+
+    assert create_partitions() >= 1, "No partition was created"
+    assert create_partitions() == 0, "Existing partitions were created again"
+
+    cur.execute("SELECT loan_id, tableoid::regclass::TEXT FROM loans ORDER BY loan_id")
+    assert cur.fetchall() == [(1, f"loans_{LAST_YEAR}"), (2, f"loans_{LAST_YEAR}")], "Loans were not moved to their year"
+    cur.execute("SELECT total_loans, active_loans FROM borrowers")
+    assert cur.fetchone() == (2, 1), "Moving loans changed the borrower counters"
+    cur.execute("SELECT book_id, loan_id FROM active_loans")
+    assert cur.fetchall() == [(2, 2)], "Moving loans changed the active loans"
+    assert get_book(2).is_available is False, "The lent book should stay unavailable"
+
+
+# Test that a keyset page of older loans does not read the partitions of later years
+def test_loans_page_prunes_later_partitions(db_connection, last_year_loans):
+    cur = last_year_loans
+    create_partitions()
+
+    query, params, _ = loans_page_query((datetime.date(LAST_YEAR, 6, 1), 2), None, None, 20)
+    cur.execute("EXPLAIN " + query, params)
+    plan = "\n".join(row[0] for row in cur.fetchall())
+
+    assert f"loans_{LAST_YEAR}" in plan, "The partition holding the page was not read"
+    assert f"loans_{LAST_YEAR + 1}" not in plan, "Later partitions were not pruned"
+
+
+# Test that a partition is only detached once its loans are returned, and that the counters follow
+def test_detach_partition(db_connection, last_year_loans, capsys):
+    cur = last_year_loans
+    create_partitions()
+
+    with pytest.raises(PartitionError, match="1 active loan"):
+        detach_partition(LAST_YEAR)
+    assert main(["detach", "1900"]) == 1
+    assert "There is no loans partition for 1900." in capsys.readouterr().out, "Missing partition was not reported"
+
+    close_loan(2)
+    assert detach_partition(LAST_YEAR) == f"loans_{LAST_YEAR}"
+
+    cur.execute("SELECT COUNT(*) FROM loans")
+    assert cur.fetchone()[0] == 0, "Detached loans are still in the loans table"
+    cur.execute(f"SELECT COUNT(*) FROM loans_{LAST_YEAR}")
+    assert cur.fetchone()[0] == 2, "The detached partition lost its loans"
+    cur.execute("SELECT total_loans, active_loans FROM borrowers")
+    assert cur.fetchone() == (0, 0), "Counters still include the detached loans"
+    assert check_loan_counts() == [], "Counters drifted from the loans table"
@@ -0,0 +1,137 @@
+import pytest
+import threading
+import time
+from app.db_connection import connect_to_db
+from app.search_refresh import main, refresh_all_batches, refresh_batches, watch_batches
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre, with three books by the author and one by another
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author'), ('Other Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    cur.execute(
+        """
+        INSERT INTO books (title, author_id, genre_id, published_year) VALUES
+        ('Book 1', 1, 1, 2000), ('Book 2', 1, 1, 2001), ('Book 3', 1, 1, 2002), ('Book 4', 2, 1, 2003)
+        """
+    )
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    conn.rollback()
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+def matching_books(cur, word):
+    cur.execute("SELECT book_id FROM books WHERE search_vector @@ to_tsquery('simple', %s) ORDER BY book_id", (word,))
+    return [book_id for book_id, in cur.fetchall()]
+
+
+# Test that a rename is only queued, and that its books are then refreshed batch by batch
+def test_refresh_batches(db_connection):
+    cur = db_connection.cursor()
+    cur.execute("UPDATE authors SET name = 'Ursula Le Guin' WHERE author_id = 1")
+    cur.execute("UPDATE authors SET name = 'Same Name' WHERE author_id = 2")
+    cur.execute("UPDATE authors SET name = 'Same Name' WHERE author_id = 2")
+    db_connection.commit()
+
+    assert matching_books(cur, "ursula") == [], "The rename rewrote the search documents itself"
+    cur.execute("SELECT author_id, genre_id FROM book_search_refreshes ORDER BY queued_at")
+    assert cur.fetchall() == [(1, None), (2, None)], "Renames were not queued once per author"
+
+    assert list(refresh_batches(batch_size=2)) == [2, 1, 1], "Books were not refreshed in batches"
+    assert matching_books(cur, "ursula") == [1, 2, 3]
+    assert matching_books(cur, "same") == [4]
+    cur.execute("SELECT COUNT(*) FROM book_search_refreshes")
+    assert cur.fetchone()[0] == 0, "Refreshed renames were left in the queue"
+    db_connection.commit()
+
+
+# Test that a rename queued again during its refresh is refreshed again
+def test_rename_during_refresh(db_connection):
+    cur = db_connection.cursor()
+    cur.execute("UPDATE genres SET name = 'Fantasy' WHERE genre_id = 1")
+    db_connection.commit()
+
+    batches = refresh_batches(batch_size=3)
+    assert next(batches) == 3
+    cur.execute("UPDATE genres SET name = 'Science Fiction' WHERE genre_id = 1")
+    db_connection.commit()
+    assert list(batches) == [1, 3, 1], "The second rename was not refreshed"
+
+    assert matching_books(cur, "fantasy") == [] and matching_books(cur, "science") == [1, 2, 3, 4]
+    db_connection.commit()
+
+
+# Test the refresh command line
+def test_main(db_connection, capsys):
+    cur = db_connection.cursor()
+    cur.execute("UPDATE genres SET name = 'Poetry' WHERE genre_id = 1")
+    db_connection.commit()
+
+    assert main(["--batch-size", "10"]) == 0
+    assert "Refreshed the search documents of 4 book(s)." in capsys.readouterr().out, "The refreshed total was not reported"
+
+
+# Test that a watching job refreshes a rename once it is committed, without being run again
+def test_watch_batches(db_connection):
+    cur = db_connection.cursor()
+    stop = threading.Event()
+    batches = []
+    watcher = threading.Thread(target=lambda: batches.extend(watch_batches(batch_size=10, stop=stop)))
+    watcher.start()
+
+    try:
+        cur.execute("UPDATE authors SET name = 'Ursula Le Guin' WHERE author_id = 1")
+        db_connection.commit()
+        for _ in range(50):
+            if matching_books(cur, "ursula"):
+                break
+            db_connection.commit()
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        watcher.join()
+
+    assert matching_books(cur, "ursula") == [1, 2, 3], "The committed rename was not refreshed"
+    assert batches == [3]
+    db_connection.commit()
+
+
+# Test that the publication year is part of the search document and follows changes to it
+def test_year_in_search_document(db_connection):
+    cur = db_connection.cursor()
+    assert matching_books(cur, "2001") == [2], "Books were not found by their year"
+
+    cur.execute("UPDATE books SET published_year = 1999 WHERE book_id = 2")
+    assert matching_books(cur, "1999") == [2] and matching_books(cur, "2001") == [], "A changed year was not indexed"
+    db_connection.commit()
+
+
+# Test that every book's document can be rewritten in batches, as after migration 012
+def test_refresh_all_batches(db_connection, capsys):
+    cur = db_connection.cursor()
+    cur.execute("UPDATE books SET search_vector = to_tsvector('simple', title)")
+    db_connection.commit()
+    assert matching_books(cur, "2001") == []
+
+    assert list(refresh_all_batches(batch_size=3)) == [3, 1], "Books were not refreshed in batches"
+    assert matching_books(cur, "2001") == [2] and matching_books(cur, "sample") == [1, 2, 3, 4]
+
+    assert main(["--all"]) == 0
+    assert "Refreshed the search documents of 4 book(s)." in capsys.readouterr().out
+    db_connection.commit()
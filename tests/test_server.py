@@ -0,0 +1,151 @@
+import http.client
+import json
+import pytest
+import threading
+from app.db_connection import connect_to_db
+from app.server import PooledHTTPServer
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Fixture serving the library on a free local port, with a function sending JSON requests to it
+@pytest.fixture(scope="function")
+def request_json():
+    server = PooledHTTPServer(("127.0.0.1", 0), workers=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    client = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+
+    def send(method, path, body=None):
+        client.request(method, path, body=json.dumps(body) if body is not None else None, headers={"Content-Type": "application/json"})
+        response = client.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield send
+
+    client.close()
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+# Test adding, fetching and searching books over HTTP
+def test_server_books(db_connection, request_json):
+    status, book = request_json("POST", "/books", {"title": "Served Book", "author_id": 1, "genre_id": 1, "published_year": 1999})
+    assert status == 201, "Book was not created"
+    assert book["author"] == "Sample Author"
+
+    status, fetched = request_json("GET", f"/books/{book['book_id']}")
+    assert status == 200 and fetched["title"] == "Served Book"
+
+    status, found = request_json("GET", "/books/search?q=served")
+    assert status == 200 and [item["title"] for item in found] == ["Served Book"], "Search did not find the book"
+
+    status, error = request_json("POST", "/books", {"title": "Orphan", "author_id": 99, "genre_id": 1, "published_year": 1999})
+    assert status == 404 and "Author ID 99" in error["error"], "Unknown author was accepted"
+
+
+# Test a borrow, a rejected second borrow and a return over one keep-alive connection
+def test_server_circulation(db_connection, request_json):
+    cur = db_connection.cursor()
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) VALUES ('Desk Book', 1, 1, 2000)")
+    db_connection.commit()
+
+    status, borrower = request_json("POST", "/borrowers", {"name": "Reader", "email": "reader@example.com", "phone": "123"})
+    assert status == 201
+
+    status, loan = request_json("POST", "/loans", {"book_id": 1, "borrower_id": borrower["borrower_id"]})
+    assert status == 201 and loan["title"] == "Desk Book" and loan["return_date"] is None
+
+    status, error = request_json("POST", "/loans", {"book_id": 1, "borrower_id": borrower["borrower_id"]})
+    assert status == 409 and error["error"] == "This book is not available for borrowing."
+
+    status, error = request_json("DELETE", f"/borrowers/{borrower['borrower_id']}")
+    assert status == 409, "Borrower with an active loan was removed"
+
+    status, returned = request_json("POST", f"/loans/{loan['loan_id']}/return")
+    assert status == 200 and returned["return_date"] is not None, "Loan was not returned"
+
+    status, loan = request_json("POST", "/loans", {"book_id": 1, "borrower_id": borrower["borrower_id"]})
+    status, result = request_json("POST", "/loans/return", {"book_ids": [1, 42]})
+    assert status == 200 and [item["loan_id"] for item in result["returned"]] == [loan["loan_id"]], "Drop-box return failed"
+    assert result["not_active"] == [42], "The book without an active loan was not reported"
+
+
+# Test that invalid requests are answered with an error status and message
+def test_server_errors(db_connection, request_json):
+    status, error = request_json("POST", "/borrowers", {"name": "Reader 2", "email": "reader@example.com", "phone": "123"})
+    assert status == 400 and error["error"] == "Name must contain only letters."
+
+    status, error = request_json("GET", "/loans/42")
+    assert status == 404
+
+    status, error = request_json("GET", "/books/search?q=year:abc")
+    assert status == 400 and "'year:abc'" in error["error"], "An invalid search filter was not rejected"
+
+    status, error = request_json("POST", "/loans", {"book_id": "one", "borrower_id": 1})
+    assert status == 400 and error["error"] == "'book_id' must be an integer."
+
+    status, error = request_json("PUT", "/books/1")
+    assert status == 405 and "PUT is not allowed" in error["error"]
+
+    status, error = request_json("DELETE", "/books")
+    assert status == 405, "Known path with the wrong method should be 405"
+
+
+# Test that a borrower update checks only the fields sent and rejects an email already in use
+def test_server_modify_borrower(db_connection, request_json):
+    status, jane = request_json("POST", "/borrowers", {"name": "Jane", "email": "jane@example.com", "phone": "123"})
+    status, other = request_json("POST", "/borrowers", {"name": "Other", "email": "other@example.com", "phone": "789"})
+    status, jane = request_json("PATCH", f"/borrowers/{jane['borrower_id']}", {"name": "Jane Doe"})
+    assert status == 200 and jane["name"] == "Jane Doe", "A name with a space was rejected"
+
+    status, jane = request_json("PATCH", f"/borrowers/{jane['borrower_id']}", {"phone": "456"})
+    assert status == 200 and (jane["name"], jane["phone"]) == ("Jane Doe", "456"), "Phone-only update failed"
+
+    status, error = request_json("PATCH", f"/borrowers/{jane['borrower_id']}", {"phone": "45a"})
+    assert status == 400 and error["error"] == "Phone number must contain only digits."
+
+    status, error = request_json("PATCH", f"/borrowers/{jane['borrower_id']}", {"email": other["email"]})
+    assert status == 409, "Duplicate email was not reported as a conflict"
+
+
+# Test that page sizes are clamped and malformed loan keys rejected
+def test_server_paging(db_connection, request_json):
+    cur = db_connection.cursor()
+    cur.execute("INSERT INTO books (title, author_id, genre_id, published_year) SELECT 'Book ' || n, 1, 1, 2000 FROM generate_series(1, 3) n")
+    db_connection.commit()
+
+    status, books = request_json("GET", "/books?size=-1")
+    assert status == 200 and len(books) == 1, "A negative page size was not clamped to 1"
+
+    status, books = request_json("GET", "/books?size=100000")
+    assert status == 200 and len(books) == 3
+
+    status, error = request_json("GET", "/loans?after=2024-13-45,1")
+    assert status == 400 and "YYYY-MM-DD,LOAN_ID" in error["error"], "An invalid loan date was accepted"
+
+    status, loans = request_json("GET", "/loans?after=2024-01-31,1")
+    assert status == 200 and loans == []
@@ -0,0 +1,192 @@
+import pytest
+from app.db_connection import connect_to_db
+from app.records import Book, Borrower, Loan
+from app import services
+from app.services import (
+    BORROW_BOOK_UNAVAILABLE,
+    BORROW_OK,
+    BORROWER_KEYWORD_EMAIL,
+    BORROWER_KEYWORD_NAME,
+    BORROWER_KEYWORD_PHONE,
+    ConflictError,
+    NotFoundError,
+    SearchQueryError,
+    borrower_keyword_kind,
+    close_loan,
+    close_loans,
+    create_book,
+    create_borrower,
+    create_loan,
+    delete_borrower,
+    find_books,
+    find_borrowers,
+    get_book,
+    iter_books,
+    parse_book_search,
+    update_loan_return_date,
+)
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Test that books come back as records with their names resolved, without printing anything
+def test_book_records(db_connection, capsys):
+    book = create_book("Record Book", 1, 1, 2001)
+
+    assert book == Book(1, "Record Book", 1, "Sample Author", 1, "Sample Genre", 2001, True)
+    assert get_book(1) == book
+    assert [batch for batch in iter_books(batch_size=10)] == [[book]]
+
+    matches = [match for batch in find_books("record book") for match in batch]
+    assert matches[0].book_id == 1 and matches[0].score > 1, "Exact title match is not scored"
+
+    assert capsys.readouterr().out == "", "Service layer printed output"
+
+
+# Test that field filters narrow a search down and are combined with its plain keyword
+def test_find_books_filters(db_connection):
+    cur = db_connection.cursor()
+    cur.execute("INSERT INTO authors (name) VALUES ('J. R. R. Tolkien')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Fantasy')")
+    cur.execute(
+        """
+        INSERT INTO books (title, author_id, genre_id, published_year) VALUES
+        ('The Hobbit', 2, 2, 1937), ('The Fellowship of the Ring', 2, 2, 1954),
+        ('The Two Towers', 2, 2, 1954), ('100% Sample', 1, 1, 1954)
+        """
+    )
+    cur.execute("INSERT INTO borrowers (name, email, phone) VALUES ('Reader', 'reader@example.com', '123')")
+    db_connection.commit()
+    create_loan(3, 1)
+
+    def titles(search):
+        return [book.title for batch in find_books(search) for book in batch]
+
+    assert parse_book_search('Star Wars: author:"le guin" year:1950..') == ([("author", "le guin"), ("year", "1950..")], "Star Wars:")
+    assert titles("author:tolkien year:1950..1960 genre:fantasy available:true") == ["The Fellowship of the Ring"]
+    assert titles("author:tolkien year:..1950") == ["The Hobbit"], "Open-ended year range is incorrect"
+    assert titles("year:1954 available:false") == ["The Two Towers"]
+    assert titles("genre:1 year:1954") == ["100% Sample"], "Genre ID filter is incorrect"
+    assert titles("title:100%") == ["100% Sample"] and titles("title:1%") == [], "Title prefix was not taken literally"
+    assert titles("ring author:tolkien") == ["The Fellowship of the Ring"], "Keyword and filter were not combined"
+    assert titles("author:nobody") == []
+
+    with pytest.raises(SearchQueryError, match="'year:195x'"):
+        find_books("year:195x")
+    with pytest.raises(SearchQueryError, match="'available:maybe'"):
+        find_books("available:maybe")
+
+
+# Test that emails and phone numbers are looked up exactly, and anything else as a name, best match first
+def test_find_borrowers(db_connection):
+    for name, email, phone in [("Jon Doe", "jon.doe@example.com", "5551234"), ("John Doe", "John.Doe@Example.com", "5555678"), ("Doerte Smith", "doerte@example.com", "5551000")]:
+        create_borrower(name, email, phone)
+
+    def found(keyword):
+        return [borrower.name for batch in find_borrowers(keyword) for borrower in batch]
+
+    assert borrower_keyword_kind(" John.Doe@Example.COM ") == (BORROWER_KEYWORD_EMAIL, "john.doe@example.com")
+    assert borrower_keyword_kind("+1 (555) 123-4567") == (BORROWER_KEYWORD_PHONE, "15551234567")
+    assert borrower_keyword_kind("doe@example") == (BORROWER_KEYWORD_NAME, "doe@example")
+
+    stored = create_borrower("Ann Lee", " Ann.Lee@Example.com", "555-0001")
+    assert (stored.email, stored.phone) == ("ann.lee@example.com", "5550001"), "Contact details were not normalized"
+
+    assert found("JOHN.DOE@example.com") == ["John Doe"], "Email lookup should ignore case"
+    assert found("555-1234") == ["Jon Doe"], "Phone lookup should ignore separators"
+    assert found("555") == [] and found("example.com") == [], "Partial identifiers should not match"
+
+    assert found("doe") == ["Jon Doe", "John Doe", "Doerte Smith"], "Name matches are not ranked by similarity"
+    assert found("jon doe") == ["Jon Doe", "John Doe"]
+
+
+# Test that misspelled names are still matched
+def test_find_borrowers_fuzzy(db_connection):
+    create_borrower("Jonathan Doe", "jonathan@example.com", "5551234")
+    create_borrower("Jane Roe", "jane@example.com", "5555678")
+
+    found = [borrower.name for batch in find_borrowers("Jonathon Doe") for borrower in batch]
+    assert found == ["Jonathan Doe"], "A misspelled name was not matched"
+
+
+# Test that invalid references and duplicates raise service errors
+def test_service_errors(db_connection):
+    with pytest.raises(NotFoundError, match="Author ID 999 does not exist."):
+        create_book("Orphan", 999, 1, 2000)
+
+    create_borrower("Reader", "reader@example.com", "123")
+    with pytest.raises(ConflictError, match="already exists"):
+        create_borrower("Other", "reader@example.com", "456")
+    with pytest.raises(ConflictError, match="already exists"):
+        create_borrower("Other", "Reader@Example.COM", "456")
+
+    other = create_borrower("Other", "other@example.com", "456")
+    with pytest.raises(ConflictError, match="already exists"):
+        services.update_borrower(other.borrower_id, "Other", "reader@example.com", "456")
+
+
+# Test the loan lifecycle through the service layer
+def test_loan_records(db_connection):
+    create_book("Lent Book", 1, 1, 2000)
+    borrower = create_borrower("Reader", "reader@example.com", "123")
+    assert borrower == Borrower(1, "Reader", "reader@example.com", "123", 0, 0)
+
+    status, loan = create_loan(1, 1)
+    assert status == BORROW_OK
+    assert isinstance(loan, Loan) and loan.title == "Lent Book" and loan.return_date is None
+    assert create_loan(1, 1) == (BORROW_BOOK_UNAVAILABLE, None)
+    assert get_book(1).is_available is False, "A lent book should be unavailable"
+
+    with pytest.raises(ConflictError, match="currently borrowed"):
+        delete_borrower(1)
+    with pytest.raises(ConflictError, match="not been returned"):
+        update_loan_return_date(loan.loan_id, "2999-01-01")
+
+    returned = close_loan(loan.loan_id)
+    assert returned.return_date is not None
+    assert close_loan(loan.loan_id) is None, "A returned loan was closed twice"
+    assert get_book(1).is_available is True, "A returned book should be available"
+
+    with pytest.raises(ConflictError, match="earlier than the loan date"):
+        update_loan_return_date(loan.loan_id, "1900-01-01")
+    assert delete_borrower(1) is True
+
+
+# Test that a drop-box return closes every active loan at once and reports the rest
+def test_close_loans(db_connection):
+    for title in ["Drop Book 1", "Drop Book 2", "Drop Book 3"]:
+        create_book(title, 1, 1, 2000)
+    create_borrower("Reader", "reader@example.com", "123")
+    loan_ids = [create_loan(book_id, 1)[1].loan_id for book_id in (1, 2, 3)]
+
+    closed, not_active = close_loans([loan_ids[1], loan_ids[0], 999, loan_ids[0]])
+    assert [loan.loan_id for loan in closed] == sorted(loan_ids[:2]), "Loans were not closed in ID order"
+    assert all(loan.return_date is not None and loan.title.startswith("Drop Book") for loan in closed)
+    assert not_active == [999], "The ID without an active loan was not reported"
+
+    closed, not_active = close_loans([2, 3], by_book=True)
+    assert [loan.book_id for loan in closed] == [3] and not_active == [2], "Book IDs were not resolved to their active loans"
+    assert all(get_book(book_id).is_available for book_id in (1, 2, 3)), "Returned books should be available"
+
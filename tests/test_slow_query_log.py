@@ -0,0 +1,93 @@
+import pytest
+from app import db_connection as db_connection_module
+from app import slow_query_log
+from app.db_connection import connect_to_db, get_connection
+from app.output import stream_query
+
+
+# Fixture to connect to the test database and clean up after each test
+@pytest.fixture(scope="function")
+def db_connection():
+    # Setup: Connect to the test database
+    conn = connect_to_db()
+    cur = conn.cursor()
+
+    # Clean up any existing data before each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+
+    # Enter author and example genre
+    cur.execute("INSERT INTO authors (name) VALUES ('Sample Author')")
+    cur.execute("INSERT INTO genres (name) VALUES ('Sample Genre')")
+    conn.commit()
+
+    yield conn
+
+    # Teardown: Clean up after each test
+    cur.execute("TRUNCATE TABLE books, borrowers, loans, authors, genres RESTART IDENTITY CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+# Fixture logging every statement slower than 1 ms to a temporary file
+@pytest.fixture(scope="function")
+def slow_log(tmp_path, monkeypatch):
+    log_path = tmp_path / "slow_queries.log"
+    monkeypatch.setattr(db_connection_module, "SLOW_QUERY_MS", 1)
+    monkeypatch.setattr(slow_query_log, "SLOW_QUERY_LOG", str(log_path))
+
+    yield log_path
+
+    slow_query_log.close_slow_query_log()
+
+
+# Test that a slow read is logged with its parameters and the plan of a re-run under EXPLAIN ANALYZE
+def test_slow_select_is_logged_with_plan(db_connection, slow_log):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_sleep(0.01), %s AS label", ("slow read",))
+        conn.commit()
+
+    log = slow_log.read_text()
+    assert "SELECT pg_sleep(0.01), %s AS label" in log, "Statement was not logged"
+    assert "Parameters: ('slow read',)" in log, "Parameters were not logged"
+    assert "Plan (EXPLAIN (ANALYZE, BUFFERS)):" in log and "actual time=" in log, "Plan was not captured"
+
+
+# Test that a slow write is not run a second time to capture its plan
+def test_slow_write_gets_estimated_plan(db_connection, slow_log):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO books (title, author_id, genre_id, published_year) SELECT %s, 1, 1, 2000 FROM pg_sleep(0.01)",
+            ("Logged Book",),
+        )
+        conn.commit()
+
+    log = slow_log.read_text()
+    assert "INSERT INTO books" in log, "Statement was not logged"
+    assert "Plan (EXPLAIN (COSTS)):" in log and "actual time=" not in log, "Expected the estimated plan only"
+
+    cur = db_connection.cursor()
+    cur.execute("SELECT COUNT(*) FROM books WHERE title = 'Logged Book'")
+    assert cur.fetchone()[0] == 1, "The write was executed again"
+
+
+# Test that a streamed query is logged once its server-side cursor is closed, with all its rows
+def test_slow_stream_is_logged_on_close(db_connection, slow_log):
+    with get_connection() as conn:
+        rows = [row for batch in stream_query(conn, "SELECT n FROM generate_series(1, 30) AS n, pg_sleep(0.01)", batch_size=10) for row in batch]
+        conn.commit()
+
+    assert len(rows) == 30
+    log = slow_log.read_text()
+    assert "30 row(s), 5 round trip(s)" in log, "Streamed rows and FETCH round trips were not counted"
+
+
+# Test that nothing is logged when the log is turned off
+def test_slow_query_log_disabled(db_connection, slow_log, monkeypatch):
+    monkeypatch.setattr(db_connection_module, "SLOW_QUERY_MS", 0)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_sleep(0.01)")
+        conn.commit()
+
+    assert not slow_log.exists(), "The disabled log was written"